@@ -0,0 +1,172 @@
+
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+"""
+Valores utilizados para indicar datos faltantes en los archivos generados (los mismos que usan CPT y PyCPT)
+"""
+CPT_MISSING_VALUE = '-999.000000000'
+CPT_PROB_MISSING_VALUE = '-1.000000000'
+
+"""
+Proporción de datos faltantes en los archivos generados
+"""
+MISSING_FRACTION = 0.05
+
+
+def grid_coords(n_lats: int, n_lons: int) -> tuple[np.ndarray, np.ndarray]:
+    # Grilla regular sobre el sur de Sudamérica (las latitudes en orden ascendente)
+    return np.linspace(-40, -10, n_lats), np.linspace(-75, -45, n_lons)
+
+
+def grid_points(n_lats: int, n_lons: int) -> tuple[np.ndarray, np.ndarray]:
+    # Latitud y longitud de cada punto de la grilla (los archivos de CPT tienen una columna por punto)
+    lats, lons = grid_coords(n_lats, n_lons)
+    lats_2d, lons_2d = np.meshgrid(lats, lons, indexing='ij')
+    return lats_2d.ravel(), lons_2d.ravel()
+
+
+def with_missing(values: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    values = values.astype(float)
+    values[rng.random(values.shape) < MISSING_FRACTION] = np.nan
+    return values
+
+
+def format_row(values: np.ndarray, fmt: str, missing: str) -> str:
+    # Formatear toda la matriz de una vez (np.char es mucho más rápido que formatear valor por valor)
+    text = np.char.mod(fmt, np.nan_to_num(values, nan=0))
+    return '\t'.join(np.where(np.isnan(values), missing, text))
+
+
+def write_cpt_points_header(f, lats: np.ndarray, lons: np.ndarray) -> None:
+    f.write('\t' + '\t'.join(str(i + 1) for i in range(lats.size)) + '\n')
+    f.write('cpt:X\t' + '\t'.join(f'{x:.4f}' for x in lons) + '\n')
+    f.write('cpt:Y\t' + '\t'.join(f'{x:.4f}' for x in lats) + '\n')
+
+
+def write_cpt_det_output(folder: Path, n_years: int, n_lats: int, n_lons: int, rng: np.random.Generator) -> Path:
+    # Salida determinística de PyCPT: un campo, una fila por año (cpt:T) y una columna por punto de grilla
+    first_year, last_year = 1991, 1991 + n_years - 1
+    file_name = Path(folder, f'NextGen_prcp_CHIRPS_Janic_2_{first_year}-{last_year - 1}_{last_year}_1.txt')
+    lats, lons = grid_points(n_lats, n_lons)
+    with open(file_name, 'w') as f:
+        f.write('xmlns:cpt=http://iri.columbia.edu/CPT/v10/\ncpt:nfields=1\n')
+        f.write(f'cpt:field=prcp, cpt:nrow={n_years}, cpt:ncol={lats.size}, cpt:row=T, cpt:col=index, '
+                f'cpt:units=mm, cpt:missing={CPT_MISSING_VALUE}\n')
+        write_cpt_points_header(f, lats, lons)
+        for year in range(first_year, last_year + 1):
+            f.write(f'{year}\t{format_row(with_missing(rng.random(lats.size) * 300, rng), "%.6f", CPT_MISSING_VALUE)}\n')
+    return file_name
+
+
+def write_cpt_prob_output(folder: Path, n_years: int, n_lats: int, n_lons: int, rng: np.random.Generator) -> Path:
+    # Salida probabilística de PyCPT: un campo por categoría (cpt:C), con la misma estructura que la salida DET
+    first_year, last_year = 1991, 1991 + n_years - 1
+    file_name = Path(folder, f'NextGen_prcp_CHIRPS_Janic_2_{first_year}-{last_year - 1}_{last_year}_1_prob.txt')
+    lats, lons = grid_points(n_lats, n_lons)
+    with open(file_name, 'w') as f:
+        f.write('xmlns:cpt=http://iri.columbia.edu/CPT/v10/\ncpt:nfields=1\ncpt:ncats=3\n')
+        for category in range(1, 4):
+            f.write(f'cpt:field=prob, cpt:C={category}, cpt:clim_prob=0.333, cpt:nrow={n_years}, '
+                    f'cpt:ncol={lats.size}, cpt:row=T, cpt:col=index, cpt:units=%, '
+                    f'cpt:missing={CPT_PROB_MISSING_VALUE}\n')
+            write_cpt_points_header(f, lats, lons)
+            for year in range(first_year, last_year + 1):
+                values = with_missing(np.round(rng.random(lats.size) * 100, 1), rng)
+                f.write(f'{year}\t{format_row(values, "%.1f", CPT_PROB_MISSING_VALUE)}\n')
+    return file_name
+
+
+def write_cpt_predictand(folder: Path, n_years: int, n_lats: int, n_lons: int, rng: np.random.Generator) -> Path:
+    # Predictando de PyCPT: encabezado con estaciones, longitudes y latitudes, luego una fila por año
+    file_name = Path(folder, 'prcp_chirps_2.txt')
+    lats, lons = grid_points(n_lats, n_lons)
+    with open(file_name, 'w') as f:
+        f.write('STN\t' + '\t'.join(f'S{i}' for i in range(lats.size)) + '\n')
+        f.write('Lon\t' + '\t'.join(f'{x:.4f}' for x in lons) + '\n')
+        f.write('Lat\t' + '\t'.join(f'{x:.4f}' for x in lats) + '\n')
+        for year in range(1991, 1991 + n_years):
+            f.write(f'{year}\t{format_row(with_missing(rng.random(lats.size) * 100, rng), "%.2f", "-999")}\n')
+    return file_name
+
+
+def write_cpt_predictor(folder: Path, n_years: int, n_lats: int, n_lons: int, rng: np.random.Generator) -> Path:
+    # Predictor de PyCPT: un campo por año (cpt:S y cpt:T), cada campo es una matriz latitud x longitud
+    first_year, last_year = 1991, 1991 + n_years - 1
+    file_name = Path(folder, f'precip_SEAS5_Janic_2_{first_year}-{last_year}_1.tsv')
+    lats, lons = grid_coords(n_lats, n_lons)
+    with open(file_name, 'w') as f:
+        f.write('xmlns:cpt=http://iri.columbia.edu/CPT/v10/\ncpt:nfields=1\n')
+        for year in range(first_year, last_year + 1):
+            f.write(f'cpt:field=prec, cpt:T={year}-02, cpt:S={year}-01-01T00:00, cpt:L=1.5 months, '
+                    f'cpt:nrow={n_lats}, cpt:ncol={n_lons}, cpt:row=Y, cpt:col=X, cpt:units=mm/day, '
+                    f'cpt:missing=-999.0\n')
+            f.write('\t' + '\t'.join(f'{x:.2f}' for x in lons) + '\n')
+            for lat in lats[::-1]:
+                f.write(f'{lat:.2f}\t{format_row(with_missing(rng.random(n_lons) * 10, rng), "%.4f", "-999.0")}\n')
+    return file_name
+
+
+def write_ereg_det_hindcast(folder: Path, n_years: int, n_lats: int, n_lons: int, rng: np.random.Generator) -> Path:
+    file_name = Path(folder, 'prec_FMA_Jan_det_hind.npz')
+    lats, lons = grid_coords(n_lats, n_lons)
+    np.savez(file_name, lat=lats, lon=lons, pronos=rng.random((n_years, 1, n_lats, n_lons)))
+    return file_name
+
+
+def write_ereg_det_real_time(folder: Path, n_years: int, n_lats: int, n_lons: int, rng: np.random.Generator) -> Path:
+    file_name = Path(folder, 'tref_FMA_Jan2021_det.npz')
+    lats, lons = grid_coords(n_lats, n_lons)
+    np.savez_compressed(file_name, lat=lats, lon=lons, pronos=rng.random((1, n_lats, n_lons)))
+    return file_name
+
+
+def write_ereg_prob_hindcast(folder: Path, n_years: int, n_lats: int, n_lons: int, rng: np.random.Generator) -> Path:
+    # Probabilidades acumuladas (below y below + normal), por eso se ordenan sobre la primera dimensión
+    file_name = Path(folder, 'prec_FMA_Jan_prob_hind.npz')
+    lats, lons = grid_coords(n_lats, n_lons)
+    np.savez(file_name, lat=lats, lon=lons, prob=np.sort(rng.random((2, n_years, 1, n_lats, n_lons)), axis=0))
+    return file_name
+
+
+def write_ereg_prob_real_time(folder: Path, n_years: int, n_lats: int, n_lons: int, rng: np.random.Generator) -> Path:
+    file_name = Path(folder, 'prec_FMA_Jan2021_prob.npz')
+    lats, lons = grid_coords(n_lats, n_lons)
+    np.savez_compressed(file_name, lat=lats, lon=lons, prob=np.sort(rng.random((2, 1, n_lats, n_lons)), axis=0))
+    return file_name
+
+
+def write_ereg_sissa(folder: Path, n_years: int, n_lats: int, n_lons: int, rng: np.random.Generator) -> Path:
+    file_name = Path(folder, 'prec_FMA_Jan2021_sissa.npz')
+    lats, lons = grid_coords(n_lats, n_lons)
+    np.savez(file_name, lat=lats, lon=lons, prob=np.sort(rng.random((2, 1, n_lats, n_lons)), axis=0))
+    return file_name
+
+
+def write_ereg_obs(folder: Path, n_years: int, n_lats: int, n_lons: int, rng: np.random.Generator) -> Path:
+    # Además de obs_3m, los archivos de observaciones tienen otros miembros (que no son leídos)
+    file_name = Path(folder, f'prec_obs_FMA_1991_{1991 + n_years - 1}.npz')
+    lats, lons = grid_coords(n_lats, n_lons)
+    np.savez(file_name, lats_obs=lats, lons_obs=lons, obs_3m=rng.random((n_years, n_lats, n_lons)),
+             terciles=rng.random((2, n_lats, n_lons)), cat=rng.random((n_years, n_lats, n_lons)))
+    return file_name
+
+
+def write_crcsas_obs(folder: Path, n_years: int, n_lats: int, n_lons: int, rng: np.random.Generator) -> Path:
+    # Formato largo (una fila por fecha y punto de grilla), con las filas desordenadas
+    file_name = Path(folder, 'crcsas_prcp_monthly.csv')
+    lats, lons = grid_points(n_lats, n_lons)
+    times = [f'{y}-{m:02d}-01' for y in range(1991, 1991 + n_years) for m in (1, 2)]
+    df = pd.DataFrame({
+        'time': np.repeat(times, lats.size),
+        'latitude': np.tile(lats, len(times)),
+        'longitude': np.tile(lons, len(times)),
+        'prcp': rng.random(len(times) * lats.size) * 50
+    })
+    df.sample(frac=1, random_state=int(rng.integers(2**31))).to_csv(file_name, sep=';', index=False)
+    return file_name
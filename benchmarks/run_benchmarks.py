@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import gc
+import json
+import time
+import argparse
+import platform
+import tempfile
+import tracemalloc
+
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+
+# Change current directory (the benchmarks use the files processor modules and its config.yaml), relative paths in
+# the arguments are relative to the folder the script was called from
+CALLER_FOLDER = os.getcwd()
+PROCESSOR_FOLDER = Path(__file__).resolve().parent.parent
+os.chdir(PROCESSOR_FOLDER)
+sys.path.insert(0, PROCESSOR_FOLDER.as_posix())
+
+from file_conversion import define_read_strategy
+from file_reader import FileReader
+from benchmarks import generators
+
+
+"""
+Archivo en el que se guardan los resultados de referencia (baseline), relativo a la carpeta de los benchmarks
+"""
+BASELINE_FILE_NAME = 'baseline.json'
+
+"""
+Variación relativa (respecto al baseline) a partir de la cual un resultado se considera una regresión
+"""
+REGRESSION_THRESHOLD = 0.25
+
+"""
+Variaciones absolutas que nunca se consideran regresiones (evita falsos positivos en mediciones muy pequeñas)
+"""
+MIN_TIME_DIFFERENCE_S = 0.005
+MIN_MEMORY_DIFFERENCE_MB = 1.0
+
+
+@dataclass
+class BenchmarkCase(object):
+    """
+    Un archivo de entrada sintético (y la entrada del descriptor que lo describe) para una estrategia de lectura
+    """
+    name: str
+    file_type: str  # tipo de archivo (ver define_read_strategy en file_conversion.py)
+    generator: Callable[..., Path]  # función que genera el archivo de entrada (ver benchmarks/generators.py)
+    desc_entry: dict = field(default_factory=dict)  # otras entradas del descriptor (ej: first_year_in_file)
+
+
+"""
+Casos evaluados, al menos uno por cada estrategia de lectura
+"""
+BENCHMARK_CASES = [
+    BenchmarkCase('cpt_det_output', 'cpt_det_output', generators.write_cpt_det_output),
+    BenchmarkCase('cpt_prob_output', 'cpt_prob_output', generators.write_cpt_prob_output),
+    BenchmarkCase('cpt_predictand', 'cpt_predictand', generators.write_cpt_predictand),
+    BenchmarkCase('cpt_predictor', 'cpt_predictor', generators.write_cpt_predictor),
+    BenchmarkCase('ereg_det_hindcast', 'ereg_det_output', generators.write_ereg_det_hindcast,
+                  {'first_year_in_file': 1991}),
+    BenchmarkCase('ereg_det_real_time', 'ereg_det_output', generators.write_ereg_det_real_time),
+    BenchmarkCase('ereg_prob_hindcast', 'ereg_prob_output', generators.write_ereg_prob_hindcast,
+                  {'first_year_in_file': 1991}),
+    BenchmarkCase('ereg_prob_real_time', 'ereg_prob_output', generators.write_ereg_prob_real_time),
+    BenchmarkCase('ereg_sissa_output', 'ereg_sissa_output', generators.write_ereg_sissa),
+    BenchmarkCase('ereg_obs_data', 'ereg_obs_data', generators.write_ereg_obs),
+    BenchmarkCase('crcsas_obs_data', 'crcsas_obs_data', generators.write_crcsas_obs),
+]
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description='Measure wall time and peak memory of every read strategy using synthetic input files')
+    parser.add_argument('--lats', type=int, default=60, dest='n_lats',
+        help='Number of latitudes of the synthetic grid (default: 60).')
+    parser.add_argument('--lons', type=int, default=80, dest='n_lons',
+        help='Number of longitudes of the synthetic grid (default: 80).')
+    parser.add_argument('--years', type=int, default=30, dest='n_years',
+        help='Number of years in the synthetic files (default: 30).')
+    parser.add_argument('--repeat', type=int, default=3, dest='repeat',
+        help='Indicates how many times each case is timed (the best time is reported).')
+    parser.add_argument('--cases', nargs='+', type=str, default=None, dest='cases',
+        help=f'Cases to be measured (default: all). Valid cases: {", ".join(c.name for c in BENCHMARK_CASES)}.')
+    parser.add_argument('--baseline', type=str, default=None, dest='baseline',
+        help=f'JSON file with the reference results (default: benchmarks/{BASELINE_FILE_NAME}).')
+    parser.add_argument('--save-baseline', action='store_true', dest='save_baseline',
+        help='Indicates that the results must be saved as the new reference results.')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD, dest='threshold',
+        help=f'Relative increase considered a regression (default: {REGRESSION_THRESHOLD}).')
+    args = parser.parse_args()
+    invalid_cases = set(args.cases or []) - {c.name for c in BENCHMARK_CASES}
+    if invalid_cases:
+        parser.error(f'Invalid cases: {", ".join(sorted(invalid_cases))}')
+    return args
+
+
+def measure(function: Callable[[], None], repeat: int, setup: Callable[[], None] = None) -> dict[str, float]:
+    # El tiempo se mide sin tracemalloc (tracemalloc hace más lenta la ejecución), la memoria en otra ejecución
+    times = []
+    for _ in range(max(1, repeat)):
+        if setup is not None:
+            setup()
+        gc.collect()
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    if setup is not None:
+        setup()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'time_s': min(times), 'peak_mb': peak / 2**20}
+
+
+def run_case(case: BenchmarkCase, input_folder: Path, output_folder: Path, args: argparse.Namespace) -> dict:
+    # Generar el archivo de entrada (siempre con la misma semilla, para que los archivos sean comparables)
+    rng = np.random.default_rng(0)
+    input_file = case.generator(input_folder, args.n_years, args.n_lats, args.n_lons, rng)
+    desc_entry = dict(case.desc_entry, type=case.file_type, path=input_folder.as_posix(), name=input_file.name,
+                      output_file={'name': f'{case.name}.nc', 'path': output_folder.as_posix()})
+
+    # Definir la estrategia de lectura y el lector (sin manifiesto, el archivo de salida siempre se genera)
+    # OBS: el módulo de lectura se importa aquí, antes de medir (ver LazyReadStrategy)
+    read_strategy = define_read_strategy(case.file_type, case.name).strategy
+    reader = FileReader(read_strategy, Path(input_folder, 'benchmarks.yaml'))
+    output_file = Path(reader.define_output_filename(desc_entry))
+
+    def remove_output() -> None:
+        output_file.unlink(missing_ok=True)
+
+    # Medir la lectura (read_data) y la conversión completa (lectura y escritura del NetCDF)
+    return {
+        'input_mb': input_file.stat().st_size / 2**20,
+        'read_data': measure(lambda: read_strategy.read_data(input_file.as_posix(), desc_entry), args.repeat),
+        'convert_file_to_netcdf': measure(
+            lambda: reader.convert_file_to_netcdf(desc_file=desc_entry), args.repeat, setup=remove_output)
+    }
+
+
+def find_regressions(results: dict, baseline: dict, threshold: float) -> list[str]:
+    # Un resultado es una regresión si supera al baseline en más de threshold (y en más de un mínimo absoluto)
+    regressions = []
+    minimums = {'time_s': MIN_TIME_DIFFERENCE_S, 'peak_mb': MIN_MEMORY_DIFFERENCE_MB}
+    for case_name, case_results in results.items():
+        for operation in ['read_data', 'convert_file_to_netcdf']:
+            for metric, minimum in minimums.items():
+                reference = baseline.get(case_name, {}).get(operation, {}).get(metric)
+                value = case_results[operation][metric]
+                if reference is not None and value > reference * (1 + threshold) and value - reference > minimum:
+                    regressions.append(f'{case_name} {operation} {metric}: {value:.4g} (baseline: {reference:.4g}, '
+                                       f'+{(value / reference - 1) * 100:.0f}%)')
+    return regressions
+
+
+def print_results(results: dict, baseline: dict) -> None:
+    rows = [('case', 'operation', 'time_s', 'baseline', 'peak_mb', 'baseline')]
+    for case_name, case_results in results.items():
+        for operation in ['read_data', 'convert_file_to_netcdf']:
+            current, reference = case_results[operation], baseline.get(case_name, {}).get(operation, {})
+            rows.append((case_name, operation,
+                         f'{current["time_s"]:.4f}', f'{reference["time_s"]:.4f}' if reference else '-',
+                         f'{current["peak_mb"]:.1f}', f'{reference["peak_mb"]:.1f}' if reference else '-'))
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    for row in rows:
+        print('  '.join(value.ljust(width) for value, width in zip(row, widths)))
+
+
+if __name__ == '__main__':
+
+    # Catch and parse command-line arguments
+    parsed_args: argparse.Namespace = parse_args()
+
+    # Definir los casos a evaluar y el archivo con los resultados de referencia
+    cases = [c for c in BENCHMARK_CASES if parsed_args.cases is None or c.name in parsed_args.cases]
+    baseline_file = Path(CALLER_FOLDER, parsed_args.baseline) if parsed_args.baseline else \
+        Path(PROCESSOR_FOLDER, 'benchmarks', BASELINE_FILE_NAME)
+    settings = {'n_lats': parsed_args.n_lats, 'n_lons': parsed_args.n_lons, 'n_years': parsed_args.n_years}
+
+    # Ejecutar los casos (los archivos de entrada y de salida se generan en una carpeta temporal)
+    benchmark_results = {}
+    with tempfile.TemporaryDirectory() as tmp_folder:
+        for benchmark_case in cases:
+            benchmark_results[benchmark_case.name] = run_case(
+                benchmark_case, Path(tmp_folder), Path(tmp_folder), parsed_args)
+
+    # Leer los resultados de referencia (solo son comparables si se generaron con los mismos parámetros)
+    baseline_results = {}
+    if baseline_file.is_file():
+        baseline_content = json.loads(baseline_file.read_text())
+        if baseline_content.get('settings') == settings:
+            baseline_results = baseline_content.get('results', {})
+        else:
+            print(f'Baseline {baseline_file} was generated with other settings ({baseline_content.get("settings")})')
+
+    # Reportar los resultados y las regresiones
+    print_results(benchmark_results, baseline_results)
+    found_regressions = find_regressions(benchmark_results, baseline_results, parsed_args.threshold)
+    for regression in found_regressions:
+        print(f'REGRESSION: {regression}')
+
+    # Guardar los resultados como nuevos resultados de referencia (se conservan los casos no evaluados)
+    if parsed_args.save_baseline:
+        previous_baseline = json.loads(baseline_file.read_text()) if baseline_file.is_file() else {}
+        previous_results = previous_baseline.get('results', {}) if previous_baseline.get('settings') == settings else {}
+        baseline_file.write_text(json.dumps({
+            'settings': settings,
+            'environment': {'python': platform.python_version(), 'numpy': np.__version__,
+                            'machine': platform.machine()},
+            'results': dict(previous_results, **benchmark_results)
+        }, indent=1, sort_keys=True))
+        print(f'Baseline saved: {baseline_file}')
+
+    # Terminar con error si se encontraron regresiones (por ejemplo, para usar el script en CI)
+    raise SystemExit(1 if found_regressions and not parsed_args.save_baseline else 0)
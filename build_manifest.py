@@ -0,0 +1,296 @@
+
+from __future__ import annotations
+
+from configuration import ConfigFile
+from singleton import Singleton
+
+from typing import Union
+from pathlib import Path
+
+import os
+import re
+import json
+import hashlib
+import importlib.util
+import logging
+
+
+"""
+Versión del formato del manifiesto (si cambia, los registros previos se descartan y todo se vuelve a generar)
+"""
+MANIFEST_VERSION = 1
+
+"""
+Nombre del archivo en el que se guarda el manifiesto de los archivos generados
+"""
+MANIFEST_FILE_NAME = 'build_manifest.json'
+
+"""
+Entradas del descriptor que no modifican el archivo generado (no se consideran al calcular el hash de la entrada)
+"""
+ENTRY_KEYS_NOT_HASHED = ['update_output', 'cube']
+
+"""
+Secciones de config.yaml que determinan el contenido de los archivos generados. Forman parte del registro de cada
+descriptor: si cambian, el descriptor se vuelve a procesar y cada archivo se verifica de manera individual (el hash
+de cada entrada ya incluye la codificación efectiva, ver FileReader.manifest_record)
+"""
+CONFIG_KEYS_HASHED = ['encoding']
+
+"""
+Tamaño de los bloques leídos al calcular el hash del contenido de un archivo
+"""
+HASH_CHUNK_SIZE = 1024 * 1024
+
+"""
+Constante con la versión del código de lectura de un módulo con estrategias de lectura (ej: READER_VERSION = 1 en
+read_strategies.py). Se obtiene del código del módulo, sin importarlo
+"""
+READER_VERSION_REGEX = re.compile(r'^READER_VERSION\s*=\s*(\w+)', re.MULTILINE)
+
+
+@Singleton
+class BuildManifest(object):
+    """
+    Manifiesto persistente de los archivos generados (uno por ejecución, ver Singleton). Para cada archivo de
+    salida se guarda una huella del archivo de entrada (tamaño, fecha de modificación y hash del contenido), el hash
+    de la entrada del descriptor que lo describe y la versión del código que lo lee. De este modo, solo se vuelven a
+    generar los archivos cuya entrada, descriptor o lector cambiaron. Para cada descriptor se guarda, además, una
+    huella del descriptor y los archivos de salida que describe, lo que permite omitir un descriptor completo cuando
+    ninguna de sus entradas cambió. Los archivos de salida sin registro (ej: todos, en la primera ejecución con el
+    manifiesto) se regeneran, salvo que se utilice --adopt-outputs (se registran tal como están).
+    """
+
+    def __init__(self, file_name: Union[str, Path] = None):
+        self._file_name: Path = Path(file_name) if file_name is not None else self.default_file_name()
+        self._hashes: dict[tuple, str] = {}  # hashes ya calculados, clave: (path, tamaño, fecha de modificación)
+        self._reader_versions: dict[str, str] = {}  # versiones ya calculadas, clave: nombre del módulo
+        self.outputs: dict[str, dict] = {}
+        self.descriptors: dict[str, dict] = {}
+        self.cubes: dict[str, dict] = {}
+        self.__load_manifest()
+
+    @staticmethod
+    def default_file_name() -> Path:
+        # El manifiesto se guarda en FPROC_HOME (si está definido) o junto a los descriptores y archivos de salida
+        folder = os.getenv('FPROC_HOME', ConfigFile.Instance().get('folders').get('descriptor_files'))
+        return Path(folder, MANIFEST_FILE_NAME)
+
+    @property
+    def file_name(self) -> Path:
+        return self._file_name
+
+    @file_name.setter
+    def file_name(self, value: Union[str, Path]) -> None:
+        self._file_name = Path(value)
+        self.outputs, self.descriptors, self.cubes = {}, {}, {}
+        self.__load_manifest()
+
+    def __load_manifest(self) -> None:
+        if not self._file_name.is_file():
+            return
+        try:
+            manifest = json.loads(self._file_name.read_text())
+        except (OSError, ValueError) as e:
+            logging.warning(f'Build manifest {self._file_name} could not be read, all files will be rebuilt ({e})')
+            return
+        if manifest.get('version') != MANIFEST_VERSION:
+            return
+        self.outputs = manifest.get('outputs', {})
+        self.descriptors = manifest.get('descriptors', {})
+        self.cubes = manifest.get('cubes', {})
+
+    def save(self) -> None:
+        # Escribir primero un archivo temporal y luego reemplazar el manifiesto (una ejecución interrumpida no deja
+        # un manifiesto incompleto)
+        manifest = {'version': MANIFEST_VERSION, 'outputs': self.outputs, 'descriptors': self.descriptors,
+                    'cubes': self.cubes}
+        tmp_file_name = self._file_name.with_name(f'{self._file_name.name}.{os.getpid()}.tmp')
+        tmp_file_name.write_text(json.dumps(manifest, indent=1, sort_keys=True))
+        os.replace(tmp_file_name, self._file_name)
+
+    def __content_hash(self, file_name: str, file_stat: os.stat_result) -> str:
+        # El hash de cada versión de un archivo se calcula una sola vez por ejecución
+        key = (file_name, file_stat.st_size, file_stat.st_mtime_ns)
+        if key not in self._hashes:
+            sha = hashlib.sha256()
+            with open(file_name, 'rb') as f:
+                for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                    sha.update(chunk)
+            self._hashes[key] = sha.hexdigest()
+        return self._hashes[key]
+
+    def file_fingerprint(self, file_name: str, previous: dict = None) -> dict:
+        # Si el tamaño y la fecha de modificación no cambiaron, el contenido se asume igual (no se calcula el hash)
+        file_stat = os.stat(file_name)
+        if previous is not None and previous.get('path') == file_name and \
+                previous.get('size') == file_stat.st_size and previous.get('mtime_ns') == file_stat.st_mtime_ns:
+            return previous
+        return {'path': file_name, 'size': file_stat.st_size, 'mtime_ns': file_stat.st_mtime_ns,
+                'sha256': self.__content_hash(file_name, file_stat)}
+
+    @staticmethod
+    def file_unchanged(fingerprint: dict) -> bool:
+        # Comparación rápida (sin leer el archivo): el archivo existe y su tamaño y fecha de modificación no cambiaron
+        try:
+            file_stat = os.stat(fingerprint.get('path'))
+        except (OSError, TypeError):
+            return False
+        return fingerprint.get('size') == file_stat.st_size and fingerprint.get('mtime_ns') == file_stat.st_mtime_ns
+
+    @staticmethod
+    def entry_hash(proc_file: dict) -> str:
+        # La entrada del descriptor se normaliza (claves ordenadas) antes de calcular el hash
+        entry = {k: v for k, v in proc_file.items() if k not in ENTRY_KEYS_NOT_HASHED}
+        return hashlib.sha256(json.dumps(entry, sort_keys=True, default=str).encode()).hexdigest()
+
+    @staticmethod
+    def config_hash() -> str:
+        config = {key: ConfigFile.Instance().get(key) for key in CONFIG_KEYS_HASHED}
+        return hashlib.sha256(json.dumps(config, sort_keys=True, default=str).encode()).hexdigest()
+
+    def reader_version(self, reader_module: str) -> str:
+        # La versión del lector es el hash del nombre del módulo con las estrategias de lectura y de su versión
+        # (constante READER_VERSION), que se incrementa al modificar el código de lectura (el del módulo o el de los
+        # módulos que utiliza, ej: cpt_format, dense_grid), lo que implica volver a generar los archivos
+        if reader_module not in self._reader_versions:
+            self._reader_versions[reader_module] = self.__module_version(reader_module)
+        return self._reader_versions[reader_module]
+
+    @staticmethod
+    def __module_version(reader_module: str) -> str:
+        # OBS: la versión se obtiene sin importar el módulo (los módulos de lectura importan pandas, xarray y netCDF4,
+        # que no son necesarios si no hay archivos para convertir). Si el módulo no define READER_VERSION (ej: un
+        # lector de terceros), se usa el hash de su código
+        source = Path(importlib.util.find_spec(reader_module).origin).read_text()
+        match = READER_VERSION_REGEX.search(source)
+        version = match.group(1) if match else hashlib.sha256(source.encode()).hexdigest()
+        return hashlib.sha256(f'{reader_module}:{version}'.encode()).hexdigest()
+
+    def output_record(self, output_file: str, input_file: str, proc_file: dict, reader_module: str,
+                      cube_file: str = None, output_key: str = None) -> dict:
+        # Registro que describe cómo se generó (o cómo se generaría) el archivo de salida (y el cubo que lo incluye).
+        # Los registros se identifican por el archivo de salida, salvo que se indique otra clave (ej: cuando varias
+        # entradas escriben en un mismo almacén Zarr)
+        output_key = output_key or output_file
+        previous = self.outputs.get(output_key, {}).get('input')
+        return {
+            'key': output_key,
+            'output': output_file,
+            'input': self.file_fingerprint(input_file, previous),
+            'entry': self.entry_hash(proc_file),
+            'reader': self.reader_version(reader_module),
+            'cube': cube_file
+        }
+
+    def output_is_up_to_date(self, record: dict) -> bool:
+        # El archivo de salida está actualizado si fue generado a partir del mismo contenido de entrada, de la
+        # misma entrada del descriptor y con la misma versión del lector
+        previous = self.outputs.get(self.record_key(record))
+        if previous is None:
+            return False
+        return previous.get('input', {}).get('sha256') == record.get('input').get('sha256') and \
+            previous.get('entry') == record.get('entry') and previous.get('reader') == record.get('reader')
+
+    def has_output(self, record: dict) -> bool:
+        return self.record_key(record) in self.outputs
+
+    def update_output(self, record: dict) -> None:
+        self.outputs[self.record_key(record)] = record
+
+    @staticmethod
+    def record_key(record: dict) -> str:
+        # OBS: los registros de versiones anteriores no tienen clave (se identifican por el archivo de salida)
+        return record.get('key') or record.get('output')
+
+    def descriptor_is_up_to_date(self, desc_file: Path, reader_module: str) -> bool:
+        # Un descriptor está actualizado si no cambió (ni las secciones de config.yaml que determinan el contenido de
+        # los archivos), y si todos sus archivos de salida existen y están actualizados.
+        # OBS: aquí solo se hacen comparaciones rápidas, si algún archivo de entrada fue modificado (aunque su
+        # contenido sea el mismo), el descriptor se procesa y se verifica cada archivo de manera individual.
+        desc_record = self.descriptors.get(desc_file.absolute().as_posix())
+        if desc_record is None or not self.file_unchanged(desc_record.get('descriptor')):
+            return False
+        if desc_record.get('config') != self.config_hash():
+            return False
+        reader_version = self.reader_version(reader_module)
+        for output_key in desc_record.get('outputs'):
+            record = self.outputs.get(output_key)
+            if record is None or record.get('reader') != reader_version or not os.path.exists(record.get('output')):
+                return False
+            if not self.file_unchanged(record.get('input')):
+                return False
+        return True
+
+    def update_descriptor(self, desc_file: Path, output_keys: list[str]) -> None:
+        desc_file_name = desc_file.absolute().as_posix()
+        previous = self.descriptors.get(desc_file_name, {}).get('descriptor')
+        previous_output_keys = self.descriptors.get(desc_file_name, {}).get('outputs') or []
+        self.descriptors[desc_file_name] = {
+            'descriptor': self.file_fingerprint(desc_file_name, previous),
+            'config': self.config_hash(),
+            'outputs': output_keys
+        }
+        # Las entradas eliminadas del descriptor dejan de estar registradas (y de formar parte de los cubos)
+        self.__forget_outputs(set(previous_output_keys) - set(output_keys))
+
+    def descriptor_inputs(self, desc_file: Path) -> list[str]:
+        # Archivos de entrada de las entradas del descriptor registradas en el manifiesto
+        desc_record = self.descriptors.get(desc_file.absolute().as_posix()) or {}
+        records = [self.outputs.get(output_key) for output_key in desc_record.get('outputs') or []]
+        return [record.get('input').get('path') for record in records if record is not None]
+
+    def forget_descriptor(self, desc_file: Path) -> None:
+        self.descriptors.pop(desc_file.absolute().as_posix(), None)
+
+    def prune_descriptors(self) -> int:
+        # Olvidar los descriptores eliminados y los registros de sus archivos de salida (retorna la cantidad de
+        # descriptores olvidados)
+        removed = [desc_file_name for desc_file_name in self.descriptors if not os.path.isfile(desc_file_name)]
+        output_keys = set()
+        for desc_file_name in removed:
+            output_keys |= set(self.descriptors.pop(desc_file_name).get('outputs') or [])
+        self.__forget_outputs(output_keys)
+        return len(removed)
+
+    def __forget_outputs(self, output_keys: set[str]) -> None:
+        # Eliminar los registros de los archivos de salida que ya no corresponden a la entrada de ningún descriptor.
+        # OBS: los archivos de salida no se eliminan, pero ya no se incluyen en los cubos
+        referenced = {k for desc_record in self.descriptors.values() for k in desc_record.get('outputs') or []}
+        for output_key in output_keys - referenced:
+            self.outputs.pop(output_key, None)
+
+    @staticmethod
+    def quick_fingerprint(file_name: str) -> dict:
+        # Huella sin hash del contenido (suficiente para file_unchanged)
+        file_stat = os.stat(file_name)
+        return {'path': file_name, 'size': file_stat.st_size, 'mtime_ns': file_stat.st_mtime_ns}
+
+    def cube_members(self) -> dict[str, list[str]]:
+        # Archivos de salida (existentes) de cada cubo, según la entrada "cube" de los descriptores
+        cubes: dict[str, list[str]] = {}
+        for _, record in sorted(self.outputs.items()):
+            if record.get('cube') is not None and os.path.isfile(record.get('output')):
+                cubes.setdefault(record.get('cube'), []).append(record.get('output'))
+        return cubes
+
+    def cube_is_up_to_date(self, cube_file: str, member_files: list[str]) -> bool:
+        # Un cubo está actualizado si no fue modificado, y si está compuesto por los mismos archivos de salida y
+        # ninguno de ellos cambió desde que el cubo fue generado (o desde que se intentó generarlo sin éxito)
+        cube_record = self.cubes.get(cube_file)
+        if cube_record is None:
+            return False
+        if cube_record.get('error') is None and not self.file_unchanged(cube_record.get('cube')):
+            return False
+        if sorted(cube_record.get('members')) != sorted(member_files):
+            return False
+        return all(self.file_unchanged(fp) for fp in cube_record.get('members').values())
+
+    def update_cube(self, cube_file: str, member_files: list[str], error: str = None) -> None:
+        # Si el cubo no pudo ser generado, se registra el error (el cubo solo se vuelve a generar si algún archivo
+        # de salida cambia)
+        self.cubes[cube_file] = {
+            'cube': self.quick_fingerprint(cube_file) if error is None else None,
+            'members': {m: self.quick_fingerprint(m) for m in member_files},
+            'error': error
+        }
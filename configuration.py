@@ -1,16 +1,39 @@
 from errors import ConfigError, DescriptorError
 from helpers import MonthsProcessor as Mpro
-from helpers import nrange, FilesSearcher
+from helpers import nrange, DescFilesIndex
 from singleton import Singleton
 
-from typing import Any
+from functools import cached_property
+from typing import Any, Union
 from pathlib import Path
 
 import os
 import yaml
+import pickle
 import logging
 
 
+"""
+Loader utilizado para leer los archivos yaml (el loader de libyaml, si está disponible, es mucho más rápido)
+"""
+YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+"""
+Versión del formato del caché de descriptores (si cambia, el caché previo se descarta)
+"""
+DESCRIPTORS_CACHE_VERSION = 1
+
+"""
+Nombre del archivo en el que se guardan los descriptores ya leídos (caché de descriptores)
+"""
+DESCRIPTORS_CACHE_FILE_NAME = 'descriptors_cache.pickle'
+
+
+def load_yaml(file_name: str) -> Any:
+    with open(file_name, 'r') as f:
+        return yaml.load(f, Loader=YAML_LOADER)
+
+
 @Singleton
 class ConfigFile:
 
@@ -21,8 +44,7 @@ class ConfigFile:
     def __load_config(self) -> dict:
         if not os.path.exists(self._file_name):
             raise ConfigError(f"Configuration file (i.e. {self._file_name}) not found!")
-        with open(self._file_name, 'r') as f:
-            return yaml.safe_load(f)
+        return load_yaml(self._file_name)
 
     @property
     def file_name(self) -> str:
@@ -49,8 +71,7 @@ class DescriptorFile:
     def __load_descriptor(self) -> dict:
         if not os.path.exists(self._file_name):
             raise DescriptorError(f"Descriptor file (i.e. {self._file_name}) not found!")
-        with open(self._file_name, 'r') as f:
-            return yaml.safe_load(f)
+        return DescriptorsCache.Instance().load_descriptor(self._file_name)
 
     @property
     def file_name(self) -> str:
@@ -65,6 +86,80 @@ class DescriptorFile:
         return self.descriptor.get(key, default)
 
 
+@Singleton
+class DescriptorsCache(object):
+    """
+    Caché persistente de los descriptores ya leídos (uno por ejecución, ver Singleton). Para cada descriptor se
+    guarda el contenido leído junto al tamaño y la fecha de modificación del archivo, por lo que un descriptor solo
+    se vuelve a leer (yaml) si cambió. Al guardar el caché se descartan los descriptores que ya no existen.
+    """
+
+    def __init__(self, file_name: Union[str, Path] = None):
+        self._file_name: Path = Path(file_name) if file_name is not None else self.default_file_name()
+        self._used: set[str] = set()  # descriptores leídos en esta ejecución (no es necesario verificar si existen)
+        self._modified: bool = False
+        self.entries: dict[str, tuple[int, int, Any]] = {}  # clave: path, valor: (tamaño, fecha de mod., contenido)
+        self.__load_cache()
+
+    @staticmethod
+    def default_file_name() -> Path:
+        # El caché se guarda en FPROC_HOME (si está definido) o junto a los descriptores (como el manifiesto)
+        folder = os.getenv('FPROC_HOME', ConfigFile.Instance().get('folders').get('descriptor_files'))
+        return Path(folder, DESCRIPTORS_CACHE_FILE_NAME)
+
+    @property
+    def file_name(self) -> Path:
+        return self._file_name
+
+    @file_name.setter
+    def file_name(self, value: Union[str, Path]) -> None:
+        self._file_name = Path(value)
+        self.entries, self._used, self._modified = {}, set(), False
+        self.__load_cache()
+
+    def __load_cache(self) -> None:
+        if not self._file_name.is_file():
+            return
+        try:
+            with open(self._file_name, 'rb') as f:
+                cache = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError) as e:
+            logging.warning(f'Descriptors cache {self._file_name} could not be read, it will be rebuilt ({e})')
+            return
+        # OBS: el caché también se descarta si cambia el loader (el contenido leído podría ser distinto)
+        if isinstance(cache, dict) and cache.get('version') == DESCRIPTORS_CACHE_VERSION and \
+                cache.get('loader') == YAML_LOADER.__name__:
+            self.entries = cache.get('entries', {})
+
+    def load_descriptor(self, file_name: str) -> Any:
+        # Si el tamaño y la fecha de modificación no cambiaron, se retorna el contenido guardado en el caché
+        file_stat = os.stat(file_name)
+        self._used.add(file_name)
+        entry = self.entries.get(file_name)
+        if entry is not None and entry[0] == file_stat.st_size and entry[1] == file_stat.st_mtime_ns:
+            return entry[2]
+        descriptor = load_yaml(file_name)
+        self.entries[file_name] = (file_stat.st_size, file_stat.st_mtime_ns, descriptor)
+        self._modified = True
+        return descriptor
+
+    def save(self) -> None:
+        # Descartar los descriptores que ya no existen (solo se verifican los que no se leyeron en esta ejecución)
+        removed = [f for f in self.entries if f not in self._used and not os.path.isfile(f)]
+        for file_name in removed:
+            del self.entries[file_name]
+        # Si nada cambió, no es necesario volver a escribir el caché
+        if not self._modified and not removed:
+            return
+        # Escribir primero un archivo temporal y luego reemplazar el caché (como en el manifiesto)
+        cache = {'version': DESCRIPTORS_CACHE_VERSION, 'loader': YAML_LOADER.__name__, 'entries': self.entries}
+        tmp_file_name = self._file_name.with_name(f'{self._file_name.name}.{os.getpid()}.tmp')
+        with open(tmp_file_name, 'wb') as f:
+            pickle.dump(cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file_name, self._file_name)
+        self._modified = False
+
+
 class DescFilesSelector(object):
 
     def __init__(self, target_year: int | None, target_month: int | None,
@@ -92,17 +187,16 @@ class DescFilesSelector(object):
             ConfigFile.Instance().get('folders').get('descriptor_files')
         )
 
-    def ereg_output_descriptor_files(self) -> list[Path]:
+    @cached_property
+    def descriptors_index(self) -> DescFilesIndex:
+        # La carpeta con los descriptores se recorre una única vez (el índice se crea la primera vez que se usa)
+        return DescFilesIndex(self.target_folder)
 
-        # Definir el patrón de búsqueda
-        rglob_pattern = '*_descriptors*.yaml'
-        if self.target_year is not None and self.target_month_abbr is not None:
-            rglob_pattern = f'*_{self.target_month_abbr}{self.target_year}.yaml'
-        logging.debug(f'rglob_pattern = {rglob_pattern}')
+    def ereg_output_descriptor_files(self) -> list[Path]:
 
-        # Obtener listado de archivos de configuración y/o descriptores
-        desc_files = sorted(self.target_folder.rglob(rglob_pattern))
-        desc_files = [f for f in desc_files if f.name != 'template.yaml']
+        # Seleccionar descriptores (*_descriptors*.yaml o, si se filtra por año y mes, *_{mes}{año}.yaml)
+        logging.debug(f'ereg descriptors: month = {self.target_month_abbr}, year = {self.target_year}')
+        desc_files = self.descriptors_index.ereg_files(self.target_month_abbr, self.target_year)
 
         # Retornar descriptores a ser procesados
         return desc_files
@@ -112,19 +206,12 @@ class DescFilesSelector(object):
         # Crear lista para almacenar descriptores a procesar
         desc_files: list[Path] = []
 
-        # Crear objeto para filtrar archivos
-        yaml_files = sorted(self.target_folder.rglob(f'*.yaml'))
-        searcher = FilesSearcher(target_files=yaml_files)
-
         # 1er caso: cuando no se requiere filtrar por año y mes
         if self.target_year is None and self.target_month is None:
 
-            # Definir el patrón de búsqueda (obs_data/predictands)
-            regex_1 = rf'(?:prcp|t2m)_(?:chirps|era5-land)_[1-12].yaml'
-            # Definir el patrón de búsqueda (predictors and outputs)
-            regex_2 = rf'.*_(?:{"|".join(Mpro.trimesters[1:])})ic_[1-12]_.*_\d{4}_1.yaml'
-            # Seleccionar archivos
-            desc_files.extend(searcher.filter_files([regex_1, regex_2]))
+            # Seleccionar archivos (obs_data/predictands y predictors and outputs)
+            desc_files.extend(self.descriptors_index.predictand_files(n_months=1))
+            desc_files.extend(self.descriptors_index.forecast_files(n_months=1))
 
         # 2do caso: cuando sí se requiere filtrar por año y mes
         if self.target_year is not None and self.target_month is not None:
@@ -134,41 +221,29 @@ class DescFilesSelector(object):
             fcst_months = [month for month in nrange(start, 6, 12)]
             # Buscar descriptores para los distintos leadtimes (pronos mensuales)
             for fcst_month in fcst_months:
-                # Definir el patrón de búsqueda (obs_data/predictands)
-                regex_1 = rf'(?:prcp|t2m)_(?:chirps|era5-land)_{fcst_month}.yaml'
                 # Definir año correspondiente a fcst_month
                 fcst_year = self.target_year
                 if self.target_month > fcst_month:
                     fcst_year = self.target_year + 1
-                # Definir el patrón de búsqueda (predictors and outputs)
-                regex_2 = rf'.*_{self.target_month_abbr}ic_{fcst_month}_.*_{fcst_year}_1.yaml'
-                # Seleccionar archivos
-                desc_files.extend(searcher.filter_files([regex_1, regex_2]))
-
-        # Para garantizar que no se procese el archivo template.yaml
-        desc_files = [f for f in desc_files if f.name != 'template.yaml']
+                # Seleccionar archivos (obs_data/predictands y predictors and outputs)
+                desc_files.extend(self.descriptors_index.predictand_files((fcst_month,)))
+                desc_files.extend(self.descriptors_index.forecast_files(
+                    self.target_month_abbr, (fcst_month,), (fcst_year,)))
 
-        # Retornar descriptores a ser procesados
-        return desc_files
+        # Retornar descriptores a ser procesados (sin duplicados)
+        return list(dict.fromkeys(desc_files))
 
     def pycpt_descriptor_files_trimesters(self) -> list[Path]:
 
         # Crear lista para almacenar descriptores a procesar
         desc_files: list[Path] = []
 
-        # Crear objeto para filtrar archivos
-        yaml_files = sorted(self.target_folder.rglob(f'*.yaml'))
-        searcher = FilesSearcher(target_files=yaml_files)
-
         # 1er caso: cuando no se requiere filtrar por año y mes
         if self.target_year is None and self.target_month is None:
 
-            # Definir el patrón de búsqueda (obs_data/predictands)
-            regex_1 = rf'(?:prcp|t2m)_(?:chirps|era5-land)_[1-12]-[1-12].yaml'
-            # Definir el patrón de búsqueda (predictors and outputs)
-            regex_2 = rf'.*_(?:{"|".join(Mpro.trimesters[1:])})ic_[1-12]-[1-12]_.*_\d{4}-\d{4}_1.yaml'
-            # Seleccionar archivos
-            desc_files.extend(searcher.filter_files([regex_1, regex_2]))
+            # Seleccionar archivos (obs_data/predictands y predictors and outputs)
+            desc_files.extend(self.descriptors_index.predictand_files(n_months=2))
+            desc_files.extend(self.descriptors_index.forecast_files(n_months=2))
 
         # 2do caso: cuando sí se requiere filtrar por año y mes
         if self.target_year is not None and self.target_month is not None:
@@ -180,23 +255,17 @@ class DescFilesSelector(object):
             # Buscar descriptores para los distintos leadtimes (pronos trimestrales)
             for first_fcst_month in first_fcst_months:
                 last_fcst_month = Mpro.add_months(first_fcst_month, 2)
-                # Definir el patrón de búsqueda (obs_data/predictands)
-                regex_1 = rf'(?:prcp|t2m)_(?:chirps|era5-land)_{first_fcst_month}-{last_fcst_month}.yaml'
                 # Definir año correspondiente a first_fcst_year
                 first_fcst_year = self.target_year + 1 if self.target_month > first_fcst_month else self.target_year
                 # Definir año correspondiente a last_fcst_year
                 last_fcst_year = self.target_year + 1 if self.target_month > last_fcst_month else self.target_year
-                # Definir el patrón de búsqueda (predictors and outputs)
-                regex_2 = rf'.*_{self.target_month_abbr}ic_{first_fcst_month}-{last_fcst_month}_'\
-                          rf'.*_{first_fcst_year}-{last_fcst_year}_1.yaml'
-                # Seleccionar archivos
-                desc_files.extend(searcher.filter_files([regex_1, regex_2]))
+                # Seleccionar archivos (obs_data/predictands y predictors and outputs)
+                desc_files.extend(self.descriptors_index.predictand_files((first_fcst_month, last_fcst_month)))
+                desc_files.extend(self.descriptors_index.forecast_files(
+                    self.target_month_abbr, (first_fcst_month, last_fcst_month), (first_fcst_year, last_fcst_year)))
 
-        # Para garantizar que no se procese el archivo template.yaml
-        desc_files = [f for f in desc_files if f.name != 'template.yaml']
-
-        # Retornar descriptores a ser procesados
-        return desc_files
+        # Retornar descriptores a ser procesados (sin duplicados)
+        return list(dict.fromkeys(desc_files))
 
     @property
     def target_descriptors(self) -> list[Path]:
@@ -206,5 +275,5 @@ class DescFilesSelector(object):
         pycpt_desc_1 = [] if self.skip_pycpt else self.pycpt_descriptor_files_months()
         pycpt_desc_2 = [] if self.skip_pycpt else self.pycpt_descriptor_files_trimesters()
 
-        # Retornar descriptores
-        return ereg_desc + pycpt_desc_1 + pycpt_desc_2
+        # Retornar descriptores (sin duplicados, un descriptor puede cumplir con más de un patrón)
+        return list(dict.fromkeys(ereg_desc + pycpt_desc_1 + pycpt_desc_2))
@@ -0,0 +1,161 @@
+
+from __future__ import annotations
+
+from configuration import ConfigFile
+
+from dataclasses import dataclass
+from queue import Queue, Empty, Full
+from typing import Callable, Generic, Iterator, TypeVar, Union
+
+import threading
+
+
+"""
+Tamaño de los bloques leídos al leer por adelantado un archivo de entrada
+"""
+PREFETCH_BLOCK_SIZE = 1024 * 1024
+
+"""
+Segundos entre verificaciones de la cancelación del pipeline (cuando un hilo espera lugar en una cola)
+"""
+STOP_CHECK_INTERVAL_SECONDS = 0.5
+
+"""
+Marca de fin de los trabajos en las colas del pipeline
+"""
+END_OF_JOBS = object()
+
+
+Job = TypeVar('Job')
+Result = TypeVar('Result')
+
+
+@dataclass
+class PipelineSettings(object):
+    """
+    Configuración del pipeline de conversión (sección "pipeline" de config.yaml)
+    """
+    enabled: bool = False  # convertir los archivos en pipeline (solo sin --jobs, ver ConversionPipeline)
+    queue_depth: int = 2  # archivos leídos por adelantado y Datasets en espera de ser escritos (acota la memoria)
+
+    @classmethod
+    def from_config(cls) -> PipelineSettings:
+        settings = dict(ConfigFile.Instance().get('pipeline') or {})
+        return cls(**{k: v for k, v in settings.items() if k in cls.__dataclass_fields__})
+
+
+def prefetch_file(file_name: str) -> None:
+    # Leer el archivo completo (y descartar su contenido), así queda en la caché del sistema operativo cuando
+    # la estrategia de lectura lo abra. OBS: la lectura libera el GIL, no demora al hilo principal.
+    buffer = bytearray(PREFETCH_BLOCK_SIZE)
+    try:
+        with open(file_name, 'rb', buffering=0) as f:
+            while f.readinto(buffer):
+                pass
+    except OSError:
+        pass
+
+
+class ConversionPipeline(Generic[Job, Result]):
+    """
+    Conversión de archivos en tres etapas que se ejecutan a la vez: un hilo lee por adelantado los archivos de
+    entrada (de los trabajos siguientes), el hilo principal los interpreta y transforma en Datasets, y otro hilo
+    escribe los Datasets en los archivos de salida. Así, mientras se escribe un archivo, se interpreta el siguiente
+    y se lee el disco del que sigue. Las colas entre las etapas tienen a lo sumo queue_depth elementos, lo que acota
+    la memoria utilizada (a lo sumo queue_depth + 2 Datasets en memoria).
+    """
+
+    def __init__(self, queue_depth: int = 2) -> None:
+        self.queue_depth: int = max(1, queue_depth)
+        self._stop = threading.Event()
+
+    def __put(self, queue: Queue, item: object) -> bool:
+        # Agregar un elemento a una cola acotada, salvo que el pipeline se cancele mientras se espera lugar
+        while not self._stop.is_set():
+            try:
+                queue.put(item, timeout=STOP_CHECK_INTERVAL_SECONDS)
+                return True
+            except Full:
+                continue
+        return False
+
+    def __prefetch(self, jobs: list[Job], input_file: Callable[[Job], Union[str, None]], prefetched: Queue) -> None:
+        # Leer por adelantado los archivos de entrada (input_file retorna None si el archivo no debe ser convertido)
+        # OBS: un error al definir el archivo de entrada no detiene el pipeline, el hilo principal lo informará
+        for job in jobs:
+            try:
+                file_name = input_file(job)
+            except Exception:
+                file_name = None
+            if file_name is not None:
+                prefetch_file(file_name)
+            if not self.__put(prefetched, job):
+                return
+        self.__put(prefetched, END_OF_JOBS)
+
+    def __write(self, pending_writes: Queue, results: Queue) -> None:
+        # Ejecutar las escrituras pendientes, en orden, y enviar su resultado (o su error) al hilo principal
+        while True:
+            write = pending_writes.get()
+            if write is END_OF_JOBS or self._stop.is_set():
+                return
+            try:
+                results.put((write(), None))
+            except BaseException as e:
+                results.put((None, e))
+
+    @staticmethod
+    def __result(results: Queue, block: bool) -> Union[tuple[Result, Union[BaseException, None]], None]:
+        try:
+            return results.get(block=block)
+        except Empty:
+            return None
+
+    def run(self, jobs: list[Job], input_file: Callable[[Job], Union[str, None]],
+            read_job: Callable[[Job], tuple[Union[Result, None], Union[Callable[[], Result], None]]]
+            ) -> Iterator[Result]:
+        # Ejecutar los trabajos y retornar sus resultados a medida que se completan (no necesariamente en orden).
+        # read_job se ejecuta en el hilo principal y retorna el resultado del trabajo o, si el archivo debe ser
+        # escrito, la escritura pendiente (que se ejecuta en el hilo de escritura y retorna el resultado del trabajo).
+        # Un error en cualquiera de los trabajos detiene el pipeline y se propaga (como sin pipeline).
+        self._stop.clear()
+        prefetched, pending_writes, results = Queue(self.queue_depth), Queue(self.queue_depth), Queue()
+        prefetcher = threading.Thread(
+            target=self.__prefetch, args=(jobs, input_file, prefetched), name='pipeline-prefetch', daemon=True)
+        writer = threading.Thread(
+            target=self.__write, args=(pending_writes, results), name='pipeline-write', daemon=True)
+        prefetcher.start()
+        writer.start()
+        pending_writes_count = 0
+        try:
+            while (job := prefetched.get()) is not END_OF_JOBS:
+                result, write = read_job(job)
+                if write is None:
+                    yield result
+                else:
+                    self.__put(pending_writes, write)
+                    pending_writes_count += 1
+                # Retornar los resultados de las escrituras ya completadas (sin esperar las demás)
+                while (write_result := self.__result(results, block=False)) is not None:
+                    pending_writes_count -= 1
+                    yield self.__raise_or_return(write_result)
+            # Esperar las escrituras pendientes
+            while pending_writes_count > 0:
+                pending_writes_count -= 1
+                yield self.__raise_or_return(self.__result(results, block=True))
+        finally:
+            # Detener los hilos (la escritura en curso, si la hay, se completa antes de terminar)
+            self._stop.set()
+            try:
+                pending_writes.put_nowait(END_OF_JOBS)
+            except Full:
+                pass
+            writer.join()
+            prefetcher.join()
+
+    @staticmethod
+    def __raise_or_return(write_result: tuple[Result, Union[BaseException, None]]) -> Result:
+        result, error = write_result
+        if error is not None:
+            raise error
+        return result
@@ -0,0 +1,188 @@
+
+from __future__ import annotations
+
+from instrumentation import staged
+
+from dataclasses import dataclass
+from typing import Callable, Union
+
+import io
+import os
+import mmap
+import re
+import numpy as np
+
+
+"""
+Expresión regular utilizada para extraer los tags (cpt:<tag>=<valor>) de la línea que describe un campo
+"""
+CPT_TAG_REGEX = re.compile(rb'cpt:(\w+)=([^,\r\n]*)')
+
+"""
+Filtros que permiten leer solo algunas filas (según su etiqueta) y algunas columnas (según su nombre o coordenadas)
+"""
+RowsFilter = Union[Callable[[np.ndarray], np.ndarray], None]
+ColumnsFilter = Union[Callable[[list[str], dict[str, np.ndarray]], np.ndarray], None]
+
+
+@dataclass
+class CPTfield(object):
+    tags: dict[str, str]
+    line_offset: int  # byte offset de la línea con los tags del campo
+    table_offset: int  # byte offset de la primera línea de la tabla con los datos del campo
+
+    @property
+    def n_rows(self) -> int:
+        return int(self.tags['nrow'])
+
+    @property
+    def n_cols(self) -> int:
+        return int(self.tags['ncol'])
+
+    @property
+    def na_values(self) -> float:
+        return float(self.tags['missing'])
+
+
+@dataclass
+class CPTtable(object):
+    column_names: list[str]
+    header_rows: dict[str, np.ndarray]  # filas con coordenadas, ej: cpt:X y cpt:Y (o Lon y Lat en los predictandos)
+    row_labels: np.ndarray  # primera columna de cada fila de datos, ej: años o latitudes
+    values: np.ndarray  # matriz de datos (filas x columnas), con NA en lugar de los valores faltantes
+
+
+class CPTfile(object):
+    """
+    Tokenizador de archivos de texto del CPT. El archivo se recorre una sola vez para ubicar (byte offset) las
+    líneas con tags cpt: que describen cada campo, luego cada tabla de datos se convierte directamente a un
+    arreglo de floats, sin volver a leer el archivo desde el principio. Al leer una tabla se pueden descartar
+    filas y columnas, de modo que solo se convierten los datos que realmente se necesitan.
+    """
+
+    def __init__(self, file_name: str):
+        self._file_name: str = file_name
+        self._file = open(file_name, 'rb')
+        # Un archivo vacío no puede ser mapeado en memoria
+        self._content: Union[mmap.mmap, bytes] = b''
+        if os.fstat(self._file.fileno()).st_size > 0:
+            self._content = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.fields: list[CPTfield] = self.__scan_fields()
+
+    def __enter__(self) -> CPTfile:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if isinstance(self._content, mmap.mmap):
+            self._content.close()
+        self._file.close()
+
+    @property
+    def file_name(self) -> str:
+        return self._file_name
+
+    def __line_end(self, offset: int) -> int:
+        # Retornar el offset del fin de línea (o el fin del archivo)
+        end = self._content.find(b'\n', offset)
+        return len(self._content) if end == -1 else end
+
+    @staged('header_scan')
+    def __scan_fields(self) -> list[CPTfield]:
+        fields: list[CPTfield] = []
+        # Las líneas que describen un campo tienen, al menos, los tags cpt:nrow, cpt:ncol y cpt:missing
+        offset = self._content.find(b'cpt:nrow=')
+        while offset != -1:
+            line_start = self._content.rfind(b'\n', 0, offset) + 1
+            line_end = self.__line_end(offset)
+            tags = {k.decode(): v.strip().decode() for k, v in
+                    CPT_TAG_REGEX.findall(self._content[line_start:line_end])}
+            if 'ncol' in tags and 'missing' in tags:
+                fields.append(CPTfield(tags, line_start, line_end + 1))
+            offset = self._content.find(b'cpt:nrow=', line_end)
+        return fields
+
+    def read_field(self, field: CPTfield, n_header_rows: int = 0,
+                   rows_filter: RowsFilter = None, columns_filter: ColumnsFilter = None) -> CPTtable:
+        return self.read_table(field.table_offset, n_header_rows, field.n_rows, field.na_values,
+                               rows_filter, columns_filter)
+
+    @staged('header_scan')
+    def read_field_labels(self, field: CPTfield) -> tuple[list[str], np.ndarray]:
+        # Leer solo el nombre de las columnas y la etiqueta de cada fila de un campo (sin convertir los datos)
+        line_end = self.__line_end(field.table_offset)
+        column_names = self._content[field.table_offset:line_end].decode().rstrip('\r').split('\t')[1:]
+        row_labels, offset = [], line_end + 1
+        for _ in range(field.n_rows):
+            line_end = self.__line_end(offset)
+            line = self._content[offset:line_end]
+            if line.strip():
+                row_labels.append(float(line[:line.find(b'\t')]))
+            offset = line_end + 1
+        return column_names, np.array(row_labels, dtype=float)
+
+    @staged('parse')
+    def read_table(self, offset: int, n_header_rows: int = 0, n_rows: int = None, na_values: float = None,
+                   rows_filter: RowsFilter = None, columns_filter: ColumnsFilter = None) -> CPTtable:
+        # La primera línea de la tabla tiene el nombre de las columnas (la primera celda se ignora)
+        line_end = self.__line_end(offset)
+        column_names = self._content[offset:line_end].decode().rstrip('\r').split('\t')[1:]
+        offset = line_end + 1
+
+        # Las líneas siguientes (encabezados) tienen una etiqueta y las coordenadas de cada columna
+        header_rows: dict[str, np.ndarray] = {}
+        for _ in range(n_header_rows):
+            line_end = self.__line_end(offset)
+            label, *row = self._content[offset:line_end].decode().rstrip('\r').split('\t')
+            header_rows[label] = np.array(row, dtype=float)
+            offset = line_end + 1
+
+        # Seleccionar las columnas a leer (las demás columnas no se convierten a float)
+        columns_idx = None
+        if columns_filter is not None:
+            columns_idx = np.flatnonzero(columns_filter(column_names, header_rows))
+            column_names = [column_names[i] for i in columns_idx]
+            header_rows = {label: row[columns_idx] for label, row in header_rows.items()}
+
+        # Identificar el fin de la tabla: n_rows líneas, o hasta el próximo campo (o el fin del archivo)
+        if n_rows is None:
+            next_fields = [f.line_offset for f in self.fields if f.line_offset >= offset]
+            table_end = next_fields[0] if next_fields else len(self._content)
+        else:
+            table_end = offset
+            for _ in range(n_rows):
+                table_end = self.__line_end(table_end) + 1
+            table_end = min(table_end, len(self._content))
+
+        # Descartar las filas que no deben ser leídas, según su etiqueta (primera columna)
+        block = self._content[offset:table_end].rstrip()
+        if rows_filter is not None and block:
+            lines = block.split(b'\n')
+            labels = np.array([float(line[:line.find(b'\t')]) for line in lines])
+            block = b'\n'.join(line for line, keep in zip(lines, rows_filter(labels)) if keep)
+
+        # Convertir todas las filas de la tabla a floats de una sola vez (la primera columna es la etiqueta)
+        usecols = None if columns_idx is None else [0, *(columns_idx + 1)]
+        table = self.__parse_numbers(block, len(column_names) + 1, usecols)
+
+        # Reemplazar los valores faltantes por NA
+        values = table[:, 1:]
+        if na_values is not None:
+            values[values == na_values] = np.nan
+
+        # Retornar la tabla leída
+        return CPTtable(column_names, header_rows, table[:, 0], values)
+
+    @staticmethod
+    def __parse_numbers(block: bytes, n_cols: int, usecols: list[int] = None) -> np.ndarray:
+        # Una tabla sin filas se retorna como una matriz vacía
+        if not block:
+            return np.empty((0, n_cols))
+        # np.loadtxt convierte el bloque completo en C (y solo las columnas indicadas en usecols), pero falla
+        # con las celdas vacías (que pandas lee como NA), en ese caso se utiliza np.genfromtxt (mucho más lento)
+        try:
+            return np.loadtxt(io.BytesIO(block), delimiter='\t', usecols=usecols, ndmin=2)
+        except ValueError:
+            return np.genfromtxt(io.BytesIO(block), delimiter='\t', usecols=usecols, ndmin=2)
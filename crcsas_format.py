@@ -0,0 +1,127 @@
+
+from __future__ import annotations
+
+from data_subset import DataSubset
+from dense_grid import CoordinateColumn, DenseGrid
+
+from dataclasses import dataclass
+from typing import Iterator
+
+import importlib.util
+import numpy as np
+import pandas as pd
+
+
+"""
+Separador y columnas de coordenadas de los archivos CSV del CRCSAS (la columna de datos se llama como la variable)
+"""
+CSV_SEPARATOR = ';'
+TIME_COLUMN, LAT_COLUMN, LON_COLUMN = 'time', 'latitude', 'longitude'
+
+"""
+Dimensiones de la grilla de salida y columna del archivo con las coordenadas de cada una
+"""
+GRID_DIMS = {'init_time': TIME_COLUMN, 'latitude': LAT_COLUMN, 'longitude': LON_COLUMN}
+
+"""
+Tamaño de los bloques leídos: en filas (lector de pandas) o en bytes (lector de pyarrow). De cada bloque solo se
+conservan las filas a convertir, en arreglos compactos (sin índices ni textos), lo que acota la memoria utilizada
+"""
+BLOCK_ROWS = 1_000_000
+BLOCK_BYTES = 32 * 1024 * 1024
+
+"""
+Tipos de dato de las columnas (las fechas se convierten a datetime64[ns], como en las demás estrategias de lectura)
+"""
+COORDS_DTYPE = np.float64
+VALUES_DTYPE = np.float32
+
+
+@dataclass
+class CRCSASblock(object):
+    coords: dict[str, CoordinateColumn]  # columnas init_time (datetime64[ns]), latitude y longitude
+    values: np.ndarray
+
+
+class CRCSASfile(object):
+    """
+    Lector de los archivos CSV del CRCSAS (una fila por fecha y punto de grilla). El archivo se lee por bloques, con
+    pyarrow si está instalado (o con el lector de pandas, en C), y con los tipos de dato declarados (no se infieren).
+    La grilla densa (init_time, latitude, longitude) se arma con DenseGrid, sin crear ni ordenar un MultiIndex.
+    """
+
+    def __init__(self, file_name: str, variable: str) -> None:
+        self.file_name: str = file_name
+        self.variable: str = variable
+
+    @staticmethod
+    def pyarrow_available() -> bool:
+        return importlib.util.find_spec('pyarrow') is not None
+
+    def blocks(self) -> Iterator[CRCSASblock]:
+        return self.__pyarrow_blocks() if self.pyarrow_available() else self.__pandas_blocks()
+
+    def __pyarrow_blocks(self) -> Iterator[CRCSASblock]:
+        # OBS: pyarrow se importa solo al leer un archivo (no es una dependencia obligatoria)
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        from pyarrow import csv as pa_csv
+        column_types = {TIME_COLUMN: pa.timestamp('ns'), LAT_COLUMN: pa.from_numpy_dtype(COORDS_DTYPE),
+                        LON_COLUMN: pa.from_numpy_dtype(COORDS_DTYPE), self.variable: pa.from_numpy_dtype(VALUES_DTYPE)}
+        reader = pa_csv.open_csv(
+            self.file_name,
+            read_options=pa_csv.ReadOptions(block_size=BLOCK_BYTES),
+            parse_options=pa_csv.ParseOptions(delimiter=CSV_SEPARATOR),
+            convert_options=pa_csv.ConvertOptions(column_types=column_types, include_columns=list(column_types)))
+        for batch in reader:
+            # Se descartan las filas sin coordenadas (el lector de pandas las descarta al factorizar, código -1)
+            batch = batch.filter(pc.and_(pc.is_valid(batch.column(TIME_COLUMN)), pc.and_(
+                pc.is_valid(batch.column(LAT_COLUMN)), pc.is_valid(batch.column(LON_COLUMN)))))
+            yield CRCSASblock(
+                coords={dim: CoordinateColumn.factorize(batch.column(column).to_numpy(zero_copy_only=False))
+                        for dim, column in GRID_DIMS.items()},
+                values=batch.column(self.variable).to_numpy(zero_copy_only=False))
+
+    def __pandas_blocks(self) -> Iterator[CRCSASblock]:
+        # Las coordenadas se leen como categorías, así el lector las factoriza mientras interpreta el texto y solo
+        # se convierten (a fechas o a números) sus valores únicos (ej: cada fecha se interpreta una sola vez)
+        dtypes = {TIME_COLUMN: 'category', LAT_COLUMN: 'category', LON_COLUMN: 'category', self.variable: VALUES_DTYPE}
+        with pd.read_csv(self.file_name, sep=CSV_SEPARATOR, usecols=list(dtypes), dtype=dtypes,
+                         chunksize=BLOCK_ROWS) as reader:
+            for chunk in reader:
+                time, lat, lon = chunk[TIME_COLUMN].cat, chunk[LAT_COLUMN].cat, chunk[LON_COLUMN].cat
+                yield CRCSASblock(
+                    coords={
+                        'init_time': CoordinateColumn(time.codes.to_numpy(), pd.to_datetime(
+                            time.categories, format='ISO8601').to_numpy(dtype='datetime64[ns]')),
+                        'latitude': CoordinateColumn(lat.codes.to_numpy(), lat.categories.to_numpy(dtype=COORDS_DTYPE)),
+                        'longitude': CoordinateColumn(lon.codes.to_numpy(), lon.categories.to_numpy(dtype=COORDS_DTYPE))
+                    },
+                    values=chunk[self.variable].to_numpy())
+
+    @staticmethod
+    def __uniques_masks(block: CRCSASblock, subset: DataSubset) -> dict[str, np.ndarray]:
+        # Valores únicos de cada columna de coordenadas a conservar (los filtros se evalúan sobre los valores únicos,
+        # no sobre cada fila)
+        init_times = block.coords['init_time'].uniques
+        return {
+            'init_time': subset.years_mask(init_times.astype('datetime64[Y]').astype(int) + 1970),
+            'latitude': subset.latitudes_mask(block.coords['latitude'].uniques),
+            'longitude': subset.longitudes_mask(block.coords['longitude'].uniques)
+        }
+
+    def read_grid(self, subset: DataSubset = None) -> DenseGrid:
+        # Leer el archivo y retornar la grilla (init_time x latitude x longitude) con los datos a convertir.
+        # OBS: las coordenadas de la grilla (los valores únicos a conservar) se obtienen antes de descartar filas, de
+        # modo que la grilla resultante sea la misma que se obtendría al filtrar el dataset completo (puntos sin
+        # datos en los años conservados).
+        subset = subset or DataSubset()
+        grid = DenseGrid(list(GRID_DIMS), [self.variable], dtype=VALUES_DTYPE)
+        for block in self.blocks():
+            # Se descartan las filas fuera del subconjunto a convertir y las filas sin coordenadas (código -1)
+            uniques_masks, rows_mask = self.__uniques_masks(block, subset), np.ones(block.values.size, dtype=bool)
+            for dim, uniques_mask in uniques_masks.items():
+                rows_mask &= np.append(uniques_mask, False)[block.coords[dim].codes]
+            grid.add({self.variable: block.values[rows_mask]},
+                     **{dim: column.select(rows_mask, uniques_masks[dim]) for dim, column in block.coords.items()})
+        return grid
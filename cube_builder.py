@@ -0,0 +1,112 @@
+
+from __future__ import annotations
+
+from errors import CubeError
+from netcdf_encoding import NetCDFEncoding
+
+from dataclasses import replace
+
+import os
+import numpy as np
+import xarray as xr
+
+
+"""
+Dimensión sobre la que se combinan los archivos de salida de un cubo, y cantidad de elementos de esa dimensión en
+cada chunk del cubo (con 1, cada pronóstico se lee de manera independiente, como cuando estaba en su propio archivo)
+"""
+CUBE_DIM = 'init_time'
+CUBE_DIM_CHUNK = 1
+
+"""
+Cantidad máxima de valores duplicados informados en el error (los demás solo se cuentan)
+"""
+MAX_REPORTED_DUPLICATES = 5
+
+
+def duplicated_init_times(member_files: list[str], datasets: list[xr.Dataset]) -> dict[np.datetime64, list[str]]:
+    # Valores de init_time que aparecen más de una vez, junto a los archivos en los que aparecen
+    all_values = np.concatenate([ds[CUBE_DIM].values for ds in datasets])
+    values, counts = np.unique(all_values, return_counts=True)
+    duplicated = values[counts > 1]
+    return {
+        value: [f for f, ds in zip(member_files, datasets) if np.isin(value, ds[CUBE_DIM].values)]
+        for value in duplicated
+    }
+
+
+def check_members_compatibility(member_files: list[str], datasets: list[xr.Dataset]) -> None:
+    # Todos los archivos deben tener init_time, las mismas variables y las mismas coordenadas (salvo init_time).
+    # OBS: xr.concat con join='exact' solo compara los índices, con variables distintas (ej: prcp y t2m) combinaría
+    # los archivos completando con NaN
+    for member_file, ds in zip(member_files, datasets):
+        if CUBE_DIM not in ds.dims:
+            raise CubeError(f'{os.path.basename(member_file)} has no {CUBE_DIM} dimension')
+    first_file, first_ds = member_files[0], datasets[0]
+    for member_file, ds in zip(member_files[1:], datasets[1:]):
+        if set(ds.data_vars) != set(first_ds.data_vars):
+            raise CubeError(f'data variables of {os.path.basename(member_file)} ({", ".join(sorted(ds.data_vars))}) '
+                            f'differ from those of {os.path.basename(first_file)} '
+                            f'({", ".join(sorted(first_ds.data_vars))})')
+        coords = {name for name, coord in ds.coords.items() if CUBE_DIM not in coord.dims}
+        first_coords = {name for name, coord in first_ds.coords.items() if CUBE_DIM not in coord.dims}
+        if coords != first_coords or not all(ds[c].equals(first_ds[c]) for c in coords):
+            raise CubeError(f'coordinates of {os.path.basename(member_file)} differ from those of '
+                            f'{os.path.basename(first_file)}')
+
+
+def open_members(member_files: list[str]) -> list[xr.Dataset]:
+    # Abrir los archivos de salida de un cubo (un archivo ilegible impide generar el cubo, pero no la ejecución)
+    datasets = []
+    try:
+        for member_file in member_files:
+            datasets.append(xr.open_dataset(member_file))
+    except Exception as e:
+        for ds in datasets:
+            ds.close()
+        raise CubeError(f'{os.path.basename(member_file)} cannot be read ({e})')
+    return datasets
+
+
+def build_cube(cube_file: str, member_files: list[str], encoding: NetCDFEncoding) -> None:
+    # Combinar los archivos de salida de un mismo modelo, variable y plazo en un único archivo (un cubo), ordenado
+    # y dividido en chunks a lo largo de init_time (el validador lee un archivo en lugar de cientos)
+    datasets = open_members(member_files)
+    try:
+        check_members_compatibility(member_files, datasets)
+
+        # Un mismo init_time no puede estar en más de un archivo (ni repetido en un archivo), porque el validador
+        # identifica cada dato por longitud, latitud y año (ver template.yaml)
+        duplicated = duplicated_init_times(member_files, datasets)
+        if duplicated:
+            reported = '; '.join(
+                f'{np.datetime_as_string(value, unit="D")} ({", ".join(os.path.basename(f) for f in files)})'
+                for value, files in list(duplicated.items())[:MAX_REPORTED_DUPLICATES])
+            raise CubeError(f'{len(duplicated)} duplicated {CUBE_DIM} values: {reported}')
+
+        # Combinar los archivos (además, los índices de las demás dimensiones deben ser idénticos, join='exact')
+        try:
+            cube = xr.concat(datasets, dim=CUBE_DIM, join='exact', combine_attrs='drop_conflicts').sortby(CUBE_DIM)
+        except Exception as e:
+            raise CubeError(f'output files cannot be combined ({e})')
+
+        # OBS: se descarta la codificación leída de los archivos (ej: sus chunks), el cubo se codifica según
+        # config.yaml, pero siempre con chunks a lo largo de init_time
+        for variable in cube.variables.values():
+            variable.encoding = {}
+        cube_encoding = replace(encoding, chunks=dict(encoding.chunks or {}, **{CUBE_DIM: CUBE_DIM_CHUNK}))
+
+        # Escribir primero un archivo temporal y luego reemplazar el cubo (el validador nunca lee un cubo incompleto)
+        tmp_file_name = f'{cube_file}.{os.getpid()}.tmp'
+        os.makedirs(os.path.dirname(cube_file) or '.', exist_ok=True)
+        try:
+            cube.to_netcdf(tmp_file_name, encoding=cube_encoding.variable_encoding(cube))
+            os.replace(tmp_file_name, cube_file)
+        except Exception as e:
+            raise CubeError(f'cube cannot be written ({e})')
+        finally:
+            if os.path.exists(tmp_file_name):
+                os.remove(tmp_file_name)
+    finally:
+        for ds in datasets:
+            ds.close()
@@ -0,0 +1,117 @@
+
+from __future__ import annotations
+
+from dataclasses import dataclass, replace
+from typing import Union
+
+from cpt_format import RowsFilter, ColumnsFilter
+from instrumentation import staged
+from xarray import Dataset
+
+import numpy as np
+
+
+@dataclass
+class DataSubset(object):
+    """
+    Subconjunto de los datos a ser leídos (años y bbox). Se utiliza tanto durante la lectura de los archivos
+    (para no leer filas, campos o columnas que serán descartados) como sobre el dataset final.
+    """
+    min_year: Union[int, None] = None
+    max_year: Union[int, None] = None
+    min_lat: Union[float, None] = None
+    max_lat: Union[float, None] = None
+    min_lon: Union[float, None] = None
+    max_lon: Union[float, None] = None
+
+    @classmethod
+    def from_descriptor(cls, desc_file: dict = None, year_offset: int = 0) -> DataSubset:
+        # OBS: year_offset permite expresar min_year y max_year en las mismas unidades que init_time (ver CPT)
+        filter_years = (desc_file or {}).get('filter_years') or {}
+        bbox = (desc_file or {}).get('bbox') or {}
+        min_year, max_year = filter_years.get('min_year'), filter_years.get('max_year')
+        return cls(
+            min_year=min_year - year_offset if min_year is not None else None,
+            max_year=max_year - year_offset if max_year is not None else None,
+            min_lat=bbox.get('min_lat'), max_lat=bbox.get('max_lat'),
+            min_lon=bbox.get('min_lon'), max_lon=bbox.get('max_lon'))
+
+    @property
+    def filters_years(self) -> bool:
+        return self.min_year is not None or self.max_year is not None
+
+    @property
+    def filters_points(self) -> bool:
+        return any(v is not None for v in [self.min_lat, self.max_lat, self.min_lon, self.max_lon])
+
+    @property
+    def filters_data(self) -> bool:
+        return self.filters_years or self.filters_points
+
+    @staticmethod
+    def __in_range(values: np.ndarray, min_value: Union[int, float, None],
+                   max_value: Union[int, float, None]) -> np.ndarray:
+        mask = np.ones(np.shape(values), dtype=bool)
+        if min_value is not None:
+            mask &= np.asarray(values) >= min_value
+        if max_value is not None:
+            mask &= np.asarray(values) <= max_value
+        return mask
+
+    def years_mask(self, years: np.ndarray) -> np.ndarray:
+        return self.__in_range(years, self.min_year, self.max_year)
+
+    def latitudes_mask(self, latitudes: np.ndarray) -> np.ndarray:
+        return self.__in_range(latitudes, self.min_lat, self.max_lat)
+
+    def longitudes_mask(self, longitudes: np.ndarray) -> np.ndarray:
+        return self.__in_range(longitudes, self.min_lon, self.max_lon)
+
+    def points_mask(self, latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+        return self.latitudes_mask(latitudes) & self.longitudes_mask(longitudes)
+
+    def grid_indexers(self, years: np.ndarray, latitudes: np.ndarray,
+                      longitudes: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Posiciones de los años y de los puntos de grilla a conservar, permiten indexar los arreglos leídos
+        # (ej: arreglos en archivos npz) antes de crear el dataset, sin copiar los datos que serán descartados.
+        return (np.flatnonzero(self.years_mask(years)),
+                np.flatnonzero(self.latitudes_mask(latitudes)),
+                np.flatnonzero(self.longitudes_mask(longitudes)))
+
+    def rows_filter(self, year_offset: int = 0, always_keep_after: Union[int, None] = None) -> RowsFilter:
+        # Filtro de filas para CPTfile, las etiquetas de las filas son años (en los archivos CPT, el año del
+        # primer mes objetivo, por eso year_offset). Las filas con etiquetas posteriores a always_keep_after (años
+        # que luego son renombrados con swap_years) siempre se leen, ya que se filtran luego de ser renombradas.
+        if not self.filters_years:
+            return None
+
+        def keep_rows(labels: np.ndarray) -> np.ndarray:
+            mask = self.years_mask(labels - year_offset)
+            if always_keep_after is not None:
+                mask |= labels > always_keep_after
+            return mask
+
+        return keep_rows
+
+    def columns_filter(self, lat_label: str, lon_label: str) -> ColumnsFilter:
+        # Filtro de columnas para CPTfile, las coordenadas de cada columna están en los encabezados de la tabla
+        if not self.filters_points:
+            return None
+        return lambda names, header_rows: self.points_mask(header_rows[lat_label], header_rows[lon_label])
+
+    @staged('transform')
+    def select(self, ds: Dataset) -> Dataset:
+        # Se usa isel (y no where con drop=True), por lo tanto, no se crean máscaras del tamaño de los datos, no
+        # se promueven los datos a float, y si los datos ya fueron filtrados durante la lectura, no se copian.
+        masks = {}
+        if self.filters_years and 'init_time' in ds.dims:
+            masks['init_time'] = self.years_mask(ds['init_time'].dt.year.values)
+        if self.filters_points and 'latitude' in ds.dims:
+            masks['latitude'] = self.latitudes_mask(ds['latitude'].values)
+        if self.filters_points and 'longitude' in ds.dims:
+            masks['longitude'] = self.longitudes_mask(ds['longitude'].values)
+        indexers = {dim: np.flatnonzero(mask) for dim, mask in masks.items() if not mask.all()}
+        return ds.isel(indexers) if indexers else ds
+
+    def without_years(self) -> DataSubset:
+        return replace(self, min_year=None, max_year=None)
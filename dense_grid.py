@@ -0,0 +1,112 @@
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Union
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+
+@dataclass
+class CoordinateColumn(object):
+    """
+    Columna de coordenadas factorizada: los valores únicos de la columna y la posición de cada celda en esos valores
+    (-1 en las celdas sin valor, que no pueden agregarse a una grilla)
+    """
+    codes: np.ndarray
+    uniques: np.ndarray
+
+    @classmethod
+    def factorize(cls, values: np.ndarray) -> CoordinateColumn:
+        # OBS: np.unique retorna los valores ordenados, tal como lo hacía sort_index sobre el MultiIndex
+        values = np.asarray(values)
+        uniques, inverse = np.unique(values, return_inverse=True)
+        return cls(inverse.reshape(values.shape), uniques)
+
+    def select(self, cells_mask: np.ndarray, uniques_mask: np.ndarray) -> CoordinateColumn:
+        # Conservar solo algunas celdas y algunos valores únicos (las celdas conservadas solo pueden tener esos
+        # valores), con las posiciones en el menor tipo de entero posible
+        positions = np.cumsum(uniques_mask) - 1
+        codes = positions[self.codes[cells_mask]].astype(np.min_scalar_type(self.uniques.size))
+        return CoordinateColumn(codes, self.uniques[uniques_mask])
+
+
+class DenseGrid(object):
+    """
+    Construcción de un Dataset con datos densos (ej: init_time x latitude x longitude) a partir de datos en formato
+    largo: una columna de coordenadas por dimensión y una columna de valores por variable. Reemplaza a
+    set_index(...).sort_index().to_xarray(), que crea y ordena un MultiIndex con todas las celdas. Las coordenadas de
+    cada dimensión son los valores únicos de su columna (ordenados) y los valores se ubican directamente en arreglos
+    con NaN en las celdas sin datos. Los datos pueden agregarse por bloques (ej: un campo por vez) y las columnas de
+    un bloque pueden expandirse (broadcasting) hasta la forma de los valores (ej: una matriz año x punto de grilla,
+    con una columna de años y una fila de latitudes y otra de longitudes).
+    """
+
+    def __init__(self, dims: list[str], variables: list[str], coords: dict[str, np.ndarray] = None,
+                 dtype: np.dtype = np.float64) -> None:
+        self.dims: list[str] = list(dims)
+        self.variables: list[str] = list(variables)
+        self.dtype: np.dtype = dtype
+        # Coordenadas predefinidas de algunas dimensiones (se conservan en el orden indicado, ej: categorías)
+        self.fixed_coords: dict[str, np.ndarray] = {dim: np.asarray(v) for dim, v in (coords or {}).items()}
+        self._uniques: dict[str, list[np.ndarray]] = {dim: [] for dim in self.dims if dim not in self.fixed_coords}
+        self._blocks: list[tuple[dict[str, CoordinateColumn], dict[str, np.ndarray]]] = []
+
+    def add(self, values: dict[str, np.ndarray], **columns: Union[np.ndarray, CoordinateColumn]) -> None:
+        # Agregar un bloque de datos: los valores de cada variable y la columna de coordenadas de cada dimensión
+        # (sin factorizar, o ya factorizada, ej: por el lector del archivo)
+        if set(columns) != set(self.dims):
+            raise ValueError(f'Grid columns ({", ".join(columns)}) differ from its dims ({", ".join(self.dims)})')
+        if set(values) - set(self.variables):
+            raise ValueError(f'Unknown grid variables: {", ".join(set(values) - set(self.variables))}')
+        block_columns = {}
+        for dim in self.dims:
+            column = columns[dim]
+            if not isinstance(column, CoordinateColumn):
+                column = CoordinateColumn.factorize(column)
+            if np.any(column.codes < 0):
+                raise ValueError(f'Missing {dim} values cannot be added to a grid')
+            if dim in self._uniques:
+                self._uniques[dim].append(column.uniques)
+            block_columns[dim] = column
+        self._blocks.append((block_columns, values))
+
+    def coords(self) -> dict[str, np.ndarray]:
+        return {
+            dim: self.fixed_coords[dim] if dim in self.fixed_coords else
+            np.unique(np.concatenate(self._uniques[dim])) if self._uniques[dim] else np.empty(0)
+            for dim in self.dims
+        }
+
+    def __positions(self, dim: str, coords: np.ndarray, column: CoordinateColumn) -> np.ndarray:
+        # Posición de cada celda de la columna en las coordenadas de la grilla: solo se ubican los valores únicos de
+        # la columna, y no cada una de sus celdas
+        if dim not in self.fixed_coords:
+            return np.searchsorted(coords, column.uniques)[column.codes]
+        positions = pd.Index(coords).get_indexer(column.uniques)
+        if np.any(positions < 0):
+            raise ValueError(f'{dim} values not in the grid coordinates: {column.uniques[positions < 0]}')
+        return positions[column.codes]
+
+    def to_dataset(self) -> xr.Dataset:
+        # Ubicar los valores de cada bloque en la grilla (los bloques se liberan a medida que se ubican)
+        coords = self.coords()
+        shape = tuple(coords[dim].size for dim in self.dims)
+        data_vars = {var: np.full(shape, np.nan, dtype=self.dtype) for var in self.variables}
+        filled, n_cells = np.zeros(shape, dtype=bool), 0
+        while self._blocks:
+            columns, values = self._blocks.pop(0)
+            position = tuple(self.__positions(dim, coords[dim], columns[dim]) for dim in self.dims)
+            for var, var_values in values.items():
+                data_vars[var][position] = var_values
+            filled[position] = True
+            n_cells += np.broadcast(*position).size
+
+        # Cada celda de la grilla solo puede estar una vez en los datos (como en un MultiIndex sin duplicados)
+        n_filled = np.count_nonzero(filled)
+        if n_filled != n_cells:
+            raise ValueError(f'{n_cells - n_filled} duplicated cells ({", ".join(self.dims)}) in grid data')
+
+        return xr.Dataset(data_vars={var: (self.dims, data) for var, data in data_vars.items()}, coords=coords)
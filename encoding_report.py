@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+
+import os
+import time
+import yaml
+import argparse
+import tempfile
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+# Change current directory (relative paths in the arguments are relative to the folder the script was called from)
+CALLER_FOLDER = os.getcwd()
+if os.path.dirname(__file__):
+    os.chdir(os.path.dirname(__file__))
+
+from configuration import ConfigFile
+from netcdf_encoding import NetCDFEncoding
+
+
+"""
+Configuraciones comparadas por defecto (además de la configuración actual de config.yaml)
+"""
+DEFAULT_SETTINGS = {
+    'none': {},
+    'zlib': {'zlib': True},
+    'zlib+chunks(init_time)': {'zlib': True, 'chunks': {'init_time': 1}},
+    'zlib+chunks(point)': {'zlib': True, 'chunks': {'latitude': 1, 'longitude': 1}},
+    'zlib+float32': {'zlib': True, 'dtype': 'float32'},
+    'zlib+lsd2': {'zlib': True, 'least_significant_digit': 2},
+    'zlib+int16': {'zlib': True, 'packing': 'int16'},
+}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description='Compare write time and file size of NetCDF files generated with different encodings')
+    parser.add_argument('files', nargs='+', type=str,
+        help='NetCDF files (e.g. files generated by the files processor) to be rewritten with each encoding.')
+    parser.add_argument('--settings', type=str, default=None, dest='settings',
+        help='YAML file with the encodings to be compared (name: {zlib: True, ...}). '
+             'By default, a predefined set of encodings and the encoding in config.yaml are compared.')
+    parser.add_argument('--repeat', type=int, default=3, dest='repeat',
+        help='Indicates how many times each file is written with each encoding (the best time is reported).')
+    return parser.parse_args()
+
+
+def read_settings(settings_file: str = None) -> dict[str, NetCDFEncoding]:
+    # Leer las configuraciones a comparar (por defecto, las predefinidas y la de config.yaml)
+    if settings_file is not None:
+        with open(settings_file, 'r') as f:
+            settings = yaml.safe_load(f)
+    else:
+        settings = dict(DEFAULT_SETTINGS, **{'config.yaml': ConfigFile.Instance().get('encoding') or {}})
+    return {name: NetCDFEncoding(**(options or {})) for name, options in settings.items()}
+
+
+def max_abs_error(original: xr.Dataset, written_file: str) -> float:
+    # Máxima diferencia absoluta entre los datos originales y los datos leídos del archivo generado
+    with xr.open_dataset(written_file) as written:
+        errors = [np.nanmax(np.abs(original[var].values - written[var].values), initial=0)
+                  for var in original.data_vars if np.issubdtype(original[var].dtype, np.number)]
+    return float(max(errors, default=0))
+
+
+def compare_encodings(file_name: str, settings: dict[str, NetCDFEncoding], repeat: int) -> pd.DataFrame:
+    # Leer el archivo completo en memoria (el tiempo de lectura no debe afectar el tiempo de escritura), sin la
+    # codificación original del archivo (solo se debe aplicar la codificación de cada configuración)
+    with xr.open_dataset(file_name) as ds:
+        ds = ds.load().drop_encoding()
+    # Escribir el archivo con cada una de las configuraciones
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp_folder:
+        for name, setting in settings.items():
+            output_file = os.path.join(tmp_folder, f'{len(rows)}.nc')
+            encoding = setting.variable_encoding(ds)
+            write_times = []
+            for _ in range(max(1, repeat)):
+                start = time.perf_counter()
+                ds.to_netcdf(output_file, encoding=encoding)
+                write_times.append(time.perf_counter() - start)
+            rows.append({
+                'file': os.path.basename(file_name), 'encoding': name,
+                'write_time_s': min(write_times), 'size_mb': os.path.getsize(output_file) / 2**20,
+                'max_abs_error': max_abs_error(ds, output_file)
+            })
+    # Retornar una fila por configuración (el tamaño relativo se calcula respecto a la primera configuración)
+    report = pd.DataFrame(rows)
+    report['size_ratio'] = report['size_mb'] / report['size_mb'].iloc[0]
+    return report
+
+
+if __name__ == '__main__':
+
+    # Catch and parse command-line arguments
+    parsed_args: argparse.Namespace = parse_args()
+
+    # Leer las configuraciones a comparar
+    settings_file = os.path.join(CALLER_FOLDER, parsed_args.settings) if parsed_args.settings else None
+    encoding_settings = read_settings(settings_file)
+
+    # Comparar las configuraciones para cada archivo
+    reports = [compare_encodings(os.path.join(CALLER_FOLDER, f), encoding_settings, parsed_args.repeat)
+               for f in parsed_args.files]
+
+    # Reportar los resultados (para cada configuración: tiempo de escritura, tamaño y error máximo)
+    with pd.option_context('display.width', 200, 'display.float_format', '{:.4g}'.format):
+        print(pd.concat(reports, ignore_index=True).to_string(index=False))
@@ -13,3 +13,13 @@ class DescriptorError(Error):
     """Raised when a descriptor value is wrong"""
     pass
 
+
+
+class CubeError(Error):
+    """Raised when the output files of a cube cannot be combined"""
+    pass
+
+
+class ZarrStoreError(Error):
+    """Raised when a file cannot be written into a Zarr store"""
+    pass
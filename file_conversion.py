@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+from configuration import ConfigFile
+from errors import DescriptorError, CubeError
+from build_manifest import BuildManifest
+from instrumentation import InstrumentationSettings, measure_file, metrics_as_dict, resume_measure
+from conversion_pipeline import ConversionPipeline, PipelineSettings
+from file_reader import FileReader, LazyReadStrategy, ReadStrategyRegistry, READ_STRATEGIES_MODULE
+from netcdf_encoding import NetCDFEncoding
+from script import LOG_FORMAT, LOG_DATE_FORMAT
+
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterator
+
+import os
+import logging
+
+
+"""
+Cantidad de archivos que convierte cada proceso del pool antes de ser reemplazado por un proceso nuevo
+(al reciclar los procesos se acota el crecimiento de la memoria utilizada por pandas y xarray)
+"""
+MAX_TASKS_PER_WORKER = 10
+
+"""
+Entradas de la configuración definidas por los argumentos del script (se transmiten a los procesos del pool)
+"""
+ARGS_CONFIG_KEYS = ['overwrite_output', 'adopt_outputs']
+
+
+def define_read_strategy(file_type: str, descriptor_filename: str) -> LazyReadStrategy:
+    # Cada tipo de archivo tiene una única instancia de su estrategia de lectura (ver ReadStrategyRegistry)
+    registry = ReadStrategyRegistry.Instance()
+    if file_type in registry:
+        return registry.strategy(file_type)
+    else:
+        raise DescriptorError(f'El tipo de archivo indicado "{file_type}" es incorrecto. '
+                              f'Verifique el descriptor: {descriptor_filename}.')
+
+
+def unconverted_file_result(reader: FileReader, proc_file: dict) -> tuple[str, dict | None, None] | None:
+    # Si el archivo no existe, reportar el problema y continuar
+    input_file = reader.define_input_filename(proc_file)
+    if not os.path.isfile(input_file):
+        logging.warning(f"Missing file: {input_file}")
+        return 'missing', None, None
+
+    # Si el archivo ya existe y no debe ser sobrescrito, no debe ser convertido
+    # OBS: igualmente se retorna el registro del manifiesto (la fecha de modificación de la entrada pudo cambiar)
+    if not reader.output_file_must_be_created(proc_file):
+        return 'skipped', reader.manifest_record(proc_file), None
+
+    # Reportar archivo a ser procesado (solo en modo debug)
+    logging.debug(input_file)
+
+    # El archivo debe ser convertido
+    return None
+
+
+def convert_file(desc_file: Path, proc_file: dict) -> tuple[str, dict | None, dict | None]:
+    # Definir estrategia de lectura del archivo
+    read_strategy = define_read_strategy(proc_file.get('type'), desc_file.absolute().as_posix())
+
+    # Definir el objeto encargado de leer y convertir el archivo
+    reader = FileReader(read_strategy, desc_file, BuildManifest.Instance())
+
+    # Informar los archivos que no existen o que no deben ser convertidos
+    result = unconverted_file_result(reader, proc_file)
+    if result is not None:
+        return result
+
+    # Convertir archivo a NetCDF
+    reader.convert_file_to_netcdf(desc_file=proc_file)
+
+    # Informar que el archivo fue procesado (junto a las mediciones de la conversión, si se realizaron)
+    return 'processed', reader.manifest_record(proc_file), metrics_as_dict(reader.metrics)
+
+
+def run_conversion_job(job: tuple[Path, int, int, dict]) -> \
+        tuple[tuple[Path, int, int, dict], str, dict | None, dict | None]:
+    # Un trabajo está compuesto por: el descriptor, la posición del archivo en el descriptor,
+    # la cantidad de archivos en el descriptor y la entrada del descriptor que describe al archivo
+    desc_file, _, _, proc_file = job
+    # Retornar el trabajo junto al resultado de la conversión, al registro del manifiesto y a las mediciones
+    # OBS: los registros se agregan al manifiesto en el proceso principal (los procesos del pool no lo modifican)
+    return job, *convert_file(desc_file, proc_file)
+
+
+def conversion_job_input(job: tuple[Path, int, int, dict]) -> str | None:
+    # Archivo de entrada del trabajo, solo si debe ser convertido (los demás no se leen por adelantado)
+    desc_file, _, _, proc_file = job
+    reader = FileReader(define_read_strategy(proc_file.get('type'), desc_file.absolute().as_posix()), desc_file,
+                        BuildManifest.Instance())
+    input_file = reader.define_input_filename(proc_file)
+    if os.path.isfile(input_file) and reader.output_file_must_be_created(proc_file):
+        return input_file
+    return None
+
+
+def read_conversion_job(job: tuple[Path, int, int, dict]) -> \
+        tuple[tuple | None, Callable[[], tuple] | None]:
+    # Etapa del pipeline que se ejecuta en el hilo principal (ver ConversionPipeline): se lee el archivo en un
+    # Dataset y se retorna su escritura pendiente, que retorna el mismo resultado que run_conversion_job
+    desc_file, _, _, proc_file = job
+    reader = FileReader(define_read_strategy(proc_file.get('type'), desc_file.absolute().as_posix()), desc_file,
+                        BuildManifest.Instance())
+
+    # Informar los archivos que no existen o que no deben ser convertidos
+    result = unconverted_file_result(reader, proc_file)
+    if result is not None:
+        return (job, *result), None
+
+    # OBS: la escritura por partes (streaming_write) lee y escribe a la vez, se realiza en el hilo de escritura
+    if reader.streaming_write_applies(proc_file):
+        return None, lambda: run_conversion_job(job)
+
+    # Leer el archivo (las mediciones de la escritura se agregan en el hilo de escritura)
+    reader.load_read_strategy()
+    with measure_file(reader.define_input_filename(proc_file), reader.define_output_filename(proc_file),
+                      InstrumentationSettings.from_config()) as metrics:
+        ds = reader.read_output_dataset(proc_file)
+    record = reader.manifest_record(proc_file)
+
+    def write_conversion_job() -> tuple:
+        with resume_measure(metrics):
+            reader.write_output_dataset(ds, proc_file)
+        return job, 'processed', record, metrics_as_dict(metrics)
+
+    return None, write_conversion_job
+
+
+def run_conversion_jobs(pool, conversion_jobs: list[tuple[Path, int, int, dict]]) -> Iterator[tuple]:
+    # Convertir los archivos mediante el pool de procesos, en pipeline (ver sección "pipeline" en config.yaml) o en
+    # serie, y retornar los resultados a medida que los trabajos son completados
+    if pool is not None:
+        return pool.imap_unordered(run_conversion_job, conversion_jobs)
+    pipeline_settings = PipelineSettings.from_config()
+    if pipeline_settings.enabled and len(conversion_jobs) > 1:
+        return ConversionPipeline(pipeline_settings.queue_depth).run(
+            conversion_jobs, conversion_job_input, read_conversion_job)
+    return map(run_conversion_job, conversion_jobs)
+
+
+def update_cubes() -> int:
+    # Combinar los archivos de salida de cada cubo (ver entrada "cube" en template.yaml). Solo se vuelven a generar
+    # los cubos que no existen o que tienen algún archivo de salida nuevo, eliminado o modificado. Antes se olvidan
+    # los descriptores eliminados (sus archivos de salida dejan de formar parte de los cubos).
+    manifest = BuildManifest.Instance()
+    pruned_descriptors_count = manifest.prune_descriptors()
+    cubes = manifest.cube_members()
+    outdated_cubes = {c: m for c, m in cubes.items() if not manifest.cube_is_up_to_date(c, m)}
+
+    # Informar los cubos que no pudieron ser generados (y cuyos archivos no cambiaron desde entonces)
+    for cube_file in sorted(cubes.keys() - outdated_cubes.keys()):
+        if manifest.cubes.get(cube_file).get('error') is not None:
+            logging.warning(f'Cube {cube_file} was not built ({manifest.cubes.get(cube_file).get("error")})')
+    if not outdated_cubes:
+        return pruned_descriptors_count
+
+    # OBS: cube_builder importa xarray, solo se importa si hay cubos para generar
+    from cube_builder import build_cube
+
+    # Generar los cubos (un cubo que no puede ser generado no impide generar los demás)
+    updated_cubes_count = 0
+    for cube_file, member_files in outdated_cubes.items():
+        try:
+            build_cube(cube_file, member_files, NetCDFEncoding.from_config())
+        except CubeError as e:
+            logging.error(f'Cube {cube_file} could not be built ({e})')
+            manifest.update_cube(cube_file, member_files, str(e))
+            continue
+        manifest.update_cube(cube_file, member_files)
+        updated_cubes_count += 1
+        logging.info(f'Updated cube: {cube_file} ({len(member_files)} files)')
+
+    # Retornar la cantidad de cambios en el manifiesto: descriptores olvidados y cubos registrados (generados o no),
+    # si es mayor a 0 el manifiesto debe guardarse
+    logging.info(f'Updated cubes: {updated_cubes_count}/{len(outdated_cubes)}')
+    return pruned_descriptors_count + len(outdated_cubes)
+
+
+def init_pool_worker(args_config: dict, log_level: int) -> None:
+    # Los procesos del pool no heredan el estado del proceso principal (ver create_workers_pool): se configura el
+    # logger y se agregan a la configuración los valores definidos por los argumentos del script
+    logging.basicConfig(format=LOG_FORMAT, datefmt=LOG_DATE_FORMAT, level=log_level)
+    for key, value in args_config.items():
+        ConfigFile.Instance().set(key, value)
+
+
+@contextmanager
+def create_workers_pool(n_workers: int):
+    # Con un solo proceso no se crea el pool, los archivos se convierten en el proceso principal
+    if n_workers <= 1:
+        yield None
+        return
+    import multiprocessing
+    # OBS: no se usa "fork", el proceso principal tiene otros hilos (ej: el que renueva la reserva de ejecución, ver
+    # ScriptControl) y un proceso creado con fork mientras otro hilo tiene tomado un lock (ej: el del logger) queda
+    # bloqueado. Con "forkserver", los procesos se crean a partir de un servidor sin hilos, que importa las
+    # estrategias de lectura una sola vez (si no, cada proceso, y cada reemplazo de un proceso, debería importarlas)
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload(['__main__', READ_STRATEGIES_MODULE])
+    config = ConfigFile.Instance()
+    init_args = ({key: config.get(key) for key in ARGS_CONFIG_KEYS}, logging.getLogger().level)
+    with context.Pool(processes=n_workers, maxtasksperchild=MAX_TASKS_PER_WORKER,
+                      initializer=init_pool_worker, initargs=init_args) as pool:
+        yield pool
@@ -0,0 +1,112 @@
+
+from __future__ import annotations
+
+from helpers import crange, MonthsProcessor as Mpro
+
+from typing import Callable, Union
+
+import re
+
+
+"""
+Alternativas de las expresiones regulares con los meses (Jan|Feb|...) y con los trimestres (JFM|FMA|...)
+"""
+MONTHS_ALTERNATION = '|'.join(Mpro.months_abbr[1:])
+TRIMESTERS_ALTERNATION = '|'.join(Mpro.trimesters[1:])
+
+
+class FileNameInfo(object):
+    """
+    Metadatos extraídos del nombre de un archivo de entrada (los que no se indican en el nombre quedan en None)
+    """
+    __slots__ = ('forecast_month', 'target_months', 'variable', 'season', 'year')
+
+    def __init__(self) -> None:
+        self.forecast_month: Union[int, None] = None  # mes de corrida
+        self.target_months: Union[tuple[int, ...], None] = None  # meses objetivo
+        self.variable: Union[str, None] = None  # variable, con el nombre usado en los NetCDF (prcp o t2m)
+        self.season: Union[str, None] = None  # trimestre objetivo (ej: FMA)
+        self.year: Union[int, None] = None  # año de corrida (tiempo real) o primer año (observaciones)
+
+    @property
+    def first_target_month(self) -> Union[int, None]:
+        return self.target_months[0] if self.target_months else None
+
+    def __repr__(self) -> str:
+        return f'FileNameInfo({", ".join(f"{k}={getattr(self, k)!r}" for k in self.__slots__)})'
+
+
+class FileNameRule(object):
+    """
+    Expresión regular (compilada al definir la regla) y función que convierte su primera coincidencia en el nombre
+    del archivo en uno o más campos de FileNameInfo
+    """
+    __slots__ = ('regex', 'fields', 'required')
+
+    def __init__(self, pattern: str, fields: Callable[[re.Match], dict], required: bool = True) -> None:
+        self.regex: re.Pattern = re.compile(pattern)
+        self.fields: Callable[[re.Match], dict] = fields
+        self.required: bool = required
+
+
+class FileNameParser(object):
+    """
+    Extrae los metadatos del nombre de los archivos de un tipo (ver file_name_parser en cada estrategia de lectura).
+    Las reglas se evalúan una única vez por archivo, el resultado es un FileNameInfo (común a todas las estrategias).
+    """
+
+    def __init__(self, *rules: FileNameRule) -> None:
+        self.rules: tuple[FileNameRule, ...] = rules
+
+    def parse(self, file_name: str) -> FileNameInfo:
+        info = FileNameInfo()
+        for rule in self.rules:
+            match = rule.regex.search(file_name)
+            if match is None:
+                if rule.required:
+                    raise ValueError(f'Pattern "{rule.regex.pattern}" not found in file name: {file_name}')
+                continue
+            for field, value in rule.fields(match).items():
+                setattr(info, field, value)
+        return info
+
+
+def cpt_months(match: re.Match) -> dict:
+    # Mes de corrida y meses objetivo en los archivos de CPT (ej: Janic_2-4_ -> enero, febrero a abril)
+    first_target_month = int(match.group(2))
+    last_target_month = int(match.group(3)) if match.group(3) else None
+    return {
+        'forecast_month': Mpro.month_abbr_to_int(match.group(1)),
+        'target_months': (first_target_month,) if last_target_month is None else
+        tuple(crange(first_target_month, last_target_month + 1, 12))
+    }
+
+
+def target_months(match: re.Match) -> dict:
+    # Meses objetivo sin mes de corrida (ej: _2.txt -> febrero, _2-4.txt -> febrero a abril)
+    first_target_month = int(match.group(1))
+    last_target_month = int(match.group(2)) if match.group(2) else None
+    return {
+        'target_months': (first_target_month,) if last_target_month is None else
+        tuple(crange(first_target_month, last_target_month + 1, 12))
+    }
+
+
+def month(match: re.Match) -> dict:
+    return {'forecast_month': Mpro.month_abbr_to_int(match.group(1))}
+
+
+def season(match: re.Match) -> dict:
+    return {'season': match.group(1)}
+
+
+def year(match: re.Match) -> dict:
+    return {'year': int(match.group(1))}
+
+
+def variable(names: dict[str, str] = None) -> Callable[[re.Match], dict]:
+    # La variable se renombra según names (ej: prec -> prcp), si no se indica names se conserva el nombre
+    def fields(match: re.Match) -> dict:
+        return {'variable': match.group(1) if names is None else names.get(match.group(1))}
+    return fields
+
@@ -0,0 +1,350 @@
+from __future__ import annotations
+
+from configuration import ConfigFile
+from errors import ConfigError, DescriptorError
+from build_manifest import BuildManifest
+from file_names import FileNameInfo, FileNameParser
+from netcdf_encoding import NetCDFEncoding
+from instrumentation import FileMetrics, InstrumentationSettings, measure_file, stage, unassigned_time
+from singleton import Singleton
+
+from abc import ABC, abstractmethod
+from dataclasses import asdict
+from functools import cached_property
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import os
+import importlib
+
+# OBS: xarray solo se utiliza en las anotaciones, los módulos de lectura (ej: read_strategies) importan pandas,
+# xarray y netCDF4, y solo se importan cuando un archivo debe ser convertido (ver LazyReadStrategy)
+if TYPE_CHECKING:
+    from xarray import Dataset
+
+
+"""
+Módulo con las estrategias de lectura del proyecto y clase de la estrategia de lectura de cada tipo de archivo (el
+módulo se importa recién cuando un archivo debe ser convertido, ver LazyReadStrategy)
+"""
+READ_STRATEGIES_MODULE = 'read_strategies'
+READ_STRATEGIES = {
+    'ereg_det_output': 'ReadEREGoutputDET',
+    'ereg_prob_output': 'ReadEREGoutputPROB',
+    'ereg_sissa_output': 'ReadEREGoutputSISSA',
+    'ereg_obs_data': 'ReadEREGobservedData',
+    'crcsas_obs_data': 'ReadCRCSASobs',
+    'cpt_det_output': 'ReadCPToutputDET',
+    'cpt_prob_output': 'ReadCPToutputPROB',
+    'cpt_predictand': 'ReadCPTpredictand',
+    'cpt_predictor': 'ReadCPTpredictor',
+}
+
+"""
+Formatos de los archivos de salida (entrada "format" de output_file) y la extensión que se usa en cada caso cuando
+el descriptor no define el nombre del archivo de salida
+"""
+OUTPUT_FORMATS = {'netcdf': '.nc', 'zarr': '.zarr'}
+
+"""
+Modos de escritura de los almacenes Zarr en los que varias entradas escriben en el mismo almacén (ver zarr_output.py)
+"""
+SHARED_ZARR_MODES = ['append', 'region']
+
+
+class ReadStrategy(ABC):
+    """
+    The Strategy Interface (Desing Pattern -> Strategy)
+    """
+    file_name_parser: FileNameParser | None = None  # metadatos en el nombre de los archivos (ver file_names.py)
+
+    def load(self) -> ReadStrategy:
+        # Estrategia que lee los archivos (con sus módulos ya importados, ver LazyReadStrategy)
+        return self
+
+    def file_name_info(self, file_name: str) -> FileNameInfo:
+        # Metadatos del nombre del archivo (mes de corrida, meses objetivo, variable, etc.), según file_name_parser
+        return self.file_name_parser.parse(file_name) if self.file_name_parser is not None else FileNameInfo()
+
+    @abstractmethod
+    def read_data(self, file_name: str, desc_file: dict = None) -> Dataset:
+        pass
+
+    def stream_to_netcdf(self, file_name: str, output_file: str, encoding: NetCDFEncoding,
+                         desc_file: dict = None) -> bool:
+        # Escribir el archivo NetCDF por partes, sin leer todos los datos en memoria. Por defecto, las estrategias
+        # no lo permiten (se retorna False y el archivo se lee completo con read_data)
+        return False
+
+
+class LazyReadStrategy(ReadStrategy):
+    """
+    Estrategia de lectura cuyo módulo se importa recién cuando se debe leer un archivo. Permite definir el lector de
+    cada archivo y verificar si el archivo de salida debe ser generado sin importar los módulos de lectura.
+    """
+
+    def __init__(self, module_name: str, class_name: str, file_name_parser: FileNameParser = None) -> None:
+        self.module_name: str = module_name
+        self.class_name: str = class_name
+        self.file_name_parser: FileNameParser | None = file_name_parser  # por defecto, el de la estrategia
+
+    @cached_property
+    def strategy(self) -> ReadStrategy:
+        strategy = getattr(importlib.import_module(self.module_name), self.class_name)()
+        if self.file_name_parser is not None:
+            strategy.file_name_parser = self.file_name_parser
+        return strategy
+
+    def load(self) -> ReadStrategy:
+        return self.strategy
+
+    def file_name_info(self, file_name: str) -> FileNameInfo:
+        return self.strategy.file_name_info(file_name)
+
+    def read_data(self, file_name: str, desc_file: dict = None) -> Dataset:
+        return self.strategy.read_data(file_name, desc_file)
+
+    def stream_to_netcdf(self, file_name: str, output_file: str, encoding: NetCDFEncoding,
+                         desc_file: dict = None) -> bool:
+        return self.strategy.stream_to_netcdf(file_name, output_file, encoding, desc_file)
+
+
+@Singleton
+class ReadStrategyRegistry(object):
+    """
+    Registro de las estrategias de lectura de cada tipo de archivo (entrada "type" de los descriptores): las del
+    proyecto (READ_STRATEGIES), las definidas en config.yaml (sección "read_strategies") y las registradas con
+    register (ej: por otros proyectos). Cada tipo tiene una única instancia de su estrategia de lectura, que se
+    crea al leer el primer archivo de ese tipo y se reutiliza para todos los demás.
+    """
+
+    def __init__(self) -> None:
+        self._strategies: dict[str, LazyReadStrategy] = {}
+        for file_type, class_name in READ_STRATEGIES.items():
+            self.register(file_type, READ_STRATEGIES_MODULE, class_name)
+        for file_type, entry in (ConfigFile.Instance().get('read_strategies') or {}).items():
+            if not isinstance(entry, dict) or not entry.get('module') or not entry.get('class'):
+                raise ConfigError(f'The read strategy of type "{file_type}" must define its module and class')
+            self.register(file_type, entry.get('module'), entry.get('class'))
+
+    def register(self, file_type: str, module_name: str, class_name: str,
+                 file_name_parser: FileNameParser = None) -> None:
+        # Registrar (o reemplazar) la estrategia de lectura de un tipo de archivo (el módulo no se importa aquí)
+        self._strategies[file_type] = LazyReadStrategy(module_name, class_name, file_name_parser)
+
+    def __contains__(self, file_type: str) -> bool:
+        return file_type in self._strategies
+
+    @property
+    def file_types(self) -> list[str]:
+        return list(self._strategies.keys())
+
+    def strategy(self, file_type: str) -> LazyReadStrategy:
+        return self._strategies[file_type]
+
+
+class FileReader(object):
+    """
+    The Context (Desing Pattern -> Strategy)
+    """
+
+    def __init__(self, strategy: ReadStrategy, desc_file: Path, manifest: BuildManifest = None) -> None:
+        self._read_strategy = strategy
+        self._descriptor_file = desc_file
+        self._manifest = manifest
+        self.metrics: FileMetrics | None = None  # mediciones de la última conversión (ver instrumentation.py)
+
+    @property
+    def read_strategy(self) -> ReadStrategy:
+        return self._read_strategy
+
+    @read_strategy.setter
+    def read_strategy(self, strategy: ReadStrategy) -> None:
+        self._read_strategy = strategy
+
+    @property
+    def reader_module(self) -> str:
+        # Nombre del módulo que define la estrategia de lectura (sin importarlo, ver LazyReadStrategy)
+        if isinstance(self._read_strategy, LazyReadStrategy):
+            return self._read_strategy.module_name
+        return type(self._read_strategy).__module__
+
+    def define_input_filename(self, desc_file: dict):
+        # Definir carpeta del archivo a leer
+        desc_file_path = desc_file.get('path')
+        if desc_file_path == '.':
+            desc_file_path = self._descriptor_file.parent.absolute().as_posix()
+        # Definir nombre del archivo a leer
+        input_filename = os.path.join(desc_file_path, desc_file.get('name'))
+        # Si el path no es absoluto, anteponer la carpeta con los descriptores
+        if not os.path.isabs(input_filename):
+            input_filename = os.path.join(ConfigFile.Instance().get('folders').get('descriptor_files'), input_filename)
+        # Retornar el nombre del archivo a leer
+        return input_filename
+
+    def define_output_filename(self, desc_file: dict = None) -> str:
+        # Definir nombre del archivo a leer
+        input_filename = self.define_input_filename(desc_file)
+        # Definir el nombre del archivo NetCDF o Zarr (para los casos en los que no se defina output_file)
+        output_extension = OUTPUT_FORMATS[self.define_output_format(desc_file)]
+        output_filename = f"{os.path.splitext(input_filename)[0]}{output_extension}"
+        # Definir el nombre del archivo NetCDF (para los casos en los que sí se defina output_file)
+        if desc_file is not None and desc_file.get('output_file') is not None:
+            # Obtener la carpeta de destino
+            output_path = desc_file.get('output_file').get('path', os.path.dirname(output_filename))
+            # Si lo que se obtiene no es un path absoluto, anteponer la carpeta con los descriptores
+            if not os.path.isabs(output_path):
+                output_path = os.path.join(ConfigFile.Instance().get('folders').get('descriptor_files'), output_path)
+            # Obtener el nombre del archivo de destino (sin carpeta, solo el nombre del archivo)
+            output_file = desc_file.get('output_file').get('name', os.path.basename(output_filename))
+            # Definir el path absoluto para el archivo de destino
+            output_filename = os.path.join(output_path, output_file)
+        # Retornar el nombre definido
+        return output_filename
+
+    def define_output_format(self, desc_file: dict = None) -> str:
+        # Formato del archivo de salida (por defecto, NetCDF)
+        output_format = ((desc_file or {}).get('output_file') or {}).get('format', 'netcdf')
+        if output_format not in OUTPUT_FORMATS:
+            raise DescriptorError(f'Formato de salida inválido: {output_format} '
+                                  f'(válidos: {", ".join(OUTPUT_FORMATS)}). '
+                                  f'Verifique el descriptor: {self._descriptor_file}.')
+        return output_format
+
+    def define_zarr_mode(self, desc_file: dict = None) -> str:
+        # Modo de escritura del almacén Zarr (por defecto, el almacén se genera completo, ver zarr_output.py)
+        return ((desc_file or {}).get('output_file') or {}).get('zarr_mode', 'write')
+
+    def output_is_shared(self, desc_file: dict = None) -> bool:
+        # Varias entradas (de uno o más descriptores) escriben en el mismo almacén Zarr
+        return self.define_output_format(desc_file) == 'zarr' and self.define_zarr_mode(desc_file) in SHARED_ZARR_MODES
+
+    def define_cube_filename(self, desc_file: dict = None) -> str | None:
+        # Cubo que combina este archivo de salida con los de otras entradas (solo si se define la entrada "cube")
+        if desc_file is None or desc_file.get('cube') is None:
+            return None
+        # Un almacén Zarr no puede ser parte de un cubo (para combinar pronósticos se usa el modo append o region)
+        if self.define_output_format(desc_file) == 'zarr':
+            raise DescriptorError(f'La entrada "cube" solo puede usarse con archivos de salida NetCDF. '
+                                  f'Verifique el descriptor: {self._descriptor_file}.')
+        if desc_file.get('cube').get('name') is None:
+            raise DescriptorError(f'La entrada "cube" debe indicar el nombre del cubo (name). '
+                                  f'Verifique el descriptor: {self._descriptor_file}.')
+        # Si la carpeta del cubo no se indica, se usa la carpeta del archivo de salida
+        cube_path = desc_file.get('cube').get('path', os.path.dirname(self.define_output_filename(desc_file)))
+        # Si lo que se obtiene no es un path absoluto, anteponer la carpeta con los descriptores
+        if not os.path.isabs(cube_path):
+            cube_path = os.path.join(ConfigFile.Instance().get('folders').get('descriptor_files'), cube_path)
+        # Retornar el path absoluto del cubo
+        return os.path.join(cube_path, desc_file.get('cube').get('name'))
+
+    def output_file_must_be_created(self, desc_file: dict = None) -> bool:
+        # Leer configuración del script
+        config = ConfigFile.Instance()
+        # Si el archivo de salida no existe, el archivo de salida deber ser creado
+        if not os.path.exists(self.define_output_filename(desc_file)):
+            return True
+        # Si en la configuración así se indica, el archivo de salida deber ser creado
+        if config.get('overwrite_output', False) is True:
+            return True
+        # Si el descriptor así lo indica, el archivo de salida deber ser creado
+        if desc_file.get('update_output', False) is True:
+            return True
+        # Si el archivo de entrada, la entrada del descriptor o el lector cambiaron, el archivo de salida deber ser
+        # creado (solo si se utiliza un manifiesto de los archivos generados)
+        if self._manifest is not None:
+            record = self.manifest_record(desc_file)
+            # Con --adopt-outputs, los archivos de salida sin registro en el manifiesto (ej: generados antes de que
+            # existiera el manifiesto) se consideran actualizados y se registran tal como están (no se regeneran)
+            if config.get('adopt_outputs', False) is True and not self._manifest.has_output(record):
+                return False
+            if not self._manifest.output_is_up_to_date(record):
+                return True
+        # En cualquier otro caso, el archivo de salida no debe ser creado
+        return False
+
+    def manifest_record(self, desc_file: dict = None) -> dict | None:
+        # Registro del manifiesto que describe cómo se genera el archivo de salida
+        if self._manifest is None:
+            return None
+        # OBS: la codificación (config.yaml y descriptor) también determina el contenido del archivo de salida
+        manifest_entry = dict(desc_file, encoding=asdict(NetCDFEncoding.from_config(desc_file)))
+        # OBS: en un almacén Zarr compartido, cada entrada escribe solo sus init_time, por eso el registro se
+        # identifica por el almacén y por el archivo de entrada
+        output_filename, input_filename = self.define_output_filename(desc_file), self.define_input_filename(desc_file)
+        output_key = f'{output_filename}::{input_filename}' if self.output_is_shared(desc_file) else None
+        return self._manifest.output_record(
+            output_filename, input_filename, manifest_entry, self.reader_module, self.define_cube_filename(desc_file),
+            output_key)
+
+    def read_file(self, desc_file: dict = None) -> Dataset:
+        # Definir nombre del archivo a leer
+        input_filename = self.define_input_filename(desc_file)
+        # Retornar el ds con los datos leídos del archivo
+        return self._read_strategy.read_data(input_filename, desc_file)
+
+    def convert_file_to_netcdf(self, desc_file: dict = None) -> None:
+        # Convertir archivo solo si el archivo de salida debe ser creado
+        self.metrics = None
+        if self.output_file_must_be_created(desc_file):
+            self.load_read_strategy()
+            # Medir la conversión (solo si así se indica en config.yaml, ver sección "instrumentation")
+            with measure_file(self.define_input_filename(desc_file), self.define_output_filename(desc_file),
+                              InstrumentationSettings.from_config()) as metrics:
+                self.metrics = metrics
+                # Escribir el archivo por partes (si es posible) o leerlo completo y luego escribirlo
+                if not self.stream_output(desc_file):
+                    self.write_output_dataset(self.read_output_dataset(desc_file), desc_file)
+
+    def load_read_strategy(self) -> None:
+        # Importar el módulo de lectura (y pandas, xarray, etc.) antes de medir la conversión de un archivo
+        # OBS: de lo contrario, la importación se asigna a la lectura (to_xarray) del primer archivo convertido
+        self._read_strategy.load()
+
+    def streaming_write_applies(self, desc_file: dict = None) -> bool:
+        # Escribir el archivo NetCDF por partes, si así se indica (la estrategia de lectura también debe permitirlo)
+        # OBS: el empaquetado (packing) requiere el rango de todos los datos, por eso no puede usarse en este caso
+        return self.define_output_format(desc_file) == 'netcdf' and self.streaming_write_enabled(desc_file) and \
+            NetCDFEncoding.from_config(desc_file).packing is None
+
+    def stream_output(self, desc_file: dict = None) -> bool:
+        # Escribir el archivo NetCDF por partes, sin leer todos los datos en memoria. Se retorna False si no
+        # corresponde o si la estrategia de lectura no lo permite (en ese caso, el archivo se lee completo)
+        if not self.streaming_write_applies(desc_file):
+            return False
+        return self._read_strategy.stream_to_netcdf(
+            self.define_input_filename(desc_file), self.define_output_filename(desc_file),
+            NetCDFEncoding.from_config(desc_file), desc_file)
+
+    def read_output_dataset(self, desc_file: dict = None) -> Dataset:
+        # Leer el archivo en un Dataset (el tiempo de lectura no asignado a otras etapas, ej: parse o transform,
+        # corresponde a la creación del Dataset)
+        with unassigned_time('to_xarray'):
+            ds = self.read_file(desc_file)
+        # Convert categories to strings (categories can't be saved to NetCDF files!)
+        for var in ds.variables:
+            if ds[var].dtype == 'category':
+                ds[var] = ds[var].astype(str)
+        return ds
+
+    def write_output_dataset(self, ds: Dataset, desc_file: dict = None) -> None:
+        # Definir la codificación de las variables (según config.yaml y el descriptor)
+        encoding = NetCDFEncoding.from_config(desc_file)
+        with ds:
+            # Guardar el dataset en un almacén Zarr (con la codificación definida en config.yaml y en el descriptor)
+            # OBS: zarr_output importa xarray y zarr, solo se importa si algún archivo se guarda en formato Zarr
+            if self.define_output_format(desc_file) == 'zarr':
+                from zarr_output import write_zarr
+                with stage('zarr_write'):
+                    write_zarr(ds, self.define_output_filename(desc_file), encoding, self.define_zarr_mode(desc_file))
+                return
+            # Guardar el dataset en un NetCDF (con la codificación definida en config.yaml y en el descriptor)
+            with stage('netcdf_write'):
+                ds.to_netcdf(self.define_output_filename(desc_file), encoding=encoding.variable_encoding(ds))
+
+    @staticmethod
+    def streaming_write_enabled(desc_file: dict = None) -> bool:
+        # El descriptor tiene prioridad sobre la configuración general (config.yaml)
+        if desc_file is not None and desc_file.get('streaming_write') is not None:
+            return desc_file.get('streaming_write') is True
+        return ConfigFile.Instance().get('streaming_write', False) is True
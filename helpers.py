@@ -1,29 +1,16 @@
 
-from contextlib import contextmanager
-from itertools import chain, repeat
+from __future__ import annotations
+
 from dataclasses import dataclass
+from itertools import chain, repeat
 from pathlib import Path
-from typing import Union
-from datetime import datetime
 from typing import List
 
-import locale
+import os
 import calendar
 import re
 
 
-@contextmanager
-def localized(new_locale: str):
-    original_locale = '.'.join(
-        p for p in locale.getlocale() if p)
-    if new_locale == original_locale:
-        yield
-    else:
-        locale.setlocale(locale.LC_ALL, new_locale)
-        yield
-        locale.setlocale(locale.LC_ALL, original_locale)
-
-
 def crange(start: int, stop: int, modulo: int):
     # Verificar argumentos
     if start > modulo:
@@ -53,11 +40,14 @@ def nrange(start: int, n_steps: int, modulo: int):
 
 class MonthsProcessor(object):
 
-    with localized("en_US.UTF-8"):
-        months_abbr = list(calendar.month_abbr)
+    # Nombres de los meses en inglés (tablas estáticas, no dependen del locale del proceso)
+    # OBS: el índice 0 es vacío, como en calendar.month_abbr y calendar.month_name!!
+    months_abbr = ['', 'Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+    months_names = ['', 'January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September',
+                    'October', 'November', 'December']
 
-    with localized("en_US.UTF-8"):
-        months_names = list(calendar.month_name)
+    # Tabla precalculada con la cantidad de días de cada mes (en un año no bisiesto)
+    month_days_table = tuple(calendar.mdays)
 
     # OBS: los índices indican el mes inicial de cada trimestre!!
     trimesters = ['', 'JFM', 'FMA', 'MAM', 'AMJ', 'MJJ', 'JJA', 'JAS', 'ASO', 'SON', 'OND', 'NDJ', 'DJF']
@@ -90,50 +80,114 @@ class MonthsProcessor(object):
         return sum(calendar.mdays[m] for m in months) + days_to_add
 
     @classmethod
-    def n_days_in_months(cls, fcst_year: int, fcst_month: int, trgt_months: List[int]) -> int:
+    def is_leap(cls, year):
+        # Funciona tanto para un año (int) como para un arreglo de años (np.ndarray)
+        return (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+
+    @classmethod
+    def n_days_in_months(cls, fcst_year, fcst_month, trgt_months: List[int]):
+        # Funciona tanto para un año y mes (int) como para arreglos de años y meses (np.ndarray), en el segundo
+        # caso, se calcula la cantidad de días para todos los años a la vez (sin usar calendar.monthrange)
         n_days = 0
         for c_month in trgt_months:
-            n_days += calendar.monthrange(fcst_year if fcst_month <= c_month else fcst_year+1, c_month)[1]
+            c_year = fcst_year + (fcst_month > c_month)
+            n_days = n_days + cls.month_days_table[c_month] + (c_month == 2) * cls.is_leap(c_year)
         return n_days
 
 
-@dataclass
-class CPToutputFileInfo(object):
-    n_rows: int
-    n_cols: int
-    na_values: Union[int, float, str]
-    header_line: int
-    data_first_line: int
-    field_n_rows: int
-    header_n_rows: int
-
-
-@dataclass
-class CPTpredictorFileInfo(object):
-    n_rows: int
-    n_cols: int
-    na_values: Union[int, float, str]
-    field_line: int
-    start_date: datetime
-    target_first_month_date: datetime
-    target_last_month_date: datetime
-
-
-class FilesSearcher(object):
-
-    def __init__(self, target_files: list[Path]):
-        self.target_files: list[Path] = target_files
-
-    def filter_files(self, search_patterns: list[str]) -> list[Path]:
-
-        # Crear lista para almacenar los archivos seleccionados
-        desc_files: list[Path] = []
-
-        # Iterar sobre los patrones de búsqueda recibidos y seleccionar archivos
-        for regex in search_patterns:
-            pattern = re.compile(regex)  # compilar el patrón de búsqueda
-            c_desc_files = [p for p in self.target_files if p.is_file() and pattern.search(p.name)]
-            desc_files.extend(c_desc_files)  # Almacenar archivos seleccionados
-
-        # Retornar archivos que cumplen con los patrónes de búsqueda
-        return desc_files
+@dataclass(frozen=True)
+class DescFileName(object):
+    """
+    Información extraída del nombre de un descriptor (el nombre se analiza una única vez, al crear el índice)
+    """
+    path: Path
+    kind: str  # ereg, predictand o forecast (predictores y salidas de PyCPT)
+    variable: str | None = None  # ej: prcp, t2m, precip
+    dataset: str | None = None  # ej: chirps, era5-land, SEAS5
+    init_month_abbr: str | None = None  # ej: Jan (mes de inicialización, o mes del descriptor de EREG)
+    target_months: tuple[int, ...] = ()  # ej: (2,) para pronos mensuales, (1, 3) para pronos trimestrales
+    years: tuple[int, ...] = ()  # ej: (2021,) o (2024, 2024), años de los meses objetivo (o año de EREG)
+
+
+class DescFilesIndex(object):
+    """
+    Índice de los descriptores en una carpeta (y sus subcarpetas). La carpeta se recorre una única vez (os.scandir),
+    el nombre de cada descriptor se analiza una única vez y la selección de descriptores se hace mediante búsquedas
+    en diccionarios (sin volver a recorrer la carpeta, ni aplicar expresiones regulares sobre todos los archivos).
+    """
+
+    # Patrones de los nombres de los descriptores
+    ereg_all_regex = re.compile(r'.*_descriptors.*\.yaml')
+    ereg_month_regex = re.compile(rf'.*_({"|".join(MonthsProcessor.months_abbr[1:])})(\d{{4}})\.yaml')
+    predictand_regex = re.compile(r'(prcp|t2m)_(chirps|era5-land)_(\d{1,2})(?:-(\d{1,2}))?\.yaml$')
+    forecast_regex = re.compile(rf'(?:(?:^|.*_)([^_]+)_)?([^_]+)_({"|".join(MonthsProcessor.months_abbr[1:])})ic_'
+                                rf'(\d{{1,2}})(?:-(\d{{1,2}}))?_.*_(\d{{4}})(?:-(\d{{4}}))?_1\.yaml$')
+
+    def __init__(self, target_folder: Path, excluded_files: tuple[str, ...] = ('template.yaml',)):
+        self.target_folder: Path = target_folder
+        self.ereg_all: list[DescFileName] = []
+        self.ereg_by_month: dict[tuple[str, int], list[DescFileName]] = {}
+        self.predictands: dict[tuple[int, ...], list[DescFileName]] = {}
+        self.forecasts: dict[tuple[str, tuple[int, ...], tuple[int, ...]], list[DescFileName]] = {}
+        # Los archivos se indexan ordenados (como lo hacía sorted(rglob(...)))
+        for file_path in sorted(self.scan_folder(target_folder)):
+            if file_path.name not in excluded_files:
+                self.__add_file(file_path)
+
+    @staticmethod
+    def scan_folder(folder: Path) -> list[Path]:
+        # Recorrer la carpeta y sus subcarpetas (sin seguir los enlaces a carpetas), solo se retornan archivos yaml
+        # OBS: scandir informa el tipo de cada entrada, por lo que no es necesario consultar cada archivo (stat)
+        yaml_files, pending_folders = [], [folder]
+        while pending_folders:
+            try:
+                with os.scandir(pending_folders.pop()) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            pending_folders.append(Path(entry.path))
+                        elif entry.name.endswith('.yaml') and entry.is_file():
+                            yaml_files.append(Path(entry.path))
+            except (FileNotFoundError, NotADirectoryError, PermissionError):
+                continue
+        return yaml_files
+
+    def __add_file(self, file_path: Path) -> None:
+        name = file_path.name
+        # Descriptores de EREG (un mismo descriptor puede cumplir con ambos patrones)
+        if self.ereg_all_regex.fullmatch(name):
+            self.ereg_all.append(DescFileName(file_path, 'ereg'))
+        if match := self.ereg_month_regex.fullmatch(name):
+            info = DescFileName(file_path, 'ereg', init_month_abbr=match.group(1), years=(int(match.group(2)),))
+            self.ereg_by_month.setdefault((info.init_month_abbr, info.years[0]), []).append(info)
+        # Descriptores de PyCPT: datos observados (predictandos)
+        if match := self.predictand_regex.search(name):
+            info = DescFileName(file_path, 'predictand', variable=match.group(1), dataset=match.group(2),
+                                target_months=tuple(int(m) for m in match.group(3, 4) if m))
+            self.predictands.setdefault(info.target_months, []).append(info)
+        # Descriptores de PyCPT: predictores y pronósticos
+        if match := self.forecast_regex.search(name):
+            info = DescFileName(file_path, 'forecast', variable=match.group(1), dataset=match.group(2),
+                                init_month_abbr=match.group(3),
+                                target_months=tuple(int(m) for m in match.group(4, 5) if m),
+                                years=tuple(int(y) for y in match.group(6, 7) if y))
+            key = (info.init_month_abbr, info.target_months, info.years)
+            self.forecasts.setdefault(key, []).append(info)
+
+    def ereg_files(self, month_abbr: str | None = None, year: int | None = None) -> list[Path]:
+        # Sin mes y año se retornan todos los descriptores de EREG (*_descriptors*.yaml)
+        if month_abbr is None or year is None:
+            return [f.path for f in self.ereg_all]
+        return [f.path for f in self.ereg_by_month.get((month_abbr, year), [])]
+
+    def predictand_files(self, target_months: tuple[int, ...] | None = None, n_months: int = 1) -> list[Path]:
+        # Sin meses objetivo se retornan todos los descriptores con n_months meses objetivo (1 o 2, mes o trimestre)
+        if target_months is None:
+            return sorted(f.path for k, v in self.predictands.items() if len(k) == n_months for f in v)
+        return [f.path for f in self.predictands.get(target_months, [])]
+
+    def forecast_files(self, init_month_abbr: str | None = None, target_months: tuple[int, ...] | None = None,
+                       years: tuple[int, ...] | None = None, n_months: int = 1) -> list[Path]:
+        # Sin mes de inicialización se retornan todos los descriptores con n_months meses objetivo
+        if init_month_abbr is None:
+            return sorted(f.path for k, v in self.forecasts.items() if len(k[1]) == n_months for f in v)
+        return [f.path for f in self.forecasts.get((init_month_abbr, target_months, years), [])]
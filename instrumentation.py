@@ -0,0 +1,238 @@
+
+from __future__ import annotations
+
+from configuration import ConfigFile
+
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict
+from datetime import datetime
+from functools import wraps
+from pathlib import Path
+from typing import Iterator, Union
+
+import os
+import json
+import time
+import cProfile
+import hashlib
+import logging
+import threading
+import tracemalloc
+
+
+"""
+Etapas registradas para cada archivo convertido. En read_data, el tiempo que no corresponde a ninguna otra etapa se
+asigna a to_xarray (la creación del Dataset), y el tiempo restante de la conversión se asigna a other.
+"""
+STAGES = ['header_scan', 'parse', 'transform', 'to_xarray', 'netcdf_write', 'zarr_write', 'other']
+
+"""
+Nombre de los reportes de cada ejecución (archivo JSON lines, una línea por archivo) y de la carpeta con los perfiles
+"""
+RUN_REPORT_FILE_NAME = 'run_report_{timestamp}.jsonl'
+PROFILES_FOLDER_NAME = 'profiles'
+
+
+@dataclass
+class InstrumentationSettings(object):
+    """
+    Configuración de las mediciones (sección "instrumentation" de config.yaml)
+    """
+    enabled: bool = False  # medir la duración de cada etapa y los bytes leídos y escritos
+    trace_memory: bool = False  # medir el pico de memoria con tracemalloc (hace más lenta la ejecución)
+    profile_slowest: int = 0  # guardar un perfil (cProfile) de los N archivos más lentos (0: no se usa cProfile)
+    top_n: int = 10  # cantidad de archivos reportados en el resumen (los más lentos)
+    report_folder: Union[str, None] = None  # carpeta de los reportes (por defecto: FPROC_HOME o los descriptores)
+
+    @classmethod
+    def from_config(cls) -> InstrumentationSettings:
+        settings = dict(ConfigFile.Instance().get('instrumentation') or {})
+        return cls(**{k: v for k, v in settings.items() if k in cls.__dataclass_fields__})
+
+    @property
+    def report_path(self) -> Path:
+        # Por defecto, los reportes se guardan en FPROC_HOME o junto a los descriptores (como el manifiesto)
+        default_folder = os.getenv('FPROC_HOME', ConfigFile.Instance().get('folders').get('descriptor_files'))
+        return Path(self.report_folder or default_folder)
+
+    @property
+    def profiles_path(self) -> Path:
+        return Path(self.report_path, PROFILES_FOLDER_NAME)
+
+
+@dataclass
+class FileMetrics(object):
+    """
+    Mediciones de la conversión de un archivo
+    """
+    input_file: str
+    output_file: str
+    status: str = 'processed'
+    total_s: float = 0.0
+    stages: dict[str, float] = field(default_factory=dict)  # segundos por etapa (ver STAGES)
+    input_bytes: int = 0
+    output_bytes: int = 0
+    peak_memory_mb: Union[float, None] = None
+    profile_file: Union[str, None] = None
+
+    def add_stage(self, stage_name: str, seconds: float) -> None:
+        self.stages[stage_name] = self.stages.get(stage_name, 0.0) + seconds
+
+    def stages_total(self) -> float:
+        return sum(self.stages.values())
+
+
+class _Measurement(threading.local):
+    """
+    Mediciones del archivo que se está convirtiendo en cada hilo (None si no se está midiendo), y profundidad de las
+    etapas anidadas (si una etapa se ejecuta dentro de otra, solo se registra la etapa externa)
+    """
+    metrics: Union[FileMetrics, None] = None
+    stage_depth: int = 0
+
+
+_current = _Measurement()
+
+
+@contextmanager
+def stage(stage_name: str) -> Iterator[None]:
+    # Registrar la duración de una etapa en las mediciones del archivo actual (sin mediciones, no se hace nada)
+    if _current.metrics is None or _current.stage_depth > 0:
+        yield
+        return
+    metrics, start = _current.metrics, time.perf_counter()
+    _current.stage_depth += 1
+    try:
+        yield
+    finally:
+        _current.stage_depth -= 1
+        metrics.add_stage(stage_name, time.perf_counter() - start)
+
+
+def staged(stage_name: str):
+    # Decorador: registrar la duración de cada llamada a la función como parte de la etapa stage_name
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with stage(stage_name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def unassigned_time(stage_name: str) -> Iterator[None]:
+    # El tiempo del bloque que no fue asignado a ninguna etapa (dentro del bloque) se asigna a stage_name
+    if _current.metrics is None or _current.stage_depth > 0:
+        yield
+        return
+    metrics, start, assigned = _current.metrics, time.perf_counter(), _current.metrics.stages_total()
+    try:
+        yield
+    finally:
+        elapsed, inner = time.perf_counter() - start, metrics.stages_total() - assigned
+        metrics.add_stage(stage_name, max(0.0, elapsed - inner))
+
+
+def path_size(path: str) -> int:
+    # Tamaño de un archivo o de una carpeta (ej: un almacén Zarr), 0 si no existe
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+@contextmanager
+def measure_file(input_file: str, output_file: str,
+                 settings: InstrumentationSettings) -> Iterator[Union[FileMetrics, None]]:
+    # Medir la conversión de un archivo (las etapas se registran con stage y unassigned_time)
+    if not settings.enabled:
+        yield None
+        return
+    metrics = FileMetrics(input_file, output_file)
+    # OBS: si tracemalloc ya estaba activo (ej: en los benchmarks), solo se reinicia el pico de memoria
+    started_tracing = settings.trace_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    elif settings.trace_memory:
+        tracemalloc.reset_peak()
+    profiler = cProfile.Profile() if settings.profile_slowest > 0 else None
+    _current.metrics, start = metrics, time.perf_counter()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield metrics
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        metrics.total_s = time.perf_counter() - start
+        _current.metrics = None
+        if settings.trace_memory:
+            metrics.peak_memory_mb = tracemalloc.get_traced_memory()[1] / 2**20
+        if started_tracing:
+            tracemalloc.stop()
+        metrics.add_stage('other', max(0.0, metrics.total_s - metrics.stages_total()))
+        metrics.input_bytes = path_size(input_file)
+        metrics.output_bytes = path_size(output_file)
+        # Los perfiles se guardan todos, al final de la ejecución solo se conservan los de los archivos más lentos
+        if profiler is not None:
+            settings.profiles_path.mkdir(parents=True, exist_ok=True)
+            profile_name = f'{hashlib.sha1(output_file.encode()).hexdigest()[:12]}_{os.path.basename(input_file)}'
+            metrics.profile_file = Path(settings.profiles_path, f'{profile_name}.prof').as_posix()
+            profiler.dump_stats(metrics.profile_file)
+
+
+@contextmanager
+def resume_measure(metrics: Union[FileMetrics, None]) -> Iterator[None]:
+    # Continuar midiendo, en otro hilo, la conversión de un archivo ya medida con measure_file (ej: la escritura, ver
+    # conversion_pipeline.py). La duración del bloque se suma al total del archivo. OBS: el perfil y el pico de
+    # memoria solo corresponden a la parte medida con measure_file.
+    if metrics is None:
+        yield
+        return
+    _current.metrics, start, assigned = metrics, time.perf_counter(), metrics.stages_total()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        _current.metrics = None
+        metrics.total_s += elapsed
+        metrics.add_stage('other', max(0.0, elapsed - (metrics.stages_total() - assigned)))
+        metrics.output_bytes = path_size(metrics.output_file)
+
+
+def write_run_report(all_metrics: list[dict], settings: InstrumentationSettings) -> Union[Path, None]:
+    # Sin mediciones no se genera ningún reporte
+    if not settings.enabled or not all_metrics:
+        return None
+
+    # Conservar solo los perfiles de los archivos más lentos
+    slowest = sorted(all_metrics, key=lambda m: m.get('total_s', 0), reverse=True)
+    for n, metrics in enumerate(slowest):
+        if metrics.get('profile_file') is not None and n >= settings.profile_slowest:
+            Path(metrics.get('profile_file')).unlink(missing_ok=True)
+            metrics['profile_file'] = None
+
+    # Escribir el reporte (una línea por archivo convertido)
+    settings.report_path.mkdir(parents=True, exist_ok=True)
+    report_file = Path(settings.report_path,
+                       RUN_REPORT_FILE_NAME.format(timestamp=datetime.now().strftime('%Y%m%d_%H%M%S')))
+    with open(report_file, 'w') as f:
+        for metrics in all_metrics:
+            f.write(json.dumps(metrics, sort_keys=True) + '\n')
+
+    # Reportar en el log los archivos más lentos (con la duración de cada etapa)
+    logging.info('')
+    logging.info(f'Slowest files (report: {report_file.as_posix()}):')
+    for metrics in slowest[:settings.top_n]:
+        stages = ', '.join(f'{s}: {metrics["stages"][s]:.3f}s' for s in STAGES if s in metrics['stages'])
+        memory = f', peak memory: {metrics["peak_memory_mb"]:.1f} MB' if metrics.get('peak_memory_mb') else ''
+        logging.info(f'  {metrics["total_s"]:.3f}s -- {metrics["input_file"]} ({stages}{memory}, '
+                     f'in: {metrics["input_bytes"] / 2**20:.1f} MB, out: {metrics["output_bytes"] / 2**20:.1f} MB)')
+
+    # Retornar el nombre del reporte
+    return report_file
+
+
+def metrics_as_dict(metrics: Union[FileMetrics, None]) -> Union[dict, None]:
+    # Las mediciones se retornan como dict (pueden ser enviadas desde los procesos del pool al proceso principal)
+    return asdict(metrics) if metrics is not None else None
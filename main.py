@@ -5,18 +5,22 @@ import logging
 import argparse
 
 from datetime import datetime
+from pathlib import Path
 
 # Change current directory
 if os.path.dirname(__file__):
     os.chdir(os.path.dirname(__file__))
 
 from script import ScriptControl
-from errors import DescriptorError
-from configuration import ConfigFile, DescriptorFile, DescFilesSelector
-from read_strategies import FileReader
-from read_strategies import ReadEREGoutputDET, ReadEREGoutputPROB, ReadEREGoutputSISSA, ReadEREGobservedData
-from read_strategies import ReadCPToutputDET, ReadCPToutputPROB, ReadCPTpredictand, ReadCPTpredictor
-from read_strategies import ReadCRCSASobs
+from configuration import ConfigFile, DescriptorFile, DescriptorsCache, DescFilesSelector
+from build_manifest import BuildManifest
+from instrumentation import InstrumentationSettings, write_run_report
+from file_reader import READ_STRATEGIES_MODULE
+from file_conversion import create_workers_pool, run_conversion_jobs, update_cubes
+
+# OBS: la cola de trabajos (work_queue, importa redis), el modo watch (watcher, importa ctypes, para inotify) y las
+# estrategias de lectura (pandas, xarray y netCDF4) se importan recién cuando se utilizan, así una ejecución sin
+# archivos para convertir no demora en importar módulos que no necesita
 
 
 def parse_args() -> argparse.Namespace:
@@ -24,10 +28,10 @@ def parse_args() -> argparse.Namespace:
     now = datetime.now()
 
     parser = argparse.ArgumentParser(description='Run Files Processor')
-    parser.add_argument('--year', type=int, default=now.year, dest='year',
-        help='Indicates the YEAR that should be considered by the files processor.')
-    parser.add_argument('--month', type=int, default=now.month, dest='month',
-        help='Indicates the MONTH that should be considered by the files processor.')
+    parser.add_argument('--year', type=int, default=None, dest='year',
+        help='Indicates the YEAR that should be considered by the files processor (default: current year).')
+    parser.add_argument('--month', type=int, default=None, dest='month',
+        help='Indicates the MONTH that should be considered by the files processor (default: current month).')
     parser.add_argument('--all', action='store_true', dest='process_all_desc_files',
         help='Indicates that all existing descriptor files must be processed.')
     parser.add_argument('--skip-ereg', action='store_true', dest='skip_ereg',
@@ -36,12 +40,28 @@ def parse_args() -> argparse.Namespace:
         help='Indicates whether only EREG descriptors must be considered.')
     parser.add_argument('--overwrite', action='store_true', dest='overwrite_output',
         help='Indicates if previously generated files should be overwritten or not.')
+    parser.add_argument('--adopt-outputs', action='store_true', dest='adopt_outputs',
+        help='Indicates that existing output files not yet recorded in the build manifest must be recorded as they '
+             'are, instead of being generated again (use it once, on the first run with the manifest).')
+    parser.add_argument('--jobs', type=int, default=1, dest='jobs',
+        help='Indicates the number of processes to be used to convert files (default: 1, no process pool).')
+    parser.add_argument('--watch', action='store_true', dest='watch',
+        help='Indicates that the files processor must keep running and convert each file as soon as it is ready.')
+    parser.add_argument('--enqueue', action='store_true', dest='enqueue',
+        help='Indicates that files must be added to the Redis work queue (to be converted by workers).')
+    parser.add_argument('--worker', action='store_true', dest='worker',
+        help='Indicates that the files processor must keep running and convert the files in the Redis work queue.')
 
     args = parser.parse_args()
 
     if args.process_all_desc_files:
         args.year, args.month = None, None  # When there's no year and month, all desc files are processed!
 
+    # Without --year, --month and --all, the current year and month are considered (updated while watching)
+    args.follow_current_month = not args.process_all_desc_files and args.year is None and args.month is None
+    if args.follow_current_month:
+        args.year, args.month = now.year, now.month
+
     if args.year and args.month and args.process_all_desc_files:
         parser.error('Arguments --year and --month are mutually exclusive with argument --all!')
 
@@ -51,31 +71,22 @@ def parse_args() -> argparse.Namespace:
     if args.skip_ereg and args.skip_pycpt:
         parser.error('Arguments --skip-ereg and --skip-pycpt are mutually exclusive!')
 
-    return args
+    if args.adopt_outputs and args.overwrite_output:
+        parser.error('Arguments --adopt-outputs and --overwrite are mutually exclusive!')
+
+    if args.jobs < 1:
+        parser.error('Argument --jobs must be greater than or equal to 1!')
+
+    if args.watch and args.jobs > 1:
+        parser.error('Argument --jobs cannot be used with argument --watch (files are converted when ready)!')
 
+    if sum([args.watch, args.enqueue, args.worker]) > 1:
+        parser.error('Arguments --watch, --enqueue and --worker are mutually exclusive!')
 
-def define_read_strategy(file_type: str, descriptor_filename: str):
-    if file_type == 'ereg_det_output':
-        return ReadEREGoutputDET()
-    elif file_type == 'ereg_prob_output':
-        return ReadEREGoutputPROB()
-    elif file_type == 'ereg_sissa_output':
-        return ReadEREGoutputSISSA()
-    elif file_type == 'ereg_obs_data':
-        return ReadEREGobservedData()
-    elif file_type == 'crcsas_obs_data':
-        return ReadCRCSASobs()
-    elif file_type == 'cpt_det_output':
-        return ReadCPToutputDET()
-    elif file_type == 'cpt_prob_output':
-        return ReadCPToutputPROB()
-    elif file_type == 'cpt_predictand':
-        return ReadCPTpredictand()
-    elif file_type == 'cpt_predictor':
-        return ReadCPTpredictor()
-    else:
-        raise DescriptorError(f'El tipo de archivo indicado "{file_type}" es incorrecto. '
-                              f'Verifique el descriptor: {descriptor_filename}.')
+    if (args.enqueue or args.worker) and args.jobs > 1:
+        parser.error('Argument --jobs cannot be used with arguments --enqueue and --worker (start more workers)!')
+
+    return args
 
 
 if __name__ == '__main__':
@@ -83,8 +94,9 @@ if __name__ == '__main__':
     # Catch and parse command-line arguments
     parsed_args: argparse.Namespace = parse_args()
 
-    # Create script control
-    script = ScriptControl('files-processor')
+    # Create script control (any number of workers can run at the same time)
+    script = ScriptControl('files-processor-worker', single_instance=False) if parsed_args.worker else \
+        ScriptControl('files-processor')
 
     # Start script execution
     script.start_script()
@@ -92,8 +104,23 @@ if __name__ == '__main__':
     # Read processor config file
     config = ConfigFile.Instance()
 
-    # Save overwrite_output arg to the global configuration
+    # Save overwrite_output and adopt_outputs args to the global configuration
     config.set('overwrite_output', parsed_args.overwrite_output)
+    config.set('adopt_outputs', parsed_args.adopt_outputs)
+
+    # En modo watch, los archivos se convierten a medida que están listos (hasta que el proceso sea detenido)
+    if parsed_args.watch:
+        from watcher import watch_descriptors
+        watch_descriptors(parsed_args)
+        script.end_script_execution()
+        raise SystemExit(0)
+
+    # En modo worker, los archivos en la cola de trabajos se convierten a medida que se obtienen de la cola
+    if parsed_args.worker:
+        from work_queue import create_work_queue, run_queue_worker
+        run_queue_worker(create_work_queue())
+        script.end_script_execution()
+        raise SystemExit(0)
 
     # Crear objeto para seleccionar descriptores a procesar
     selector = DescFilesSelector(
@@ -102,54 +129,109 @@ if __name__ == '__main__':
     # Obtener listado de archivos de configuración (descriptores)
     desc_files = selector.target_descriptors
 
+    # Leer el manifiesto de los archivos generados en ejecuciones previas
+    manifest = BuildManifest.Instance()
+
+    # En modo cola, registrar los archivos convertidos por los workers (desde la ejecución anterior)
+    work_queue = None
+    if parsed_args.enqueue:
+        from work_queue import create_work_queue, enqueue_conversion_jobs, register_queue_results
+        work_queue = create_work_queue()
+        register_queue_results(work_queue)
+
     # Definir variables para contar archivos procesados
     files_count = 0
     missing_files_count = 0
     processed_files_count = 0
+    skipped_desc_files_count = 0
 
-    # Procesar cada uno de los archivos de configuración
+    # Crear listado de trabajos, cada trabajo es un archivo a transformar (junto a su descriptor)
+    conversion_jobs: list[tuple[Path, int, int, dict]] = []
     for dn, df in enumerate(desc_files):
 
+        # Omitir los descriptores que no cambiaron y cuyos archivos de entrada y de salida tampoco cambiaron
+        if not parsed_args.overwrite_output and manifest.descriptor_is_up_to_date(df, READ_STRATEGIES_MODULE):
+            files_count += len(manifest.descriptors.get(df.absolute().as_posix()).get('outputs'))
+            skipped_desc_files_count += 1
+            continue
+
         # Leer el archivo de configuración
         descriptor = DescriptorFile(df.absolute().as_posix())
 
         # Obtener listado de archivos a transformar
         proc_files = descriptor.get('files')
 
-        # Convertir los archivos indicados en el archivo de configuración
+        # Agregar un trabajo por cada archivo indicado en el archivo de configuración
         for pn, pf in enumerate(proc_files):
+            conversion_jobs.append((df, pn, len(proc_files), pf))
 
-            # Contar archivo
-            files_count += 1
+    # En modo cola, los archivos no se convierten aquí, se agregan a la cola de trabajos (ver --worker)
+    if work_queue is not None:
+        enqueue_conversion_jobs(work_queue, conversion_jobs)
+        manifest.save()
+        DescriptorsCache.Instance().save()
+        script.end_script_execution()
+        raise SystemExit(0)
 
-            # Definir estrategia de lectura del archivo
-            read_strategy = define_read_strategy(pf.get('type'), df.absolute().as_posix())
+    # Archivos de salida de cada descriptor (un descriptor solo se registra en el manifiesto si se pudieron
+    # generar todos sus archivos y si ninguna de sus entradas obliga a regenerar el archivo en cada ejecución)
+    desc_outputs: dict[Path, list[str]] = {df: [] for df, _, _, _ in conversion_jobs}
+    desc_complete: dict[Path, bool] = {df: True for df, _, _, _ in conversion_jobs}
 
-            # Definir el objeto encargado de leer y convertir el archivo
-            reader = FileReader(read_strategy, df)
+    # Mediciones de los archivos convertidos (ver sección "instrumentation" en config.yaml)
+    run_metrics: list[dict] = []
 
-            # Si el archivo no existe, reportar el problema y continuar
-            input_file = reader.define_input_filename(pf)
-            if not os.path.isfile(input_file):
-                missing_files_count += 1
-                logging.warning(f"Missing file: {input_file}")
-                continue
+    # Convertir los archivos, en serie, en pipeline o mediante un pool de procesos (según config.yaml y --jobs)
+    # OBS: sin archivos para convertir no se crea el pool (ni se importan las estrategias de lectura)
+    with create_workers_pool(min(parsed_args.jobs, len(conversion_jobs))) as pool:
 
-            # Si el archivo ya existe y no debe ser sobrescrito, no se deben ejecutar las líneas a continuación
-            if not reader.output_file_must_be_created(pf):
-                continue
+        # Obtener los resultados a medida que los trabajos son completados
+        jobs_results = run_conversion_jobs(pool, conversion_jobs)
 
-            # Reportar archivo a ser procesado (solo en modo debug)
-            logging.debug(input_file)
+        # Procesar el resultado de cada uno de los trabajos
+        for (df, pn, n_files, pf), status, record, metrics in jobs_results:
 
-            # Convertir archivo a NetCDF
-            reader.convert_file_to_netcdf(desc_file=pf)
+            # Contar archivo
+            files_count += 1
 
-            # Contar archivos procesados
-            processed_files_count += 1
+            # Actualizar el manifiesto
+            if record is not None:
+                manifest.update_output(record)
+                desc_outputs[df].append(manifest.record_key(record))
+            if status == 'missing' or pf.get('update_output', False) is True:
+                desc_complete[df] = False
 
-            # Informar avance
-            logging.info(f'Processed files: {pn+1}/{len(proc_files)} -- ({df.absolute().as_posix()})')
+            # Contar archivos faltantes
+            if status == 'missing':
+                missing_files_count += 1
+
+            # Contar archivos procesados e informar avance
+            if status == 'processed':
+                processed_files_count += 1
+                if metrics is not None:
+                    run_metrics.append(metrics)
+                logging.info(f'Processed files: {pn+1}/{n_files} -- ({df.absolute().as_posix()})')
+
+    # Registrar los descriptores en el manifiesto y guardarlo
+    for df, complete in desc_complete.items():
+        if complete:
+            manifest.update_descriptor(df, desc_outputs[df])
+        else:
+            manifest.forget_descriptor(df)
+
+    # Guardar el manifiesto y luego combinar los archivos de salida en cubos (solo los cubos con algún archivo de
+    # salida nuevo o modificado), así las conversiones quedan registradas aunque falle la generación de un cubo
+    manifest.save()
+    if update_cubes() > 0:
+        manifest.save()
+
+    # Guardar los descriptores leídos (las próximas ejecuciones solo vuelven a leer los descriptores modificados)
+    DescriptorsCache.Instance().save()
+
+    # Reportar la cantidad de descriptores omitidos (sin cambios desde la ejecución anterior)
+    if skipped_desc_files_count > 0:
+        logging.info('')
+        logging.info(f'Unchanged descriptor files (skipped): {skipped_desc_files_count}/{len(desc_files)}')
 
     # En caso de que no se haya procesado ningún archivo, se informa lo siguiente
     if len(desc_files) == 0 or files_count == 0:
@@ -166,5 +248,8 @@ if __name__ == '__main__':
         logging.info('')
         logging.warning(f'Missing files: {missing_files_count}/{files_count}')
 
+    # Guardar el reporte de las mediciones e informar los archivos más lentos (solo si se realizaron mediciones)
+    write_run_report(run_metrics, InstrumentationSettings.from_config())
+
     # End script execution
     script.end_script_execution()
@@ -0,0 +1,102 @@
+
+from __future__ import annotations
+
+from configuration import ConfigFile
+from errors import ConfigError
+
+from dataclasses import dataclass, fields
+from typing import TYPE_CHECKING, Union
+
+# OBS: numpy y xarray solo se importan al codificar datos, la configuración de la codificación también se utiliza al
+# verificar si un archivo debe ser generado (ver FileReader.manifest_record), que no requiere leer datos
+if TYPE_CHECKING:
+    from xarray import Dataset
+    import numpy as np
+
+
+"""
+Tipos de datos enteros que pueden ser utilizados para empaquetar (scale_factor/add_offset) las variables
+"""
+PACKING_DTYPES = ['int8', 'int16', 'int32']
+
+
+@dataclass
+class NetCDFEncoding(object):
+    """
+    Codificación de las variables de datos de los archivos NetCDF generados. Se define en la sección "encoding" de
+    config.yaml y cada entrada de un descriptor puede redefinir cualquiera de sus valores (entrada "encoding").
+    Sin ninguna de estas secciones, los archivos se generan como siempre (sin comprimir, sin chunks y en float64).
+    """
+    zlib: bool = False  # comprimir los datos con zlib
+    complevel: int = 4  # nivel de compresión (1 a 9)
+    shuffle: bool = True  # aplicar el filtro shuffle antes de comprimir (mejora la compresión)
+    chunks: Union[dict[str, int], None] = None  # tamaño de los chunks por dimensión (-1: dimensión completa)
+    dtype: Union[str, None] = None  # tipo de dato de las variables (ej: float32)
+    packing: Union[str, None] = None  # empaquetar las variables en enteros (ej: int16) con scale_factor/add_offset
+    least_significant_digit: Union[int, None] = None  # cuantizar los datos (cantidad de decimales a conservar)
+
+    @classmethod
+    def from_config(cls, desc_file: dict = None) -> NetCDFEncoding:
+        # La configuración del descriptor tiene prioridad sobre la configuración general (config.yaml)
+        encoding = dict(ConfigFile.Instance().get('encoding') or {})
+        encoding.update((desc_file or {}).get('encoding') or {})
+        valid_keys = [f.name for f in fields(cls)]
+        invalid_keys = [k for k in encoding if k not in valid_keys]
+        if invalid_keys:
+            raise ConfigError(f'Invalid encoding options: {", ".join(invalid_keys)} (valid: {", ".join(valid_keys)})')
+        if encoding.get('packing') is not None and encoding.get('packing') not in PACKING_DTYPES:
+            raise ConfigError(f'Invalid packing dtype: {encoding.get("packing")} (valid: {", ".join(PACKING_DTYPES)})')
+        return cls(**encoding)
+
+    def chunk_sizes(self, dims: tuple[str, ...], shape: tuple[int, ...]) -> Union[tuple[int, ...], None]:
+        # Las dimensiones no indicadas en chunks se guardan completas en cada chunk
+        if self.chunks is None or len(shape) == 0 or 0 in shape:
+            return None
+        return tuple(
+            size if self.chunks.get(dim, -1) in [-1, None] else max(1, min(int(self.chunks.get(dim)), size))
+            for dim, size in zip(dims, shape))
+
+    @staticmethod
+    def packing_parameters(values: np.ndarray, packing_dtype: str) -> Union[dict, None]:
+        import numpy as np
+        # El rango de los datos se mapea sobre el rango del entero (el valor mínimo se reserva para los NA)
+        v_min, v_max = np.nanmin(values), np.nanmax(values)
+        if not np.isfinite(v_min) or not np.isfinite(v_max):
+            return None
+        int_info = np.iinfo(packing_dtype)
+        n_steps = int(int_info.max) - int(int_info.min) - 1
+        scale_factor = float(v_max - v_min) / n_steps if v_max > v_min else 1.0
+        add_offset = float(v_min) - (int(int_info.min) + 1) * scale_factor
+        return {'dtype': packing_dtype, 'scale_factor': scale_factor, 'add_offset': add_offset,
+                '_FillValue': int_info.min}
+
+    def array_encoding(self, dims: tuple[str, ...], shape: tuple[int, ...], values: np.ndarray = None) -> dict:
+        # Codificación de un arreglo numérico (los valores solo son necesarios para calcular el empaquetado)
+        encoding: dict = {}
+        if self.zlib:
+            encoding.update(zlib=True, complevel=self.complevel, shuffle=self.shuffle)
+        chunk_sizes = self.chunk_sizes(dims, shape)
+        if chunk_sizes is not None:
+            encoding['chunksizes'] = chunk_sizes
+        if self.dtype is not None:
+            encoding['dtype'] = self.dtype
+        if self.least_significant_digit is not None:
+            encoding['least_significant_digit'] = self.least_significant_digit
+        if self.packing is not None and values is not None and values.size > 0:
+            packing = self.packing_parameters(values, self.packing)
+            if packing is not None:
+                encoding.update(packing)
+        return encoding
+
+    def variable_encoding(self, ds: Dataset) -> dict[str, dict]:
+        import numpy as np
+        # Solo se codifican las variables de datos numéricas (no las coordenadas, ni las variables de texto)
+        encoding: dict[str, dict] = {}
+        for var in ds.data_vars:
+            if not np.issubdtype(ds[var].dtype, np.number):
+                continue
+            values = ds[var].values if self.packing is not None else None
+            var_encoding = self.array_encoding(ds[var].dims, ds[var].shape, values)
+            if var_encoding:
+                encoding[var] = var_encoding
+        return encoding
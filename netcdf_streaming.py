@@ -0,0 +1,80 @@
+
+from __future__ import annotations
+
+from instrumentation import staged
+
+from xarray.coding.times import encode_cf_datetime
+
+import numpy as np
+import netCDF4
+
+
+class NetCDFStreamWriter(object):
+    """
+    Escritura de un archivo NetCDF por partes. El archivo se crea con una dimensión ilimitada (ej: init_time) y los
+    datos se agregan de a un elemento de esa dimensión por vez (ej: un campo de un archivo CPT), por lo que nunca es
+    necesario tener todos los datos en memoria. El archivo generado es equivalente al que genera xarray (mismos
+    nombres, atributos y valores de relleno), de modo que puede ser leído del mismo modo.
+    """
+
+    def __init__(self, file_name: str, variable: str, stream_dim: str, coords: dict[str, np.ndarray],
+                 attrs: dict = None, encoding: dict = None, time_units: str = 'days since 1970-01-01 00:00:00',
+                 calendar: str = 'proleptic_gregorian'):
+        self._file_name: str = file_name
+        self._stream_dim: str = stream_dim
+        self._time_units: str = time_units
+        self._calendar: str = calendar
+        self._length: int = 0
+        self._nc = netCDF4.Dataset(file_name, 'w', format='NETCDF4')
+        try:
+            self.__create_variables(variable, coords, attrs or {}, dict(encoding or {}))
+        except Exception:
+            self._nc.close()
+            raise
+
+    def __create_variables(self, variable: str, coords: dict[str, np.ndarray], attrs: dict, encoding: dict) -> None:
+        # La dimensión ilimitada y su coordenada (fechas, codificadas como en xarray con units y calendar)
+        self._nc.createDimension(self._stream_dim, None)
+        self._times = self._nc.createVariable(self._stream_dim, 'i8', (self._stream_dim,))
+        self._times.setncatts({'units': self._time_units, 'calendar': self._calendar})
+        # Las demás dimensiones y sus coordenadas (se escriben completas al crear el archivo)
+        for dim, values in coords.items():
+            self._nc.createDimension(dim, len(values))
+            coord = self._nc.createVariable(dim, np.asarray(values).dtype, (dim,), fill_value=np.nan)
+            coord[:] = values
+        # La variable con los datos (con la codificación indicada: compresión, chunks, tipo de dato, etc.)
+        dtype = np.dtype(encoding.pop('dtype', 'float64'))
+        fill_value = encoding.pop('_FillValue', np.nan if dtype.kind == 'f' else None)
+        self._data = self._nc.createVariable(
+            variable, dtype, (self._stream_dim, *coords), fill_value=fill_value,
+            zlib=encoding.pop('zlib', False), complevel=encoding.pop('complevel', 4),
+            shuffle=encoding.pop('shuffle', True), chunksizes=encoding.pop('chunksizes', None),
+            least_significant_digit=encoding.pop('least_significant_digit', None))
+        self._data.setncatts(attrs)
+
+    def __enter__(self) -> NetCDFStreamWriter:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._nc.isopen():
+            self._nc.close()
+
+    @property
+    def file_name(self) -> str:
+        return self._file_name
+
+    @property
+    def length(self) -> int:
+        return self._length
+
+    @staged('netcdf_write')
+    def append(self, time: np.datetime64, values: np.ndarray) -> None:
+        # Agregar un nuevo elemento a la dimensión ilimitada (la fecha y los datos correspondientes a esa fecha)
+        encoded_time, _, _ = encode_cf_datetime(np.array([time], dtype='datetime64[ns]'), self._time_units,
+                                                self._calendar)
+        self._times[self._length] = encoded_time[0]
+        self._data[self._length, ...] = values
+        self._length += 1
@@ -0,0 +1,113 @@
+
+from __future__ import annotations
+
+from instrumentation import staged
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Union
+
+import os
+import struct
+import zipfile
+import numpy as np
+
+
+"""
+Cantidad máxima de hilos utilizados para descomprimir los miembros comprimidos de un archivo npz
+"""
+MAX_DECOMPRESSION_THREADS = 4
+
+
+class NPZfile(object):
+    """
+    Acceso a los arreglos de un archivo npz, cada miembro del archivo se lee una única vez. Los miembros sin
+    comprimir se mapean en memoria directamente desde el archivo npz (sin copiar los datos) y los miembros
+    comprimidos se descomprimen en paralelo (zlib libera el GIL al descomprimir), todos de una sola vez.
+    """
+
+    def __init__(self, file_name: str, members: list[str] = None):
+        self._file_name: str = file_name
+        self._zip_file = zipfile.ZipFile(file_name)
+        self.files: list[str] = [
+            os.path.splitext(info.filename)[0] for info in self._zip_file.infolist() if info.filename.endswith('.npy')]
+        self._arrays: dict[str, np.ndarray] = {}
+        self.load(members if members is not None else self.files)
+
+    def __enter__(self) -> NPZfile:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        # OBS: los arreglos mapeados en memoria siguen siendo válidos luego de cerrar el archivo
+        self._zip_file.close()
+
+    @property
+    def file_name(self) -> str:
+        return self._file_name
+
+    def __getitem__(self, member: str) -> np.ndarray:
+        if member not in self._arrays:
+            self.load([member])
+        return self._arrays[member]
+
+    @staged('parse')
+    def load(self, members: list[str]) -> None:
+        # Leer solo los miembros que aún no fueron leídos
+        infos = [self._zip_file.getinfo(f'{m}.npy') for m in members if m not in self._arrays]
+        # Los miembros sin comprimir se mapean en memoria, los comprimidos se descomprimen en paralelo
+        compressed = [info for info in infos if info.compress_type != zipfile.ZIP_STORED]
+        for info in infos:
+            if info.compress_type == zipfile.ZIP_STORED:
+                self._arrays[info.filename[:-4]] = self.__map_member(info)
+        if len(compressed) == 1:
+            self._arrays[compressed[0].filename[:-4]] = self.__read_member(compressed[0])
+        elif compressed:
+            n_threads = min(len(compressed), MAX_DECOMPRESSION_THREADS)
+            with ThreadPoolExecutor(max_workers=n_threads) as executor:
+                arrays = executor.map(self.__read_member, compressed)
+                for info, array in zip(compressed, arrays):
+                    self._arrays[info.filename[:-4]] = array
+
+    def __read_member(self, info: zipfile.ZipInfo) -> np.ndarray:
+        with self._zip_file.open(info) as member:
+            return np.lib.format.read_array(member, allow_pickle=False)
+
+    def __map_member(self, info: zipfile.ZipInfo) -> Union[np.ndarray, np.memmap]:
+        # Ubicar el inicio de los datos del miembro: el encabezado local del zip tiene un largo variable
+        # (30 bytes, más el nombre del archivo y un campo extra, ver especificación del formato zip)
+        with open(self._file_name, 'rb') as f:
+            f.seek(info.header_offset)
+            local_header = f.read(30)
+            name_length, extra_length = struct.unpack('<HH', local_header[26:30])
+            f.seek(info.header_offset + 30 + name_length + extra_length)
+            # Leer el encabezado del arreglo (formato npy)
+            version = np.lib.format.read_magic(f)
+            if version not in [(1, 0), (2, 0)]:
+                return self.__read_member(info)
+            read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else \
+                np.lib.format.read_array_header_2_0
+            shape, fortran_order, dtype = read_header(f)
+            data_offset = f.tell()
+        # Los arreglos de objetos y los arreglos vacíos no pueden ser mapeados en memoria
+        if dtype.hasobject or 0 in shape:
+            return self.__read_member(info)
+        return np.memmap(self._file_name, dtype=dtype, mode='r', offset=data_offset, shape=shape,
+                         order='F' if fortran_order else 'C')
+
+
+@staged('transform')
+def terciles_from_cumulative(cumulative: np.ndarray, indexers: tuple = None) -> np.ndarray:
+    # Los archivos de EREG tienen, en la primera dimensión, la probabilidad de la categoría inferior (below) y la
+    # probabilidad acumulada de las categorías inferior y normal (near_as = below + normal). Las 3 categorías
+    # (below, normal, above) se calculan directamente sobre un único arreglo de salida, con la categoría como
+    # última dimensión. Los indexers (opcionales) permiten seleccionar, por ejemplo, años y puntos de grilla.
+    below, near_as = cumulative[0], cumulative[1]
+    if indexers is not None:
+        below, near_as = below[np.ix_(*indexers)], near_as[np.ix_(*indexers)]
+    terciles = np.empty(below.shape + (3,), dtype=np.result_type(below, near_as))
+    terciles[..., 0] = below
+    np.subtract(near_as, below, out=terciles[..., 1])
+    np.subtract(1, near_as, out=terciles[..., 2])
+    return terciles
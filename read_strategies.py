@@ -1,167 +1,91 @@
 
 from __future__ import annotations
 
-from configuration import ConfigFile
-from helpers import CPToutputFileInfo, CPTpredictorFileInfo
-from helpers import crange, MonthsProcessor as Mpro
-
-from abc import ABC, abstractmethod
-from typing import List
+from file_reader import ReadStrategy
+from file_names import FileNameParser, FileNameRule, MONTHS_ALTERNATION, TRIMESTERS_ALTERNATION
+from file_names import cpt_months, target_months, month, season, year, variable
+from cpt_format import CPTfile, CPTfield, RowsFilter, ColumnsFilter
+from crcsas_format import CRCSASfile
+from dense_grid import DenseGrid
+from time_transforms import month_start_dates, swapped_years_order, swap_years, scale_by_n_days
+from data_subset import DataSubset
+from npz_format import NPZfile, terciles_from_cumulative
+from netcdf_encoding import NetCDFEncoding
+from netcdf_streaming import NetCDFStreamWriter
+from instrumentation import stage
+from helpers import MonthsProcessor as Mpro
 
 from xarray import Dataset
-from datetime import datetime
-from pathlib import Path
 
-import re
-import os
 import pandas as pd
 import numpy as np
 import xarray as xr
 
 
+"""
+Versión del código de lectura de este módulo (se guarda en el manifiesto, ver build_manifest.py). Debe incrementarse
+al modificar la manera en que se leen los archivos, aquí o en los módulos utilizados (ej: cpt_format, crcsas_format,
+npz_format, dense_grid, time_transforms), así los archivos generados con la versión anterior se vuelven a generar
+"""
+READER_VERSION = 1
+
 """ 
 Año inicial a ser utilizado cuando se requiere una fecha y no se puede determinar el año
 """
 DEFAULT_START_YEAR = 1900
 
-
-class FileReader(object):
-    """
-    The Context (Desing Pattern -> Strategy)
-    """
-
-    def __init__(self, strategy: ReadStrategy, desc_file: Path) -> None:
-        self._read_strategy = strategy
-        self._descriptor_file = desc_file
-
-    @property
-    def read_strategy(self) -> ReadStrategy:
-        return self._read_strategy
-
-    @read_strategy.setter
-    def read_strategy(self, strategy: ReadStrategy) -> None:
-        self._read_strategy = strategy
-
-    def define_input_filename(self, desc_file: dict):
-        # Definir carpeta del archivo a leer
-        desc_file_path = desc_file.get('path')
-        if desc_file_path == '.':
-            desc_file_path = self._descriptor_file.parent.absolute().as_posix()
-        # Definir nombre del archivo a leer
-        input_filename = os.path.join(desc_file_path, desc_file.get('name'))
-        # Si el path no es absoluto, anteponer la carpeta con los descriptores
-        if not os.path.isabs(input_filename):
-            input_filename = os.path.join(ConfigFile.Instance().get('folders').get('descriptor_files'), input_filename)
-        # Retornar el nombre del archivo a leer
-        return input_filename
-
-    def define_output_filename(self, desc_file: dict = None) -> str:
-        # Definir nombre del archivo a leer
-        input_filename = self.define_input_filename(desc_file)
-        # Definir el nombre del archivo NetCDF (para los casos en los que no se defina output_file)
-        output_filename = f"{os.path.splitext(input_filename)[0]}.nc"
-        # Definir el nombre del archivo NetCDF (para los casos en los que sí se defina output_file)
-        if desc_file is not None and desc_file.get('output_file') is not None:
-            # Obtener la carpeta de destino
-            output_path = desc_file.get('output_file').get('path', os.path.dirname(output_filename))
-            # Si lo que se obtiene no es un path absoluto, anteponer la carpeta con los descriptores
-            if not os.path.isabs(output_path):
-                output_path = os.path.join(ConfigFile.Instance().get('folders').get('descriptor_files'), output_path)
-            # Obtener el nombre del archivo de destino (sin carpeta, solo el nombre del archivo)
-            output_file = desc_file.get('output_file').get('name', os.path.basename(output_filename))
-            # Definir el path absoluto para el archivo de destino
-            output_filename = os.path.join(output_path, output_file)
-        # Retornar el nombre definido
-        return output_filename
-
-    def output_file_must_be_created(self, desc_file: dict = None) -> bool:
-        # Leer configuración del script
-        config = ConfigFile.Instance()
-        # Si el archivo de salida no existe, el archivo de salida deber ser creado
-        if not os.path.exists(self.define_output_filename(desc_file)):
-            return True
-        # Si en la configuración así se indica, el archivo de salida deber ser creado
-        if config.get('overwrite_output', False) is True:
-            return True
-        # Si el descriptor así lo indica, el archivo de salida deber ser creado
-        if desc_file.get('update_output', False) is True:
-            return True
-        # En cualquier otro caso, el archivo de salida no debe ser creado
-        return False
-
-    def read_file(self, desc_file: dict = None) -> Dataset:
-        # Definir nombre del archivo a leer
-        input_filename = self.define_input_filename(desc_file)
-        # Retornar el ds con los datos leídos del archivo
-        return self._read_strategy.read_data(input_filename, desc_file)
-
-    def convert_file_to_netcdf(self, desc_file: dict = None) -> None:
-        # Convertir archivo solo si el archivo de salida debe ser creado
-        if self.output_file_must_be_created(desc_file):
-            # Leer el archivo en un Dataset
-            with self.read_file(desc_file) as ds:
-                # Convert categories to strings (categories can't be saved to NetCDF files!)
-                for var in ds.variables:
-                    if ds[var].dtype == 'category':
-                        ds[var] = ds[var].astype(str)
-                # Guardar el dataset en un NetCDF
-                ds.to_netcdf(self.define_output_filename(desc_file))
-
-
-class ReadStrategy(ABC):
-    """
-    The Strategy Interface (Desing Pattern -> Strategy)
-    """
-    @abstractmethod
-    def read_data(self, file_name: str, desc_file: dict = None) -> Dataset:
-        pass
+"""
+Reglas para extraer los metadatos del nombre de los archivos, compartidas por varias estrategias de lectura
+(las expresiones regulares se compilan una sola vez, al importar el módulo)
+"""
+CPT_MONTHS_RULE = FileNameRule(rf'({MONTHS_ALTERNATION})ic_(\d*)-?(\d*)?_', cpt_months)
+CPT_VARIABLE_RULE = FileNameRule(r'(prcp|t2m)', variable())
+EREG_MONTH_RULE = FileNameRule(rf'({MONTHS_ALTERNATION})', month)
+EREG_VARIABLE_RULE = FileNameRule(r'(prec|tref)', variable({'prec': 'prcp', 'tref': 't2m'}))
+EREG_SEASON_RULE = FileNameRule(rf'({TRIMESTERS_ALTERNATION})', season)
+EREG_FORECAST_YEAR_PATTERN = rf'(?:{MONTHS_ALTERNATION})(\d{{4}})'
 
 
 class ReadCPToutputDET(ReadStrategy):
     """
     A Concrete Strategy (Desing Pattern -> Strategy)
     """
-    def read_data(self, file_name: str, desc_file: dict = None) -> Dataset:
-        # Extraer información del archivo CPT
-        info: CPToutputFileInfo = self.__extract_cpt_output_file_info(file_name)
-
-        # Identificar el mes de corrida y los meses objetivo en el nombre del archivo
-        months_regex = re.search(rf'({"|".join(Mpro.months_abbr[1:])})ic_(\d*)-?(\d*)?_', file_name)
-        forecast_month, first_target_month = Mpro.month_abbr_to_int(months_regex.group(1)), int(months_regex.group(2))
-
-        # Identificar la variable en el nombre del archivo
-        file_variable = re.search(r'(prcp|t2m)', file_name).group(0)
-
-        # Obtener el nombre de las columnas, las longitude y las latitudes
-        header_df = pd.read_csv(file_name, sep='\t', header=0, index_col=0, skiprows=info.header_line, nrows=2,
-                                na_values=[info.na_values, int(info.na_values), float(info.na_values)])
+    file_name_parser = FileNameParser(CPT_MONTHS_RULE, CPT_VARIABLE_RULE)
 
+    def read_data(self, file_name: str, desc_file: dict = None) -> Dataset:
+        # Identificar el mes de corrida, los meses objetivo y la variable en el nombre del archivo
+        file_info = self.file_name_info(file_name)
+        forecast_month, first_target_month = file_info.forecast_month, file_info.first_target_month
+        file_variable = file_info.variable
+
+        # Definir el subconjunto de datos a leer (años y puntos de grilla)
+        # OBS: los años del archivo son los del primer mes objetivo, se usa year_offset para obtener el año de
+        # inicialización. Los años a renombrar (ver swap_years) siempre se leen, se filtran una vez renombrados.
+        year_offset = 1 if forecast_month > first_target_month else 0
+        swap_years_info = (desc_file or {}).get('swap_years') or {}
+        subset = DataSubset.from_descriptor(desc_file, year_offset)
+        rows_filter = subset.rows_filter(year_offset, swap_years_info.get('last_hindcast_year'))
+        columns_filter = subset.columns_filter('cpt:Y', 'cpt:X')
+
+        # Obtener las longitudes, las latitudes y los datos en el archivo (primer campo del archivo)
         # En los archivos de salida del CPT:
         # la línea que empieza con cpt:X es la longitud, y la línea que empieza con cpt:Y es la latitud
-        header_df.rename(index={'cpt:X': 'longitude', 'cpt:Y': 'latitude'}, inplace=True)
-
-        # Crear un dataframe con longitud y latitude (e índice igual al nombre de las columnas en data_df)
-        longitude_df = pd.DataFrame({'longitude': header_df.loc['longitude']})
-        latitude_df = pd.DataFrame({'latitude': header_df.loc['latitude']})
-        coord_data_df = longitude_df.join(latitude_df)
-
-        # Obtener los datos en el archivo
-        data_df = pd.read_csv(file_name, sep='\t', names=header_df.columns.to_list(), index_col=0,
-                              skiprows=info.data_first_line, nrows=info.n_rows,
-                              na_values=[info.na_values, int(info.na_values), float(info.na_values)])
-
-        # Crear df con índice igual a longitude, latitude, year
-        year_dataframes = list()  # to avoid fragmentation (https://stackoverflow.com/q/68292862)
-        for year in data_df.index.to_list():
-            year_data_df = pd.DataFrame({file_variable: data_df.loc[year]})
-            year_data_df = coord_data_df.join(year_data_df)
-            # OBS: init_time indica el año y mes del mes inicial (start_month, init_month, el mes con leadtime 0)
-            init_year = year - 1 if forecast_month > first_target_month else year
-            year_data_df.insert(2, 'init_time', pd.to_datetime(f'{init_year}-{forecast_month}-01'))
-            year_data_df = year_data_df.copy() # clean up fragmentation
-            year_dataframes.append(year_data_df)  # to avoid fragmentation (https://stackoverflow.com/q/68292862))
-            del year_data_df  # se remueve el objeto para liberar memoria
-        final_df = pd.concat(year_dataframes)  # to avoid fragmentation (https://stackoverflow.com/q/68292862)
+        with CPTfile(file_name) as cpt_file:
+            table = cpt_file.read_field(cpt_file.fields[0], n_header_rows=2,
+                                        rows_filter=rows_filter, columns_filter=columns_filter)
+
+        # Calcular init_time para todos los años a la vez
+        # OBS: init_time indica el año y mes del mes inicial (start_month, init_month, el mes con leadtime 0)
+        years = table.row_labels.astype(int)
+        init_years = years - 1 if forecast_month > first_target_month else years
+        init_times = month_start_dates(init_years, forecast_month)
+
+        # Reacomodar la matriz año x punto de grilla en un dataset con dimensiones init_time, latitude, longitude
+        grid = DenseGrid(['init_time', 'latitude', 'longitude'], [file_variable])
+        grid.add({file_variable: table.values}, init_time=init_times[:, np.newaxis],
+                 latitude=table.header_rows['cpt:Y'][np.newaxis, :],
+                 longitude=table.header_rows['cpt:X'][np.newaxis, :])
+        final_ds = grid.to_dataset()
 
         # Modificar años, en caso de que sea necesario
         if desc_file is not None and desc_file.get('swap_years') is not None:
@@ -179,130 +103,66 @@ class ReadCPToutputDET(ReadStrategy):
             last_hindcast_year = last_hindcast_year - (1 if forecast_month > first_target_month else 0)
             first_forecast_year = first_forecast_year - (1 if forecast_month > first_target_month else 0)
 
-            # Solamente es necesario renombrar los años cuando el primer año de pronóstico (first_forecast_year)
-            # es al menos dos años posterior al último año de hindcast (last_hindcast_year).
-            if first_forecast_year - last_hindcast_year >= 2:
-
-                # Identificar los años posteriores al último año de hindcast, todos estos años deben ser renombrados
-                years_to_swap = set([y for y in final_df['init_time'].dt.year if y > last_hindcast_year])
-
-                # Se crea una lista que contiene los dataframes con años renombrados.
-                # Esta lista se concatena una sola vez al final de la operación, lo que
-                # permite evitar fragmentación (https://stackoverflow.com/q/68292862)
-                anhos_dataframes = list()
-
-                # Recorrer los años que deben ser renombrados, "y" es el año a ser modificado y "n" es la
-                # cantidad que debe sumarse al primer año pronosticado para obtener el año final.
-                for n, y in enumerate(years_to_swap):
-                    # Se hace una copia profunda del año a renombrar
-                    aux = final_df.loc[final_df['init_time'].dt.year == y].copy(deep=True)
-                    # Se actualiza el año en el dataframe auxiliar (que contiene un solo año)
-                    aux['init_time'] = aux['init_time'].apply(lambda x: x.replace(year=first_forecast_year+n))
-                    # Se copia el dataframe para evitar framentación
-                    aux = aux.copy() # clean up fragmentation
-                    # Se agrega el dataframe aux a la lista con los años renombrados
-                    anhos_dataframes.append(aux)
-                    # Se remueve el objeto para liberar memoria
-                    del aux  
-                    # Se asigna NA al año que ya fue renombrado
-                    final_df.loc[final_df['init_time'].dt.year == y, file_variable] = np.nan
-                
-                # Se concatenan todos los dataframes de una sola vez para evitar fragmentación
-                anhos_renombrados = pd.concat(anhos_dataframes)
-
-                # Se reemplaza los valores con NA en final_df con los valores corregidos
-                final_df = final_df.merge(anhos_renombrados, how='outer')
-
-        # Reindexar el dataframe
-        final_df = final_df.set_index(['init_time', 'latitude', 'longitude']).sort_index()
-
-        # Transformar dataframe a dataset
-        final_ds = final_df.to_xarray()
+            # Renombrar los años posteriores al último año de hindcast
+            final_ds = swap_years(final_ds, last_hindcast_year, first_forecast_year)
 
         # Agregar atributos que describan la variable
         unidad_de_medida = 'mm' if file_variable == 'prcp' else 'Celsius' if file_variable == 't2m' else None
         final_ds[file_variable].attrs['units'] = f'{unidad_de_medida}'
 
-        # Filtrar años, en caso de que sea necesario
-        if desc_file is not None and desc_file.get('filter_years') is not None:
-            min_year = desc_file.get('filter_years').get('min_year')
-            if min_year is not None:
-                min_year = min_year - (1 if forecast_month > first_target_month else 0)
-                final_ds = final_ds.where(final_ds.init_time.dt.year >= min_year, drop=True)
-            max_year = desc_file.get('filter_years').get('max_year')
-            if max_year is not None:
-                max_year = max_year - (1 if forecast_month > first_target_month else 0)
-                final_ds = final_ds.where(final_ds.init_time.dt.year <= max_year, drop=True)
+        # Filtrar años y puntos de grilla, en caso de que sea necesario
+        final_ds = subset.select(final_ds)
 
         # Return generated dataset
         return final_ds
 
-    @staticmethod
-    def __extract_cpt_output_file_info(file_name: str) -> CPToutputFileInfo:
-        # Abrir el archivo
-        with open(file_name) as fp:
-            # Leer el archivo línea por línea
-            for cnt, line in enumerate(fp):
-                # Aplicar expresiones regulares a la línea actual
-                n_rows_regex, n_cols_regex = re.search(r'cpt:nrow=(\d+),', line), re.search(r'cpt:ncol=(\d+),', line)
-                na_values_regex = re.search(r'cpt:missing=([-+]?\d+\.?\d+?)', line)
-                # La línea con los datos buscados cumple con las 3 expresiones regulares
-                if n_rows_regex and n_cols_regex and na_values_regex:
-                    # Extraer los datos del archivo
-                    n_rows, n_cols = int(n_rows_regex.group(1)), int(n_cols_regex.group(1))
-                    na_values = float(na_values_regex.group(1))
-                    header_line, data_first_line = cnt + 1, cnt + 4
-                    header_n_rows = data_first_line - header_line
-                    # Retornar los datos del archivo
-                    return CPToutputFileInfo(n_rows, n_cols, na_values, header_line, data_first_line, 1, header_n_rows)
-
 
 class ReadCPToutputPROB(ReadStrategy):
     """
     A Concrete Strategy (Desing Pattern -> Strategy)
     """
-    def read_data(self, file_name: str, desc_file: dict = None) -> Dataset:
-        # Extraer información del archivo CPT
-        info: CPToutputFileInfo = self.__extract_cpt_output_file_info(file_name)
-
-        # Identificar el mes de corrida y los meses objetivo en el nombre del archivo
-        months_regex = re.search(rf'({"|".join(Mpro.months_abbr[1:])})ic_(\d*)-?(\d*)?_', file_name)
-        forecast_month, first_target_month = Mpro.month_abbr_to_int(months_regex.group(1)), int(months_regex.group(2))
-
-        # Identificar la variable en el nombre del archivo
-        file_variable = re.search(r'(prcp|t2m)', file_name).group(0)
-
-        # Obtener el nombre de las columnas, las longitude y las latitudes
-        header_df = pd.read_csv(file_name, sep='\t', header=0, index_col=0, skiprows=info.header_line, nrows=2,
-                                na_values=[info.na_values, int(info.na_values), float(info.na_values)])
+    categories = ['below', 'normal', 'above']
+    file_name_parser = FileNameParser(CPT_MONTHS_RULE, CPT_VARIABLE_RULE)
 
+    def read_data(self, file_name: str, desc_file: dict = None) -> Dataset:
+        # Identificar el mes de corrida, los meses objetivo y la variable en el nombre del archivo
+        file_info = self.file_name_info(file_name)
+        forecast_month, first_target_month = file_info.forecast_month, file_info.first_target_month
+        file_variable = file_info.variable
+
+        # Definir el subconjunto de datos a leer (años y puntos de grilla)
+        # OBS: los años del archivo son los del primer mes objetivo, se usa year_offset para obtener el año de
+        # inicialización. Los años a renombrar (ver swap_years) siempre se leen, se filtran una vez renombrados.
+        year_offset = 1 if forecast_month > first_target_month else 0
+        swap_years_info = (desc_file or {}).get('swap_years') or {}
+        subset = DataSubset.from_descriptor(desc_file, year_offset)
+        rows_filter = subset.rows_filter(year_offset, swap_years_info.get('last_hindcast_year'))
+        columns_filter = subset.columns_filter('cpt:Y', 'cpt:X')
+
+        # Leer el archivo una sola vez: un campo (bloque de datos) por cada una de las 3 categorías
         # En los archivos de salida del CPT:
         # la línea que empieza con cpt:X es la longitud, y la línea que empieza con cpt:Y es la latitud
-        header_df.rename(index={'cpt:X': 'longitude', 'cpt:Y': 'latitude'}, inplace=True)
-
-        # Crear un dataframe con longitud y latitude (e índice igual al nombre de las columnas en data_df)
-        longitude_df = pd.DataFrame({'longitude': header_df.loc['longitude']})
-        latitude_df = pd.DataFrame({'latitude': header_df.loc['latitude']})
-        coord_data_df = longitude_df.join(latitude_df)
-
-        # Obtener los datos en el archivo
-        final_df = pd.DataFrame()
-        for i, category in enumerate(['below', 'normal', 'above']):
-            skip_rows = info.data_first_line + (info.field_n_rows * i) + (info.header_n_rows * i) + (info.n_rows * i)
-            cat_data_df = pd.read_csv(file_name, sep='\t', names=header_df.columns.to_list(), index_col=0,
-                                      skiprows=skip_rows, nrows=info.n_rows,
-                                      na_values=[info.na_values, int(info.na_values), float(info.na_values)])
-            category_df = pd.DataFrame()
-            for year in cat_data_df.index.to_list():
-                year_data_df = pd.DataFrame({file_variable: cat_data_df.loc[year]})
-                year_data_df = coord_data_df.join(year_data_df)
-                # OBS: init_time indica el año y mes del mes inicial (start_month, init_month, el mes con leadtime 0)
-                init_year = year - 1 if forecast_month > first_target_month else year
-                year_data_df.insert(2, 'init_time', pd.to_datetime(f'{init_year}-{forecast_month}-01'))
-                year_data_df.insert(3, 'category', category)
-                category_df = pd.concat([category_df, year_data_df])
-            final_df = pd.concat([final_df, category_df])
-        final_df = final_df.copy()  # clean up fragmentation
+        with CPTfile(file_name) as cpt_file:
+            tables = [cpt_file.read_field(field, n_header_rows=2,
+                                          rows_filter=rows_filter, columns_filter=columns_filter)
+                      for field in cpt_file.fields[:len(self.categories)]]
+
+        # Calcular init_time para todos los años a la vez
+        # OBS: init_time indica el año y mes del mes inicial (start_month, init_month, el mes con leadtime 0)
+        years = tables[0].row_labels.astype(int)
+        init_times = month_start_dates(years - 1 if forecast_month > first_target_month else years, forecast_month)
+
+        # Apilar los bloques (categoría x año x punto de grilla) en un dataset con dimensiones
+        # init_time, latitude, longitude, category. Las categorías son una dimensión más (en el orden del archivo).
+        grid = DenseGrid(['init_time', 'latitude', 'longitude', 'category'], [file_variable],
+                         coords={'category': np.array(self.categories)})
+        latitudes, longitudes = tables[0].header_rows['cpt:Y'], tables[0].header_rows['cpt:X']
+        for category, table in zip(self.categories, tables):
+            # La salida probabilística del CPT tiene probabilidades que van de 0 a 100
+            grid.add({file_variable: table.values / 100}, init_time=init_times[:, np.newaxis],
+                     latitude=latitudes[np.newaxis, :], longitude=longitudes[np.newaxis, :],
+                     category=np.array(category))
+        final_ds = grid.to_dataset()
 
         # Modificar años, en caso de que sea necesario
         if desc_file is not None and desc_file.get('swap_years') is not None:
@@ -320,147 +180,53 @@ class ReadCPToutputPROB(ReadStrategy):
             last_hindcast_year = last_hindcast_year - (1 if forecast_month > first_target_month else 0)
             first_forecast_year = first_forecast_year - (1 if forecast_month > first_target_month else 0)
 
-            # Solamente es necesario renombrar los años cuando el primer año de pronóstico (first_forecast_year)
-            # es al menos dos años posterior al último año de hindcast (last_hindcast_year).
-            if first_forecast_year - last_hindcast_year >= 2:
-
-                # Identificar los años posteriores al último año de hindcast, todos estos años deben ser renombrados
-                years_to_swap = set([y for y in final_df['init_time'].dt.year if y > last_hindcast_year])
-
-                # Se crea una lista que contiene los dataframes con años renombrados.
-                # Esta lista se concatena una sola vez al final de la operación, lo que
-                # permite evitar fragmentación (https://stackoverflow.com/q/68292862)
-                anhos_dataframes = list()
-
-                # Recorrer los años que deben ser renombrados, "y" es el año a ser modificado y "n" es la
-                # cantidad que debe sumarse al primer año pronosticado para obtener el año final.
-                for n, y in enumerate(years_to_swap):
-                    # Se hace una copia profunda del año a renombrar
-                    aux = final_df.loc[final_df['init_time'].dt.year == y].copy(deep=True)
-                    # Se actualiza el año en el dataframe auxiliar (que contiene un solo año)
-                    aux['init_time'] = aux['init_time'].apply(lambda x: x.replace(year=first_forecast_year+n))
-                    # Se copia el dataframe para evitar framentación
-                    aux = aux.copy() # clean up fragmentation
-                    # Se agrega el dataframe aux a la lista con los años renombrados
-                    anhos_dataframes.append(aux)
-                    # Se remueve el objeto para liberar memoria
-                    del aux  
-                    # Se asigna NA al año que ya fue renombrado
-                    final_df.loc[final_df['init_time'].dt.year == y, file_variable] = np.nan
-                
-                # Se concatenan todos los dataframes de una sola vez para evitar fragmentación
-                anhos_renombrados = pd.concat(anhos_dataframes)
-
-                # Se reemplaza los valores con NA en final_df con los valores corregidos
-                final_df = final_df.merge(anhos_renombrados, how='outer')
-
-        # Definir la categoría como una categoría, entonces el ordenar toma el orden
-        # declarado en lugar de ordenar la categoría por orden alfabético.
-        final_df['category'] = final_df['category'].astype('category')
-        final_df['category'] = final_df['category'].cat.set_categories(['below', 'normal', 'above'])
-        # Reindexar el dataframe
-        final_df = final_df.set_index(['init_time', 'latitude', 'longitude', 'category']).sort_index()
-
-        # La salida probabilística del CPT tiene probabilidades que van de 0 a 100
-        final_df[file_variable] = final_df[file_variable] / 100
-
-        # Transformar dataframe a dataset
-        final_ds = final_df.to_xarray()
+            # Renombrar los años posteriores al último año de hindcast
+            final_ds = swap_years(final_ds, last_hindcast_year, first_forecast_year)
 
         # Agregar atributos que describan la variable
         final_ds[file_variable].attrs['units'] = '%'
 
-        # Filtrar años, en caso de que sea necesario
-        if desc_file is not None and desc_file.get('filter_years') is not None:
-            min_year = desc_file.get('filter_years').get('min_year')
-            if min_year is not None:
-                min_year = min_year - (1 if forecast_month > first_target_month else 0)
-                final_ds = final_ds.where(final_ds.init_time.dt.year >= min_year, drop=True)
-            max_year = desc_file.get('filter_years').get('max_year')
-            if max_year is not None:
-                max_year = max_year - (1 if forecast_month > first_target_month else 0)
-                final_ds = final_ds.where(final_ds.init_time.dt.year <= max_year, drop=True)
+        # Filtrar años y puntos de grilla, en caso de que sea necesario
+        final_ds = subset.select(final_ds)
 
         # Return generated dataset
         return final_ds
 
-    @staticmethod
-    def __extract_cpt_output_file_info(file_name: str) -> CPToutputFileInfo:
-        # Abrir el archivo
-        with open(file_name) as fp:
-            # Leer el archivo línea por línea
-            for cnt, line in enumerate(fp):
-                # Aplicar expresiones regulares a la línea actual
-                n_rows_regex, n_cols_regex = re.search(r'cpt:nrow=(\d+),', line), re.search(r'cpt:ncol=(\d+),', line)
-                na_values_regex = re.search(r'cpt:missing=([-+]?\d+\.?\d+?)', line)
-                # La línea con los datos buscados cumple con las 3 expresiones regulares
-                if n_rows_regex and n_cols_regex and na_values_regex:
-                    # Extraer los datos del archivo
-                    n_rows, n_cols = int(n_rows_regex.group(1)), int(n_cols_regex.group(1))
-                    na_values = float(na_values_regex.group(1))
-                    header_line, data_first_line = cnt + 1, cnt + 4
-                    header_n_rows = data_first_line - header_line
-                    # Retornar los datos del archivo
-                    return CPToutputFileInfo(n_rows, n_cols, na_values, header_line, data_first_line, 1, header_n_rows)
-
 
 class ReadCPTpredictand(ReadStrategy):
     """
     A Concrete Strategy (Desing Pattern -> Strategy)
     """
-    def read_data(self, file_name: str, desc_file: dict = None) -> Dataset:
-        # Identificar el mes de corrida en el nombre del archivo
-        month_regex = re.search(r'_(\d+)-?(\d+)?\.txt', file_name)
-        first_month, last_month = month_regex.group(1), month_regex.group(2)
+    file_name_parser = FileNameParser(FileNameRule(r'_(\d+)-?(\d+)?\.txt', target_months), CPT_VARIABLE_RULE)
 
-        # Identificar la variable en el nombre del archivo
-        file_variable = re.search(r'(prcp|t2m)', file_name).group(0)
-
-        # Obtener el nombre de las columnas, las longitude y las latitudes
-        header_df = pd.read_csv(file_name, sep='\t', header=0, index_col=0, nrows=2)
-
-        # En los archivos de salida del CPT:
-        # la línea que empieza con cpt:X es la longitud, y la línea que empieza con cpt:Y es la latitud
-        header_df.rename(index={'Lon': 'longitude', 'Lat': 'latitude'}, inplace=True)
-
-        # Crear un dataframe con longitud y latitude (e índice igual al nombre de las columnas en data_df)
-        longitude_df = pd.DataFrame({'longitude': header_df.loc['longitude']})
-        latitude_df = pd.DataFrame({'latitude': header_df.loc['latitude']})
-        coord_data_df = longitude_df.join(latitude_df)
-
-        # Obtener los datos en el archivo
-        data_df = pd.read_csv(file_name, sep='\t', names=header_df.columns.to_list(), index_col=0, skiprows=3,
-                              na_values=['-999', -999, -999.0])
-
-        # Crear df con índice igual a longitude, latitude, year
-        year_dataframes = list()  # to avoid fragmentation (https://stackoverflow.com/q/68292862)
-        for year in data_df.index.to_list():
-            year_data_df = pd.DataFrame({file_variable: data_df.loc[year]})
-            year_data_df = coord_data_df.join(year_data_df)
-            year_data_df.insert(2, 'init_time', pd.to_datetime(f'{year}-{first_month}-01'))
-            year_data_df = year_data_df.copy() # clean up fragmentation
-            year_dataframes.append(year_data_df)  # to avoid fragmentation (https://stackoverflow.com/q/68292862)
-            del year_data_df  # se remueve el objeto para liberar memoria
-        final_df = pd.concat(year_dataframes)  # to avoid fragmentation (https://stackoverflow.com/q/68292862)
-
-        # Reindexar el dataframe
-        final_df = final_df.set_index(['init_time', 'latitude', 'longitude']).sort_index()
-
-        # Transformar dataframe a dataset
-        final_ds = final_df.to_xarray()
+    def read_data(self, file_name: str, desc_file: dict = None) -> Dataset:
+        # Identificar los meses objetivo y la variable en el nombre del archivo
+        file_info = self.file_name_info(file_name)
+        first_month, file_variable = file_info.first_target_month, file_info.variable
+
+        # Obtener las longitudes, las latitudes y los datos en el archivo (solo los años y puntos a conservar)
+        # En los archivos de predictandos del CPT (sin tags cpt:):
+        # la línea que empieza con Lon es la longitud, y la línea que empieza con Lat es la latitud
+        subset = DataSubset.from_descriptor(desc_file)
+        with CPTfile(file_name) as cpt_file:
+            table = cpt_file.read_table(0, n_header_rows=2, na_values=-999, rows_filter=subset.rows_filter(),
+                                        columns_filter=subset.columns_filter('Lat', 'Lon'))
+
+        # Calcular init_time para todos los años a la vez
+        init_times = month_start_dates(table.row_labels.astype(int), first_month)
+
+        # Reacomodar la matriz año x punto de grilla en un dataset con dimensiones init_time, latitude, longitude
+        grid = DenseGrid(['init_time', 'latitude', 'longitude'], [file_variable])
+        grid.add({file_variable: table.values}, init_time=init_times[:, np.newaxis],
+                 latitude=table.header_rows['Lat'][np.newaxis, :], longitude=table.header_rows['Lon'][np.newaxis, :])
+        final_ds = grid.to_dataset()
 
         # Agregar atributos que describan la variable
         unidad_de_medida = 'mm' if file_variable == 'prcp' else 'Celsius' if file_variable == 't2m' else None
         final_ds[file_variable].attrs['units'] = f'{unidad_de_medida}'
 
-        # Filtrar años, en caso de que sea necesario
-        if desc_file is not None and desc_file.get('filter_years') is not None:
-            min_year = desc_file.get('filter_years').get('min_year')
-            if min_year is not None:
-                final_ds = final_ds.where(final_ds.init_time.dt.year >= min_year, drop=True)
-            max_year = desc_file.get('filter_years').get('max_year')
-            if max_year is not None:
-                final_ds = final_ds.where(final_ds.init_time.dt.year <= max_year, drop=True)
+        # Filtrar años y puntos de grilla, en caso de que sea necesario
+        final_ds = subset.select(final_ds)
 
         # Return generated dataset
         return final_ds
@@ -470,173 +236,180 @@ class ReadCPTpredictor(ReadStrategy):
     """
     A Concrete Strategy (Desing Pattern -> Strategy)
     """
-    def read_data(self, file_name: str, desc_file: dict = None) -> Dataset:
-        # Extraer información del archivo CPT
-        df_info: List[CPTpredictorFileInfo] = self.__extract_cpt_predictor_file_info(file_name)
-
-        # Identificar el mes de corrida y los meses objetivo en el nombre del archivo
-        months_regex = re.search(rf'({"|".join(Mpro.months_abbr[1:])})ic_(\d*)-?(\d*)?_', file_name)
-        forecast_month, first_target_month = Mpro.month_abbr_to_int(months_regex.group(1)), int(months_regex.group(2))
-
-        # Identificar la variable en el nombre del archivo
-        file_variable = re.search(r'(precip|tmp2m)', file_name).group(0)
-        file_variable = 'prcp' if file_variable == 'precip' else 't2m' if file_variable == 'tmp2m' else None
-
-        # Gen dataframe for current file accessing only rows with data
-        info_dataframes = list()  # to avoid fragmentation (https://stackoverflow.com/q/68292862)
-        for info in df_info:
-            df = pd.read_csv(file_name, sep='\t', index_col=0, skiprows=info.field_line, nrows=info.n_rows,
-                             na_values=[info.na_values, int(info.na_values), float(info.na_values)])
-            df = df.copy() # clean up fragmentation
-            df['latitude'] = df.index
-            df = df.melt(id_vars=['latitude'], var_name='longitude', value_name=file_variable)
-            df['longitude'] = df['longitude'].astype(float)
-            df.insert(0, 'init_time', info.start_date)
-            info_dataframes.append(df)  # to avoid fragmentation (https://stackoverflow.com/q/68292862)
-            del df  # se remueve el objeto para liberar memoria
-        final_df = pd.concat(info_dataframes)  # to avoid fragmentation (https://stackoverflow.com/q/68292862)
-
-        # Modificar años, en caso de que sea necesario
-        if desc_file is not None and desc_file.get('swap_years') is not None:
-
-            # Obtener último año de hindcast y primer año pronosticado
-            last_hindcast_year = desc_file.get('swap_years').get('last_hindcast_year')
-            first_forecast_year = desc_file.get('swap_years').get('first_forecast_year')
+    file_name_parser = FileNameParser(
+        CPT_MONTHS_RULE, FileNameRule(r'(precip|tmp2m)', variable({'precip': 'prcp', 'tmp2m': 't2m'})))
 
-            # OJO: El archivo que se está leyendo indica como año, el año del primer mes objetivo (y no el año de
-            # inicialización del pronóstico). Sin embargo, el NetCDF generado debe indicar el año de inicialización
-            # en la variable init_time (y no el año del primer mes objetivo).
-            # Por lo tanto, algunas veces es necesario recalcular last_hindcast_year y first_forecast_year.
-            # Esto ocurre por ejemplo para los pronósticos inicializados en diciembre y que tienen como primer mes
-            # objetivo a enero (en estos tanto last_hindcast_year como first_forecast_year están un año por delante).
-            last_hindcast_year = last_hindcast_year - (1 if forecast_month > first_target_month else 0)
-            first_forecast_year = first_forecast_year - (1 if forecast_month > first_target_month else 0)
-
-            # Solamente es necesario renombrar los años cuando el primer año de pronóstico (first_forecast_year)
-            # es al menos dos años posterior al último año de hindcast (last_hindcast_year).
-            if first_forecast_year - last_hindcast_year >= 2:
-
-                # Identificar los años posteriores al último año de hindcast, todos estos años deben ser renombrados
-                years_to_swap = set([y for y in final_df['init_time'].dt.year if y > last_hindcast_year])
-
-                # Se crea una lista que contiene los dataframes con años renombrados.
-                # Esta lista se concatena una sola vez al final de la operación, lo que
-                # permite evitar fragmentación (https://stackoverflow.com/q/68292862)
-                anhos_dataframes = list()
-
-                # Recorrer los años que deben ser renombrados, "y" es el año a ser modificado y "n" es la
-                # cantidad que debe sumarse al primer año pronosticado para obtener el año final.
-                for n, y in enumerate(years_to_swap):
-                    # Se hace una copia profunda del año a renombrar
-                    aux = final_df.loc[final_df['init_time'].dt.year == y].copy(deep=True)
-                    # Se actualiza el año en el dataframe auxiliar (que contiene un solo año)
-                    aux['init_time'] = aux['init_time'].apply(lambda x: x.replace(year=first_forecast_year+n))
-                    # Se copia el dataframe para evitar framentación
-                    aux = aux.copy() # clean up fragmentation
-                    # Se agrega el dataframe aux a la lista con los años renombrados
-                    anhos_dataframes.append(aux)
-                    # Se remueve el objeto para liberar memoria
-                    del aux  
-                    # Se asigna NA al año que ya fue renombrado
-                    final_df.loc[final_df['init_time'].dt.year == y, file_variable] = np.nan
-                
-                # Se concatenan todos los dataframes de una sola vez para evitar fragmentación
-                anhos_renombrados = pd.concat(anhos_dataframes)
-
-                # Se reemplaza los valores con NA en final_df con los valores corregidos
-                final_df = final_df.merge(anhos_renombrados, how='outer')
-
-        # Reindexar el dataframe
-        final_df = final_df.set_index(['init_time', 'latitude', 'longitude']).sort_index()
-
-        # Transformar dataframe a dataset
-        final_ds = final_df.to_xarray()
-
-        # Identificar el mes de corrida y los meses objetivo en el nombre del archivo
-        months_regex = re.search(rf'({"|".join(Mpro.months_abbr[1:])})ic_(\d*)-?(\d*)?_', file_name)
-        first_trgt_month = int(months_regex.group(2))
-        last_trgt_month = int(months_regex.group(3)) if months_regex.group(3) else None
-        trgt_months = [first_trgt_month] if last_trgt_month is None else crange(first_trgt_month, last_trgt_month+1, 12)
+    def read_data(self, file_name: str, desc_file: dict = None) -> Dataset:
+        # Identificar el mes de corrida, los meses objetivo y la variable en el nombre del archivo
+        forecast_month, first_target_month, file_variable, trgt_months = self.__file_info(file_name)
+
+        # Definir el subconjunto de datos a leer (años y puntos de grilla)
+        last_hindcast_year, first_forecast_year = self.__swap_years_info(desc_file, forecast_month, first_target_month)
+        subset = DataSubset.from_descriptor(desc_file)
+        rows_filter, columns_filter = self.__points_filters(subset)
+
+        # Leer solo los campos (uno por cada fecha de inicio, cpt:S) de los años a convertir
+        with CPTfile(file_name) as cpt_file:
+            fields, start_dates = self.__select_fields(cpt_file, subset, last_hindcast_year)
+            tables = [cpt_file.read_field(f, rows_filter=rows_filter, columns_filter=columns_filter) for f in fields]
+
+        # Ubicar cada campo (matriz latitud x longitud, de una fecha de inicio) en un dataset con dimensiones
+        # init_time, latitude, longitude. OBS: las fechas de inicio se conocen antes de leer los campos (si no se
+        # lee ningún campo, init_time igual es una coordenada de fechas)
+        grid = DenseGrid(['init_time', 'latitude', 'longitude'], [file_variable],
+                         coords={'init_time': np.unique(start_dates)})
+        for start_date, table in zip(start_dates, tables):
+            grid.add({file_variable: table.values}, init_time=np.array(start_date),
+                     latitude=table.row_labels[:, np.newaxis],
+                     longitude=np.array(table.column_names, dtype=float)[np.newaxis, :])
+        final_ds = grid.to_dataset()
+
+        # Modificar años, en caso de que sea necesario (renombrar los años posteriores al último año de hindcast)
+        if last_hindcast_year is not None:
+            final_ds = swap_years(final_ds, last_hindcast_year, first_forecast_year)
 
         # Corregir valor total pronosticado (se debe multiplicar por la cantidad de días del mes o del trimestre)
         if file_variable == 'prcp':
-            for init_year, init_month in zip(final_ds.init_time.dt.year.values, final_ds.init_time.dt.month.values):
-                n_days = Mpro.n_days_in_months(int(init_year), int(init_month), trgt_months)
-                final_ds.loc[{'init_time': str(init_year)}] = final_ds.sel(init_time=str(init_year)) * n_days
+            n_days = Mpro.n_days_in_months(
+                final_ds.init_time.dt.year.values, final_ds.init_time.dt.month.values, list(trgt_months))
+            final_ds = scale_by_n_days(final_ds, n_days)
 
         # Agregar atributos que describan la variable
         unidad_de_medida = 'mm' if file_variable == 'prcp' else 'Celsius' if file_variable == 't2m' else None
         final_ds[file_variable].attrs['units'] = f'{unidad_de_medida}'
 
-        # Filtrar años, en caso de que sea necesario
-        if desc_file is not None and desc_file.get('filter_years') is not None:
-            min_year = desc_file.get('filter_years').get('min_year')
-            if min_year is not None:
-                final_ds = final_ds.where(final_ds.init_time.dt.year >= min_year, drop=True)
-            max_year = desc_file.get('filter_years').get('max_year')
-            if max_year is not None:
-                final_ds = final_ds.where(final_ds.init_time.dt.year <= max_year, drop=True)
+        # Filtrar años y puntos de grilla, en caso de que sea necesario
+        final_ds = subset.select(final_ds)
 
         # Return generated dataset
         return final_ds
 
+    def stream_to_netcdf(self, file_name: str, output_file: str, encoding: NetCDFEncoding,
+                         desc_file: dict = None) -> bool:
+        # Identificar el mes de corrida, los meses objetivo y la variable en el nombre del archivo
+        forecast_month, first_target_month, file_variable, trgt_months = self.__file_info(file_name)
+
+        # Definir el subconjunto de datos a leer (años y puntos de grilla)
+        last_hindcast_year, first_forecast_year = self.__swap_years_info(desc_file, forecast_month, first_target_month)
+        subset = DataSubset.from_descriptor(desc_file)
+        rows_filter, columns_filter = self.__points_filters(subset)
+
+        with CPTfile(file_name) as cpt_file:
+            fields, start_dates = self.__select_fields(cpt_file, subset, last_hindcast_year)
+
+            # Definir la grilla de salida a partir de las coordenadas de todos los campos (sin leer los datos)
+            fields_labels = [cpt_file.read_field_labels(f) for f in fields]
+            latitudes = np.unique(np.concatenate([rows for _, rows in fields_labels] or [np.empty(0)]))
+            longitudes = np.unique(np.concatenate(
+                [np.array(columns, dtype=float) for columns, _ in fields_labels] or [np.empty(0)]))
+            latitudes = latitudes[subset.latitudes_mask(latitudes)]
+            longitudes = longitudes[subset.longitudes_mask(longitudes)]
+
+            # Definir el eje init_time final: fechas de inicio ordenadas, con los años renombrados (ver swap_years)
+            # y solo con los años a convertir. Para cada fecha se identifica la fecha de inicio con sus datos.
+            init_times, time_idx = np.unique(start_dates, return_inverse=True)
+            source_idx, without_data = np.arange(init_times.size), np.zeros(init_times.size, dtype=bool)
+            swapped_order = None if last_hindcast_year is None else \
+                swapped_years_order(init_times, last_hindcast_year, first_forecast_year)
+            if swapped_order is not None:
+                init_times, source_idx, already_swapped = swapped_order
+                without_data = np.isin(np.arange(init_times.size), already_swapped)
+            years_mask = subset.years_mask(init_times.astype('datetime64[Y]').astype(int) + 1970)
+            init_times, source_idx, without_data = init_times[years_mask], source_idx[years_mask], without_data[years_mask]
+
+            # Calcular la cantidad de días por la que se debe multiplicar cada campo (ver read_data)
+            n_days = None
+            if file_variable == 'prcp':
+                init_months = init_times.astype('datetime64[M]').astype(int)
+                n_days = Mpro.n_days_in_months(init_months // 12 + 1970, init_months % 12 + 1, list(trgt_months))
+
+            # Crear el archivo NetCDF y agregar los campos de a uno (solo un campo a la vez en memoria)
+            unidad_de_medida = 'mm' if file_variable == 'prcp' else 'Celsius' if file_variable == 't2m' else None
+            first_time = np.datetime_as_string(init_times[0], unit='s').replace('T', ' ') if init_times.size else None
+            with NetCDFStreamWriter(
+                    output_file, file_variable, 'init_time', {'latitude': latitudes, 'longitude': longitudes},
+                    attrs={'units': f'{unidad_de_medida}'},
+                    encoding=encoding.array_encoding(
+                        ('init_time', 'latitude', 'longitude'), (init_times.size, latitudes.size, longitudes.size)),
+                    **({'time_units': f'days since {first_time}'} if first_time else {})) as writer:
+                for t, (init_time, source) in enumerate(zip(init_times, source_idx)):
+                    field_values = np.full((latitudes.size, longitudes.size), np.nan)
+                    # OBS: si más de un campo tiene la misma fecha de inicio, se aplican en orden (como en read_data)
+                    for field in ([] if without_data[t] else [f for f, i in zip(fields, time_idx) if i == source]):
+                        table = cpt_file.read_field(field, rows_filter=rows_filter, columns_filter=columns_filter)
+                        lat_idx = np.searchsorted(latitudes, table.row_labels)
+                        lon_idx = np.searchsorted(longitudes, np.array(table.column_names, dtype=float))
+                        field_values[lat_idx[:, np.newaxis], lon_idx[np.newaxis, :]] = table.values
+                    if n_days is not None:
+                        field_values = field_values * n_days[t]
+                    writer.append(init_time, field_values)
+
+        # Informar que el archivo fue escrito
+        return True
+
+    def __file_info(self, file_name: str) -> tuple[int, int, str, list[int]]:
+        # Identificar el mes de corrida, los meses objetivo y la variable en el nombre del archivo
+        file_info = self.file_name_info(file_name)
+        return file_info.forecast_month, file_info.first_target_month, file_info.variable, list(file_info.target_months)
+
+    @staticmethod
+    def __swap_years_info(desc_file: dict, forecast_month: int,
+                          first_target_month: int) -> tuple[int | None, int | None]:
+        # Obtener último año de hindcast y primer año pronosticado (si no hay años a renombrar, se retorna None)
+        if desc_file is None or desc_file.get('swap_years') is None:
+            return None, None
+        last_hindcast_year = desc_file.get('swap_years').get('last_hindcast_year')
+        first_forecast_year = desc_file.get('swap_years').get('first_forecast_year')
+
+        # OJO: El archivo que se está leyendo indica como año, el año del primer mes objetivo (y no el año de
+        # inicialización del pronóstico). Sin embargo, el NetCDF generado debe indicar el año de inicialización
+        # en la variable init_time (y no el año del primer mes objetivo).
+        # Por lo tanto, algunas veces es necesario recalcular last_hindcast_year y first_forecast_year.
+        # Esto ocurre por ejemplo para los pronósticos inicializados en diciembre y que tienen como primer mes
+        # objetivo a enero (en estos tanto last_hindcast_year como first_forecast_year están un año por delante).
+        last_hindcast_year = last_hindcast_year - (1 if forecast_month > first_target_month else 0)
+        first_forecast_year = first_forecast_year - (1 if forecast_month > first_target_month else 0)
+
+        # Retornar los años a utilizar para renombrar los años posteriores al último año de hindcast
+        return last_hindcast_year, first_forecast_year
+
     @staticmethod
-    def __extract_cpt_predictor_file_info(file_name: str) -> List[CPTpredictorFileInfo]:
-        df_info: List[CPTpredictorFileInfo] = list()
-        # Abrir el archivo
-        with open(file_name) as fp:
-            # Leer el archivo línea por línea
-            for cnt, line in enumerate(fp):
-
-                # Aplicar expresiones regulares a la línea actual
-                start_date_regex = re.search(r'cpt:S=(\d+)-(\d+)-(\d+)(T00:00)?,', line)
-                target_date_regex = re.search(r'cpt:T=(\d+)-(\d+)/?(\d+)?-?(\d+)?,?', line)
-                n_rows_regex, n_cols_regex = re.search(r'cpt:nrow=(\d+),', line), re.search(r'cpt:ncol=(\d+),', line)
-                na_values_regex = re.search(r'cpt:missing=([-+]?\d+\.?\d+?)', line)
-
-                # La línea con los datos buscados cumple con las 3 expresiones regulares
-                if start_date_regex and target_date_regex and n_rows_regex and n_cols_regex and na_values_regex:
-
-                    # Extraer los datos del archivo
-                    n_rows, n_cols, field_line = int(n_rows_regex.group(1)), int(n_cols_regex.group(1)), cnt + 1
-                    na_values = float(na_values_regex.group(1))
-                    start_date = datetime(
-                        int(start_date_regex.group(1)), int(start_date_regex.group(2)), int(start_date_regex.group(3)))
-                    target_first_month_date = datetime(
-                        int(target_date_regex.group(1)), int(target_date_regex.group(2)), 1)
-                    target_last_month_date = None
-                    if target_date_regex.group(3) and not target_date_regex.group(4):
-                        target_last_month_date = datetime(
-                            int(target_date_regex.group(1)), int(target_date_regex.group(3)), 1)
-                    if target_date_regex.group(3) and target_date_regex.group(4):
-                        target_last_month_date = datetime(
-                            int(target_date_regex.group(3)), int(target_date_regex.group(4)), 1)
-
-                    # Retornar los datos del archivo
-                    df_info.append(
-                        CPTpredictorFileInfo(
-                            n_rows, n_cols, na_values, field_line, start_date, target_first_month_date,
-                            target_last_month_date))
-
-        # Retornar los datos del archivo
-        return df_info
+    def __points_filters(subset: DataSubset) -> tuple[RowsFilter, ColumnsFilter]:
+        # En los archivos de predictores las filas son latitudes y las columnas son longitudes
+        if not subset.filters_points:
+            return None, None
+        return subset.latitudes_mask, lambda names, header_rows: subset.longitudes_mask(np.array(names, dtype=float))
+
+    @staticmethod
+    def __select_fields(cpt_file: CPTfile, subset: DataSubset,
+                        last_hindcast_year: int | None) -> tuple[list[CPTfield], np.ndarray]:
+        # Cada campo con fecha de inicio (cpt:S) y fecha objetivo (cpt:T) corresponde a un init_time
+        fields = [f for f in cpt_file.fields if 'S' in f.tags and 'T' in f.tags]
+        start_dates = np.array([f.tags['S'][:10] for f in fields], dtype='datetime64[ns]')
+
+        # OBS: en estos archivos init_time es la fecha de inicio (cpt:S), por lo que los años no deben corregirse.
+        # Sin embargo, los años a renombrar (ver swap_years) siempre se leen, se filtran una vez renombrados.
+        fields_filter = subset.rows_filter(always_keep_after=last_hindcast_year)
+        if fields_filter is not None:
+            fields_mask = fields_filter(start_dates.astype('datetime64[Y]').astype(int) + 1970)
+            fields, start_dates = [f for f, keep in zip(fields, fields_mask) if keep], start_dates[fields_mask]
+
+        # Retornar los campos a leer y la fecha de inicio de cada uno
+        return fields, start_dates
 
 
 class ReadEREGoutputDET(ReadStrategy):
     """
     A Concrete Strategy (Desing Pattern -> Strategy)
     """
-    def read_data(self, file_name: str, desc_file: dict = None) -> Dataset:
-        # Identificar el mes de corrida en el nombre del archivo
-        forecast_month = re.search(rf'({"|".join(Mpro.months_abbr[1:])})', file_name).group(0)
-        forecast_month = Mpro.month_abbr_to_int(forecast_month)
-
-        # Identificar la variable en el nombre del archivo
-        file_variable = re.search(r'(prec|tref)', file_name).group(0)
-        file_variable = 'prcp' if file_variable == 'prec' else 't2m' if file_variable == 'tref' else None
+    file_name_parser = FileNameParser(EREG_MONTH_RULE, EREG_VARIABLE_RULE, EREG_SEASON_RULE,
+                                      FileNameRule(EREG_FORECAST_YEAR_PATTERN, year, required=False))
 
-        # Identificar trimestre objetivo
-        season_months = re.search(rf'({"|".join(Mpro.trimesters[1:])})', file_name).group(0)
+    def read_data(self, file_name: str, desc_file: dict = None) -> Dataset:
+        # Identificar el mes de corrida, la variable y el año de corrida (tiempo real) en el nombre del archivo
+        # OBS: el trimestre objetivo también debe estar en el nombre del archivo
+        file_info = self.file_name_info(file_name)
+        forecast_month, file_variable = file_info.forecast_month, file_info.variable
 
         # Extraer de la configuración el primer año en el archivo
         first_year = desc_file.get('first_year_in_file', DEFAULT_START_YEAR) \
@@ -645,19 +418,29 @@ class ReadEREGoutputDET(ReadStrategy):
         # Determinar si el archivo es de tipo hindcast o no
         is_hindcast = ('_hind.npz' in file_name)
 
+        # Definir el subconjunto de datos a leer (años y puntos de grilla)
+        subset = DataSubset.from_descriptor(desc_file)
+
         # Leer archivo de tipo npz
-        with np.load(file_name) as npz:
+        with NPZfile(file_name) as npz:
             # Identificar variable con datos
             data_variable = [x for x in npz.files if x not in ['lat', 'lon']][0]
             # Los archivos de tipo hindcast y real_time tiene diferentes estructuras. Por lo tanto se los lee de manera
             # diferente. Los hindcasts tienen datos para muchos años, los real_time tienen un solo año.
             if is_hindcast:
                 # Identificar la cantidad de años en el archivo
-                n_years = len(npz[data_variable])
+                data_values, lats, lons = np.squeeze(npz[data_variable]), npz['lat'], npz['lon']
+                n_years = len(data_values)
+                init_times = pd.date_range(f"{first_year}-{forecast_month}-01", periods=n_years, freq='12ME')
+                # Conservar solo los años y puntos de grilla a convertir (el año i del archivo es first_year + i)
+                if subset.filters_data:
+                    years_idx, lats_idx, lons_idx = subset.grid_indexers(first_year + np.arange(n_years), lats, lons)
+                    data_values = data_values[np.ix_(years_idx, lats_idx, lons_idx)]
+                    init_times, lats, lons = init_times[years_idx], lats[lats_idx], lons[lons_idx]
                 # Crear dataset con los datos
                 final_ds = xr.Dataset(
                     data_vars={
-                        file_variable: (['init_time', 'latitude', 'longitude'], np.squeeze(npz[data_variable][:, :, :]))
+                        file_variable: (['init_time', 'latitude', 'longitude'], data_values)
                     },
                     coords={
                         # "init_time" debe ser la fecha de inicio de la corrida, es decir, para un prono corrido en
@@ -670,22 +453,22 @@ class ReadEREGoutputDET(ReadStrategy):
                         #      de la corrida y no el año del primer mes objetivo del pronóstico. Por lo tanto, a
                         #      diferencia de lo que pasa con los archivos de salida del CPT, aquí sí se puede usar
                         #      directamente el año.
-                        'init_time': pd.date_range(f"{first_year}-{forecast_month}-01", periods=n_years, freq='12ME'),
-                        'latitude': npz['lat'],
-                        'longitude': npz['lon']
+                        'init_time': init_times,
+                        'latitude': lats,
+                        'longitude': lons
                     })
             else:
                 # Crear dataset con los datos
                 final_ds = xr.Dataset(
                     data_vars={
-                        file_variable: (['latitude', 'longitude'], np.squeeze(npz[data_variable][:, :]))
+                        file_variable: (['latitude', 'longitude'], np.squeeze(npz[data_variable]))
                     },
                     coords={
                         'latitude': npz['lat'],
                         'longitude': npz['lon']
                     })
                 # Identificar el año de pronósticos real_time
-                forecast_year = re.search(rf'(?:{"|".join(Mpro.months_abbr[1:])})(\d{{4}})', file_name).group(1)
+                forecast_year = file_info.year
                 # Agregar init_time al dataset
                 # "init_time" debe ser la fecha de inicio de la corrida, es decir, para un prono corrido en diciembre
                 #      de 2020 para enero de 2021, init_time debe tener como año al 2020, no el 2021. CPT retorna como
@@ -693,7 +476,7 @@ class ReadEREGoutputDET(ReadStrategy):
                 #      anterior, por lo que, en el caso del CPT, el año en los archivos de salida no pueden usarse
                 #      sin pre-procesarlos.
                 final_ds = final_ds.expand_dims(
-                    init_time=pd.date_range(f"{forecast_year}-{forecast_month}-01", periods=1)).copy(deep=True)
+                    init_time=pd.date_range(f"{forecast_year}-{forecast_month}-01", periods=1))
 
         # Corregir valor total pronosticado (se debe multiplicar por la cantidad de días del mes o del trimestre)
         # OBS: Al generar el archivo observado, marisol no divide el valor por la cantidad de días del mes, sino por
@@ -703,22 +486,15 @@ class ReadEREGoutputDET(ReadStrategy):
         # Como los pronósticos determinísticos se obtienen a partir de estos datos observados, lo anterior también
         # aplica para estos, y, por lo tanto, para obtener el total del trimestre, la multiplicación deber ser por 90.
         if file_variable == 'prcp':
-            for year in final_ds.init_time.dt.year.values:
-                n_days = 90  # Mpro.n_days_in_trimester(season_months, calendar.isleap(int(year)))
-                final_ds.loc[{'init_time': str(year)}] = final_ds.sel(init_time=str(year)) * n_days
+            n_days = 90  # Mpro.n_days_in_trimester(season_months, Mpro.is_leap(final_ds.init_time.dt.year.values))
+            final_ds = scale_by_n_days(final_ds, n_days)
 
         # Agregar atributos que describan la variable
         unidad_de_medida = 'mm' if file_variable == 'prcp' else 'Celsius' if file_variable == 't2m' else None
         final_ds[file_variable].attrs['units'] = f'{unidad_de_medida} anomaly'
 
-        # Filtrar años, en caso de que sea necesario
-        if desc_file is not None and desc_file.get('filter_years') is not None:
-            min_year = desc_file.get('filter_years').get('min_year')
-            if min_year is not None:
-                final_ds = final_ds.where(final_ds.init_time.dt.year >= min_year, drop=True)
-            max_year = desc_file.get('filter_years').get('max_year')
-            if max_year is not None:
-                final_ds = final_ds.where(final_ds.init_time.dt.year <= max_year, drop=True)
+        # Filtrar años y puntos de grilla, en caso de que sea necesario
+        final_ds = subset.select(final_ds)
 
         # Return generated dataset
         return final_ds
@@ -728,14 +504,13 @@ class ReadEREGoutputPROB(ReadStrategy):
     """
     A Concrete Strategy (Desing Pattern -> Strategy)
     """
-    def read_data(self, file_name: str, desc_file: dict = None) -> Dataset:
-        # Identificar el mes de corrida en el nombre del archivo
-        forecast_month = re.search(rf'({"|".join(Mpro.months_abbr[1:])})', file_name).group(0)
-        forecast_month = Mpro.month_abbr_to_int(forecast_month)
+    file_name_parser = FileNameParser(EREG_MONTH_RULE, EREG_VARIABLE_RULE,
+                                      FileNameRule(EREG_FORECAST_YEAR_PATTERN, year, required=False))
 
-        # Identificar la variable en el nombre del archivo
-        file_variable = re.search(r'(prec|tref)', file_name).group(0)
-        file_variable = 'prcp' if file_variable == 'prec' else 't2m' if file_variable == 'tref' else None
+    def read_data(self, file_name: str, desc_file: dict = None) -> Dataset:
+        # Identificar el mes de corrida, la variable y el año de corrida (tiempo real) en el nombre del archivo
+        file_info = self.file_name_info(file_name)
+        forecast_month, file_variable = file_info.forecast_month, file_info.variable
 
         # Extraer de la configuración el primer año en el archivo
         first_year = desc_file.get('first_year_in_file', DEFAULT_START_YEAR) \
@@ -744,8 +519,11 @@ class ReadEREGoutputPROB(ReadStrategy):
         # Determinar si el archivo es de tipo hindcast o no
         is_hindcast = ('_hind.npz' in file_name)
 
+        # Definir el subconjunto de datos a leer (años y puntos de grilla)
+        subset = DataSubset.from_descriptor(desc_file)
+
         # Leer archivo de tipo npz
-        with np.load(file_name) as npz:
+        with NPZfile(file_name) as npz:
             # Identificar variable con datos
             data_variable = [x for x in npz.files if x not in ['lat', 'lon']][0]
 
@@ -753,22 +531,23 @@ class ReadEREGoutputPROB(ReadStrategy):
             # diferente. Los hindcasts tienen datos para muchos años, los real_time tienen un solo año.
             if is_hindcast:
 
-                # Identificar la cantidad de años en el archivo
-                n_years = len(npz[data_variable][0])
-
                 # Nombre de dimensiones: ['category', 'init_time', 'latitude', 'longitude']
-                for_terciles = np.squeeze(npz[data_variable][:, :, :, :])
+                for_terciles, lats, lons = np.squeeze(npz[data_variable]), npz['lat'], npz['lon']
+
+                # Identificar la cantidad de años en el archivo
+                n_years = len(for_terciles[0])
+                init_times = pd.date_range(f"{first_year}-{forecast_month}-01", periods=n_years, freq='12ME')
 
-                # Se extraen las probabilidades en el archivo npz
-                below = for_terciles[0, :, :, :]
-                near_as = for_terciles[1, :, :, :]  # normal + below
-                # Se calcula la probabilidad de un evento superior a la media
-                above = 1 - near_as
-                normal = near_as - below
+                # Conservar solo los años y puntos de grilla a convertir (el año i del archivo es first_year + i)
+                grid_indexers = None
+                if subset.filters_data:
+                    grid_indexers = subset.grid_indexers(first_year + np.arange(n_years), lats, lons)
+                    years_idx, lats_idx, lons_idx = grid_indexers
+                    init_times, lats, lons = init_times[years_idx], lats[lats_idx], lons[lons_idx]
 
-                # Se crea la matriz con la que se creará el dataset
-                for_terciles = np.concatenate([below[:, :, :, np.newaxis], normal[:, :, :, np.newaxis],
-                                               above[:, :, :, np.newaxis]], axis=3)
+                # Se calculan las probabilidades de las 3 categorías (below, normal y above) a partir de las
+                # probabilidades en el archivo npz (below y near_as = normal + below), en un único arreglo
+                for_terciles = terciles_from_cumulative(for_terciles, grid_indexers)
 
                 # Crear dataset con los datos
                 final_ds = xr.Dataset(
@@ -786,27 +565,20 @@ class ReadEREGoutputPROB(ReadStrategy):
                         #      de la corrida y no el año del primer mes objetivo del pronóstico. Por lo tanto, a
                         #      diferencia de lo que pasa con los archivos de salida del CPT, aquí sí se puede usar
                         #      directamente el año.
-                        'init_time': pd.date_range(f"{first_year}-{forecast_month}-01", periods=n_years, freq='12ME'),
-                        'latitude': npz['lat'],
-                        'longitude': npz['lon'],
+                        'init_time': init_times,
+                        'latitude': lats,
+                        'longitude': lons,
                         'category': ['below', 'normal', 'above']
                     })
 
             else:
 
                 # Nombre de dimensiones: ['category', 'latitude', 'longitude']
-                for_terciles = np.squeeze(npz[data_variable][:, :, :])
+                for_terciles = np.squeeze(npz[data_variable])
 
-                # Se extraen las probabilidades en el archivo npz
-                below = for_terciles[0, :, :]
-                near_as = for_terciles[1, :, :]  # normal + below
-                # Se calcula la probabilidad de un evento superior a la media
-                above = 1 - near_as
-                normal = near_as - below
-
-                # Se crea la matriz con la que se creará el dataset
-                for_terciles = np.concatenate([below[:, :, np.newaxis], normal[:, :, np.newaxis],
-                                               above[:, :, np.newaxis]], axis=2)
+                # Se calculan las probabilidades de las 3 categorías (below, normal y above) a partir de las
+                # probabilidades en el archivo npz (below y near_as = normal + below), en un único arreglo
+                for_terciles = terciles_from_cumulative(for_terciles)
 
                 # Crear dataset con los datos
                 final_ds = xr.Dataset(
@@ -819,7 +591,7 @@ class ReadEREGoutputPROB(ReadStrategy):
                         'category': ['below', 'normal', 'above']
                     })
                 # Identificar el año de pronósticos real_time
-                forecast_year = re.search(rf'(?:{"|".join(Mpro.months_abbr[1:])})(\d{{4}})', file_name).group(1)
+                forecast_year = file_info.year
                 # Agregar init_time al dataset
                 # "init_time" debe ser la fecha de inicio de la corrida, es decir, para un prono corrido en diciembre
                 #      de 2020 para enero de 2021, init_time debe tener como año al 2020, no el 2021. CPT retorna como
@@ -827,19 +599,13 @@ class ReadEREGoutputPROB(ReadStrategy):
                 #      anterior, por lo que, en el caso del CPT, el año en los archivos de salida no pueden usarse
                 #      sin pre-procesarlos.
                 final_ds = final_ds.expand_dims(
-                    init_time=pd.date_range(f"{forecast_year}-{forecast_month}-01", periods=1)).copy(deep=True)
+                    init_time=pd.date_range(f"{forecast_year}-{forecast_month}-01", periods=1))
 
         # Agregar atributos que describan la variable
         final_ds[file_variable].attrs['units'] = '%'
 
-        # Filtrar años, en caso de que sea necesario
-        if desc_file is not None and desc_file.get('filter_years') is not None:
-            min_year = desc_file.get('filter_years').get('min_year')
-            if min_year is not None:
-                final_ds = final_ds.where(final_ds.init_time.dt.year >= min_year, drop=True)
-            max_year = desc_file.get('filter_years').get('max_year')
-            if max_year is not None:
-                final_ds = final_ds.where(final_ds.init_time.dt.year <= max_year, drop=True)
+        # Filtrar años y puntos de grilla, en caso de que sea necesario
+        final_ds = subset.select(final_ds)
 
         # Return generated dataset
         return final_ds
@@ -849,33 +615,25 @@ class ReadEREGoutputSISSA(ReadStrategy):
     """
     A Concrete Strategy (Desing Pattern -> Strategy)
     """
-    def read_data(self, file_name: str, desc_file: dict = None) -> Dataset:
-        # Identificar el mes de corrida en el nombre del archivo
-        forecast_month = re.search(rf'({"|".join(Mpro.months_abbr[1:])})', file_name).group(0)
-        forecast_month = Mpro.month_abbr_to_int(forecast_month)
+    file_name_parser = FileNameParser(EREG_MONTH_RULE, EREG_VARIABLE_RULE,
+                                      FileNameRule(EREG_FORECAST_YEAR_PATTERN, year))
 
-        # Identificar la variable en el nombre del archivo
-        file_variable = re.search(r'(prec|tref)', file_name).group(0)
-        file_variable = 'prcp' if file_variable == 'prec' else 't2m' if file_variable == 'tref' else None
+    def read_data(self, file_name: str, desc_file: dict = None) -> Dataset:
+        # Identificar el mes de corrida, la variable y el año de corrida (tiempo real) en el nombre del archivo
+        file_info = self.file_name_info(file_name)
+        forecast_month, file_variable = file_info.forecast_month, file_info.variable
 
         # Leer archivo de tipo npz
-        with np.load(file_name) as npz:
+        with NPZfile(file_name) as npz:
             # Identificar variable con datos
             data_variable = [x for x in npz.files if x not in ['lat', 'lon']][0]
 
             # Nombre de dimensiones: ['category', 'latitude', 'longitude']
-            for_quintiles = np.squeeze(npz[data_variable][:, :, :])
-
-            # Se extraen las probabilidades en el archivo npz
-            below = for_quintiles[0, :, :]
-            near_as = for_quintiles[1, :, :]  # normal + below
-            # Se calcula la probabilidad de un evento superior a la media
-            above = 1 - near_as
-            normal = near_as - below
+            for_quintiles = np.squeeze(npz[data_variable])
 
-            # Se crea la matriz con la que se creará el dataset
-            for_quintiles = np.concatenate([below[:, :, np.newaxis], normal[:, :, np.newaxis],
-                                            above[:, :, np.newaxis]], axis=2)
+            # Se calculan las probabilidades de las 3 categorías (below, normal y above) a partir de las
+            # probabilidades en el archivo npz (below y near_as = normal + below), en un único arreglo
+            for_quintiles = terciles_from_cumulative(for_quintiles)
 
             # Crear dataset con los datos
             final_ds = xr.Dataset(
@@ -888,7 +646,7 @@ class ReadEREGoutputSISSA(ReadStrategy):
                     'category': ['below', 'normal', 'above']
                 })
             # Identificar el año de pronósticos real_time
-            forecast_year = re.search(rf'(?:{"|".join(Mpro.months_abbr[1:])})(\d{{4}})', file_name).group(1)
+            forecast_year = file_info.year
             # Agregar init_time al dataset
             # "init_time" debe ser la fecha de inicio de la corrida, es decir, para un prono corrido en diciembre
             #      de 2020 para enero de 2021, init_time debe tener como año al 2020, no el 2021. CPT retorna como
@@ -896,11 +654,14 @@ class ReadEREGoutputSISSA(ReadStrategy):
             #      anterior, por lo que, en el caso del CPT, el año en los archivos de salida no pueden usarse
             #      sin pre-procesarlos.
             final_ds = final_ds.expand_dims(
-                init_time=pd.date_range(f"{forecast_year}-{forecast_month}-01", periods=1)).copy(deep=True)
+                init_time=pd.date_range(f"{forecast_year}-{forecast_month}-01", periods=1))
 
         # Agregar atributos que describan la variable
         final_ds[file_variable].attrs['units'] = '%'
 
+        # Filtrar puntos de grilla, en caso de que sea necesario (los archivos SISSA no se filtran por año)
+        final_ds = DataSubset.from_descriptor(desc_file).without_years().select(final_ds)
+
         # Return generated dataset
         return final_ds
 
@@ -909,37 +670,45 @@ class ReadEREGobservedData(ReadStrategy):
     """
     A Concrete Strategy (Desing Pattern -> Strategy)
     """
-    def read_data(self, file_name: str, desc_file: dict = None) -> Dataset:
-        # Identificar la variable en el nombre del archivo
-        file_variable = re.search(r'(prec|tref)', file_name).group(0)
-        file_variable = 'prcp' if file_variable == 'prec' else 't2m' if file_variable == 'tref' else None
+    file_name_parser = FileNameParser(EREG_VARIABLE_RULE, EREG_SEASON_RULE, FileNameRule(r'_(\d{4})_', year))
 
-        # Identificar trimestre objetivo
-        season_months = re.search(rf'({"|".join(Mpro.trimesters[1:])})', file_name).group(0)
+    def read_data(self, file_name: str, desc_file: dict = None) -> Dataset:
+        # Identificar la variable, el trimestre objetivo y el primer año en el nombre del archivo
+        file_info = self.file_name_info(file_name)
+        file_variable, first_year = file_info.variable, file_info.year
+        season_months = file_info.season
         first_month = Mpro.first_month_of_trimester(season_months)
 
-        # Extraer de la configuración el primer año en el archivo
-        first_year = int(re.search(r'_(\d{4})_', file_name).group(1))
+        # Definir el subconjunto de datos a leer (años y puntos de grilla)
+        subset = DataSubset.from_descriptor(desc_file)
 
         # Leer archivo de tipo npz
-        with np.load(file_name) as npz:
+        with NPZfile(file_name, members=['obs_3m', 'lats_obs', 'lons_obs']) as npz:
             # Identificar variable con datos
             # OBS: este archivo .npz tiene el valor determinístico -que se guarda en el netcdf-, el tercil al cual
             # corresponde ese valor y la categoría -ni el tercil ni la categoría se guardan en el netcdf final-.
             data_variable = [x for x in npz.files if x not in ['lats_obs', 'lons_obs']]
 
             # Identificar la cantidad de años en el archivo
-            n_years = len(npz['obs_3m'])
+            data_values, lats, lons = np.squeeze(npz['obs_3m']), npz['lats_obs'], npz['lons_obs']
+            n_years = len(data_values)
+            init_times = pd.date_range(f"{first_year}-{first_month}-01", periods=n_years, freq='12ME')
+
+            # Conservar solo los años y puntos de grilla a convertir (el año i del archivo es first_year + i)
+            if subset.filters_data:
+                years_idx, lats_idx, lons_idx = subset.grid_indexers(first_year + np.arange(n_years), lats, lons)
+                data_values = data_values[np.ix_(years_idx, lats_idx, lons_idx)]
+                init_times, lats, lons = init_times[years_idx], lats[lats_idx], lons[lons_idx]
 
             # Crear dataset con los datos
             final_ds = xr.Dataset(
                 data_vars={
-                    file_variable: (['init_time', 'latitude', 'longitude'], np.squeeze(npz['obs_3m'][:, :, :]))
+                    file_variable: (['init_time', 'latitude', 'longitude'], data_values)
                 },
                 coords={
-                    'init_time': pd.date_range(f"{first_year}-{first_month}-01", periods=n_years, freq='12ME'),
-                    'latitude': npz['lats_obs'],
-                    'longitude': npz['lons_obs']
+                    'init_time': init_times,
+                    'latitude': lats,
+                    'longitude': lons
                 })
 
         # Corregir valor total pronosticado (se debe multiplicar por la cantidad de días del mes o del trimestre)
@@ -948,22 +717,15 @@ class ReadEREGobservedData(ReadStrategy):
         # por 90 (30*3) y no por la cantidad exacta de días en el trimestre.
         # Ver: método select_months de la clase Observ en archivo observation.py del repo ereg_calibracion_combinacion
         if file_variable == 'prcp':
-            for year in final_ds.init_time.dt.year.values:
-                n_days = 90  # Mpro.n_days_in_trimester(season_months, calendar.isleap(int(year)))
-                final_ds.loc[{'init_time': str(year)}] = final_ds.sel(init_time=str(year)) * n_days
+            n_days = 90  # Mpro.n_days_in_trimester(season_months, Mpro.is_leap(final_ds.init_time.dt.year.values))
+            final_ds = scale_by_n_days(final_ds, n_days)
 
         # Agregar atributos que describan la variable
         unidad_de_medida = 'mm' if file_variable == 'prcp' else 'Celsius' if file_variable == 't2m' else None
         final_ds[file_variable].attrs['units'] = f'{unidad_de_medida}'
 
-        # Filtrar años, en caso de que sea necesario
-        if desc_file is not None and desc_file.get('filter_years') is not None:
-            min_year = desc_file.get('filter_years').get('min_year')
-            if min_year is not None:
-                final_ds = final_ds.where(final_ds.init_time.dt.year >= min_year, drop=True)
-            max_year = desc_file.get('filter_years').get('max_year')
-            if max_year is not None:
-                final_ds = final_ds.where(final_ds.init_time.dt.year <= max_year, drop=True)
+        # Filtrar años y puntos de grilla, en caso de que sea necesario
+        final_ds = subset.select(final_ds)
 
         # Return generated dataset
         return final_ds
@@ -973,33 +735,25 @@ class ReadCRCSASobs(ReadStrategy):
     """
     A Concrete Strategy (Desing Pattern -> Strategy)
     """
+    file_name_parser = FileNameParser(CPT_VARIABLE_RULE)
+
     def read_data(self, file_name: str, desc_file: dict = None) -> Dataset:
 
         # Identificar la variable en el nombre del archivo
-        file_variable = re.search(r'(prcp|t2m)', file_name).group(0)
+        file_variable = self.file_name_info(file_name).variable
 
-        # El archivo es un csv, así que solo se importa con pandas y listo
-        final_df = pd.read_csv(file_name, sep=';')
-        final_df = final_df.rename(columns={'time': 'init_time'})
+        # Leer el archivo csv por bloques y armar la grilla densa, descartando las filas fuera del subconjunto a
+        # convertir (años y puntos de grilla) durante la lectura (ver CRCSASfile)
+        with stage('parse'):
+            grid = CRCSASfile(file_name, file_variable).read_grid(DataSubset.from_descriptor(desc_file))
 
-        # Reindexar el dataframe
-        final_df = final_df.set_index(['init_time', 'latitude', 'longitude']).sort_index()
-
-        # Transformar dataframe a dataset
-        final_ds = final_df.to_xarray()
+        # Transformar la grilla a dataset
+        with stage('to_xarray'):
+            final_ds = grid.to_dataset()
 
         # Agregar atributos que describan la variable
         unidad_de_medida = 'mm' if file_variable == 'prcp' else 'Celsius' if file_variable == 't2m' else None
         final_ds[file_variable].attrs['units'] = f'{unidad_de_medida}'
 
-        # Filtrar años, en caso de que sea necesario
-        if desc_file is not None and desc_file.get('filter_years') is not None:
-            min_year = desc_file.get('filter_years').get('min_year')
-            if min_year is not None:
-                final_ds = final_ds.where(final_ds.init_time.dt.year >= min_year, drop=True)
-            max_year = desc_file.get('filter_years').get('max_year')
-            if max_year is not None:
-                final_ds = final_ds.where(final_ds.init_time.dt.year <= max_year, drop=True)
-
         # Return generated dataset
         return final_ds
@@ -1,16 +1,83 @@
+from __future__ import annotations
 
 import os
+import json
+import time
+import fcntl
+import signal
 import logging
+import threading
 
 from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
 from pathlib import Path
-from redis import Redis
-from redis.exceptions import RedisError
-from typing import Union
+from typing import IO, Iterator, Union
 
 from configuration import ConfigFile
 
 
+"""
+Duración (en segundos) de la reserva (lease) que indica que un script se está ejecutando. Mientras el script se
+ejecuta, la reserva se renueva cada LOCK_TTL_SECONDS / 3 segundos (ver ScriptControl), si el script termina de manera
+inesperada, la reserva expira y la siguiente ejecución puede iniciar
+"""
+LOCK_TTL_SECONDS = 60
+
+"""
+Formato de los mensajes del log (también se utiliza en los procesos del pool, ver file_conversion.py)
+"""
+LOG_FORMAT = '%(asctime)s -- %(levelname)4s -- %(message)s'
+LOG_DATE_FORMAT = '%Y/%m/%d %I:%M:%S %p'
+
+
+def host_name() -> str:
+    # OBS: equivale a socket.gethostname(), pero sin importar socket (solo se importa para conectarse a redis)
+    return os.uname().nodename
+
+
+@dataclass(frozen=True)
+class LockOwner(object):
+    """
+    Proceso que reservó la ejecución de un script (el token distingue ejecuciones con el mismo PID)
+    """
+    pid: int
+    host: str
+    token: str
+
+    @classmethod
+    def current(cls) -> LockOwner:
+        return cls(os.getpid(), host_name(), os.urandom(16).hex())
+
+    @classmethod
+    def from_value(cls, value: Union[str, None]) -> Union[LockOwner, None]:
+        if not value:
+            return None
+        # OBS: las versiones anteriores solo guardaban el PID (se asume que el proceso se ejecutaba en este host)
+        if value.strip().isdigit():
+            return cls(int(value), host_name(), '')
+        try:
+            owner = json.loads(value)
+            return cls(int(owner.get('pid')), str(owner.get('host')), str(owner.get('token')))
+        except (ValueError, TypeError, AttributeError):
+            return None
+
+    def value(self) -> str:
+        return json.dumps(asdict(self), sort_keys=True)
+
+    def is_alive(self) -> bool:
+        # Solo se puede verificar si existe un proceso de este host, en otro caso se confía en la reserva (lease)
+        if self.host != host_name():
+            return True
+        try:
+            os.kill(self.pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+
 class PidDB(ABC):
 
     @classmethod
@@ -19,15 +86,23 @@ class PidDB(ABC):
         pass
 
     @abstractmethod
-    def set(self, script_name: str, value: Union[str, int, float]):
+    def acquire(self, script_name: str, owner: LockOwner, ttl: float) -> bool:
+        # Reservar la ejecución del script durante ttl segundos (si no está reservada, o si su dueño ya no existe)
         pass
 
     @abstractmethod
-    def get(self, script_name: str) -> Union[str, int, float, None]:
+    def renew(self, script_name: str, owner: LockOwner, ttl: float) -> bool:
+        # Extender la reserva (solo si owner sigue siendo el dueño de la reserva)
         pass
 
     @abstractmethod
-    def delete(self, script_name: str):
+    def release(self, script_name: str, owner: LockOwner, remove: bool = False):
+        # Liberar la reserva (solo si owner sigue siendo el dueño de la reserva). Con remove, también se elimina lo
+        # que la almacena (solo para las reservas de una única instancia, que ningún otro proceso utiliza)
+        pass
+
+    @abstractmethod
+    def get(self, script_name: str) -> Union[LockOwner, None]:
         pass
 
 
@@ -41,56 +116,156 @@ class FileDB(PidDB):
     def __file_path(self, file_name: str) -> Path:
         return Path(self.folder, f'{file_name}.pid')
 
-    def set(self, script_name: str, value: Union[str, int, float]):
-        file_path: Path = self.__file_path(script_name)
-        with open(file_path, 'w') as f:
-            f.write(f'{value}')
+    @contextmanager
+    def __locked_file(self, script_name: str) -> Iterator[IO[str]]:
+        # Las operaciones sobre la reserva se realizan con el archivo bloqueado (flock), así dos procesos no pueden
+        # reservar la ejecución a la vez. OBS: el archivo no se elimina al liberar la reserva (solo se vacía), si se
+        # eliminara, otro proceso podría estar bloqueando un archivo que ya no existe. Solo se eliminan los archivos
+        # de las reservas de cada instancia (ver ScriptControl.lock_name), que ningún otro proceso bloquea.
+        with open(self.__file_path(script_name), 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                yield f
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
 
-    def get(self, script_name: str) -> Union[str, int, float, None]:
-        file_path: Path = self.__file_path(script_name)
-        if file_path.is_file():
-            return file_path.read_text()
-        return None
+    @staticmethod
+    def __read_lease(f: IO[str]) -> tuple[Union[LockOwner, None], float]:
+        # Retorna el dueño de la reserva y el momento en que la reserva expira
+        content = f.read()
+        try:
+            lease = json.loads(content)
+            return LockOwner.from_value(json.dumps(lease.get('owner'))), float(lease.get('expires'))
+        except (ValueError, TypeError, AttributeError):
+            # OBS: las versiones anteriores solo guardaban el PID (sin reserva, la ejecución nunca expira)
+            return LockOwner.from_value(content), float('inf')
 
-    def delete(self, script_name: str):
-        file_path: Path = self.__file_path(script_name)
-        if file_path.is_file():
-            file_path.unlink()
+    @staticmethod
+    def __write_lease(f: IO[str], owner: Union[LockOwner, None], ttl: float = 0) -> None:
+        f.seek(0)
+        f.truncate()
+        if owner is not None:
+            f.write(json.dumps({'owner': asdict(owner), 'expires': time.time() + ttl}, sort_keys=True))
+        f.flush()
+
+    def acquire(self, script_name: str, owner: LockOwner, ttl: float) -> bool:
+        with self.__locked_file(script_name) as f:
+            holder, expires = self.__read_lease(f)
+            if holder is not None and holder != owner and expires > time.time() and holder.is_alive():
+                return False
+            self.__write_lease(f, owner, ttl)
+            return True
+
+    def renew(self, script_name: str, owner: LockOwner, ttl: float) -> bool:
+        with self.__locked_file(script_name) as f:
+            holder, _ = self.__read_lease(f)
+            if holder != owner:
+                return False
+            self.__write_lease(f, owner, ttl)
+            return True
+
+    def release(self, script_name: str, owner: LockOwner, remove: bool = False):
+        if not self.__file_path(script_name).is_file():
+            return
+        with self.__locked_file(script_name) as f:
+            holder, _ = self.__read_lease(f)
+            if holder == owner:
+                self.__write_lease(f, None)
+                if remove:
+                    self.__file_path(script_name).unlink(missing_ok=True)
+
+    def get(self, script_name: str) -> Union[LockOwner, None]:
+        if not self.__file_path(script_name).is_file():
+            return None
+        with self.__locked_file(script_name) as f:
+            holder, expires = self.__read_lease(f)
+        return holder if expires > time.time() else None
 
 
 class RedisDB(PidDB):
     host: str = os.getenv('REDIS_HOST', 'localhost')
     port: int = int(os.getenv('REDIS_PORT', 6379))
 
-    @staticmethod
-    def __conn_is_valid(conn: Redis) -> bool:
-        try:
-            conn.ping()
-        except RedisError:
-            return False
-        else:
-            return True
+    # Segundos máximos de espera al verificar si el servidor Redis está escuchando
+    probe_timeout: float = 0.2
 
-    @classmethod
-    def available(cls) -> bool:
-        r = Redis(host=cls.host, port=cls.port, decode_responses=True)
-        return cls.__conn_is_valid(r)
+    # Pool de conexiones compartido por todas las operaciones (y por la cola de trabajos, ver work_queue.py)
+    __pool = None
 
-    def set(self, script_name: str, value: Union[str, int, float]):
-        r = Redis(host=self.host, port=self.port, decode_responses=True)
-        if self.__conn_is_valid(r):
-            r.set(script_name, value)
+    @classmethod
+    def connection(cls):
+        # OBS: redis se importa recién aquí (su importación demora más que una ejecución sin archivos a convertir)
+        from redis import Redis, ConnectionPool
+        if cls.__pool is None:
+            cls.__pool = ConnectionPool(host=cls.host, port=cls.port, decode_responses=True)
+        return Redis(connection_pool=cls.__pool)
 
-    def get(self, script_name: str) -> Union[str, int, float, None]:
-        r = Redis(host=self.host, port=self.port, decode_responses=True)
-        if self.__conn_is_valid(r):
-            return r.get(script_name)
-        return None
+    @classmethod
+    def available(cls) -> bool:
+        # Si nadie escucha en el puerto, no se importa redis ni se espera a que el cliente agote sus reintentos
+        import socket
+        try:
+            socket.create_connection((cls.host, cls.port), timeout=cls.probe_timeout).close()
+        except OSError:
+            return False
+        from redis.exceptions import RedisError
+        try:
+            return cls.connection().ping()
+        except RedisError:
+            return False
 
-    def delete(self, script_name: str):
-        r = Redis(host=self.host, port=self.port, decode_responses=True)
-        if self.__conn_is_valid(r):
-            r.delete(script_name)
+    def __replace_if_owner(self, script_name: str, expected: str, ttl: float = None) -> bool:
+        # Extender (ttl) o eliminar (sin ttl) la reserva, solo si su valor sigue siendo el esperado. Se usa una
+        # transacción (WATCH/MULTI/EXEC), así no se modifica una reserva tomada por otro proceso mientras tanto.
+        from redis.exceptions import WatchError
+        with self.connection().pipeline() as pipe:
+            try:
+                pipe.watch(script_name)
+                if pipe.get(script_name) != expected:
+                    pipe.unwatch()
+                    return False
+                pipe.multi()
+                if ttl is not None:
+                    pipe.pexpire(script_name, int(ttl * 1000))
+                else:
+                    pipe.delete(script_name)
+                pipe.execute()
+                return True
+            except WatchError:
+                return False
+
+    def acquire(self, script_name: str, owner: LockOwner, ttl: float) -> bool:
+        # Se realizan como máximo dos intentos: el segundo, solo si el dueño anterior de la reserva ya no existe
+        for _ in range(2):
+            # Reservar y obtener el dueño de la reserva en un único viaje al servidor (pipeline)
+            with self.connection().pipeline(transaction=False) as pipe:
+                pipe.set(script_name, owner.value(), nx=True, px=int(ttl * 1000))
+                pipe.get(script_name)
+                acquired, holder_value = pipe.execute()
+            holder = LockOwner.from_value(holder_value)
+            if acquired or holder == owner:
+                return True
+            if holder is not None and holder.is_alive():
+                return False
+            self.__replace_if_owner(script_name, holder_value)
+        return False
+
+    def renew(self, script_name: str, owner: LockOwner, ttl: float) -> bool:
+        return self.__replace_if_owner(script_name, owner.value(), ttl)
+
+    def release(self, script_name: str, owner: LockOwner, remove: bool = False):
+        # OBS: la clave de la reserva siempre se elimina al liberarla
+        self.__replace_if_owner(script_name, owner.value())
+
+    def get(self, script_name: str) -> Union[LockOwner, None]:
+        return LockOwner.from_value(self.connection().get(script_name))
+
+
+def stop_on_sigterm(signum, frame):
+    # Los procesos que no terminan por sí solos (--watch y --worker) se detienen con SIGTERM como con Ctrl+C
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)  # las señales siguientes no interrumpen la finalización
+    raise KeyboardInterrupt()
 
 
 class ScriptControl(object):
@@ -104,6 +279,10 @@ class ScriptControl(object):
         self.pid: int = -1  # PID -1 is a temporal invalid PID
         self.pid_db: PidDB = RedisDB() if RedisDB.available() else FileDB()
         self.single_instance: bool = single_instance
+        self.lock_owner: Union[LockOwner, None] = None
+        self.lock_ttl: float = LOCK_TTL_SECONDS
+        self.__heartbeat: Union[threading.Thread, None] = None
+        self.__heartbeat_stop: threading.Event = threading.Event()
         # Setup logger
         self.setup_logger()
 
@@ -120,32 +299,60 @@ class ScriptControl(object):
         # Valor por defecto: INFO
         return 'INFO'
 
+    @property
+    def lock_name(self) -> str:
+        # Si pueden ejecutarse varias instancias a la vez, cada instancia tiene su propia reserva
+        if self.single_instance or self.lock_owner is None:
+            return self.script_name
+        return f'{self.script_name}:{self.lock_owner.host}:{self.lock_owner.pid}'
+
     def setup_logger(self):
         log_level_int = logging.getLevelName(self.log_level)
-        logging.basicConfig(format='%(asctime)s -- %(levelname)4s -- %(message)s',
-                            datefmt='%Y/%m/%d %I:%M:%S %p', level=log_level_int)
+        logging.basicConfig(format=LOG_FORMAT, datefmt=LOG_DATE_FORMAT, level=log_level_int)
 
     def start_script(self):
-        # Abort if an instance is already running (when needed)
-        if self.single_instance:
-            self.assert_not_running()
-        # Get and save PID
+        # Get PID
         self.pid = os.getpid()
-        self.pid_db.set(self.script_name, self.pid)
+        self.lock_owner = LockOwner.current()
+        # Abort if an instance is already running (when needed)
+        self.acquire_lock()
         # Report start
         logging.info(f'Starting script {self.script_name} (w/PID: {self.pid})')
 
-    def assert_not_running(self):
-        # Verify if script is running, by getting its PID
-        previously_saved_pid = self.pid_db.get(self.script_name)
-        # Stop script execution if there is another instance running
-        if previously_saved_pid is not None:
+    def acquire_lock(self):
+        # Reservar la ejecución del script (si hay otra instancia en ejecución, la reserva no puede ser tomada)
+        if not self.pid_db.acquire(self.lock_name, self.lock_owner, self.lock_ttl):
+            running = self.pid_db.get(self.lock_name)
             logging.error(f"Script {self.script_name} was expected not to be running "
-                          f"but is currently running w/PID {previously_saved_pid}")
+                          f"but is currently running w/PID {running.pid if running else '?'} "
+                          f"(host: {running.host if running else '?'})")
             raise SystemExit(1)
+        # Renovar la reserva periódicamente, mientras el script se esté ejecutando
+        # OBS: el hilo es daemon, si el script termina de manera inesperada, la reserva no se renueva y expira
+        self.__heartbeat_stop.clear()
+        self.__heartbeat = threading.Thread(target=self.__renew_lock, name='lock-heartbeat', daemon=True)
+        self.__heartbeat.start()
+
+    def __renew_lock(self):
+        while not self.__heartbeat_stop.wait(self.lock_ttl / 3):
+            try:
+                renewed = self.pid_db.renew(self.lock_name, self.lock_owner, self.lock_ttl)
+            except Exception as e:
+                logging.warning(f'The execution lock of script {self.script_name} could not be renewed ({e})')
+                continue
+            if not renewed:
+                logging.error(f'Script {self.script_name} lost its execution lock (another instance may start)')
 
     def end_script_execution(self):
-        # Remove saved PID
-        self.pid_db.delete(self.script_name)
+        # Detener la renovación de la reserva y liberarla
+        self.__heartbeat_stop.set()
+        if self.__heartbeat is not None:
+            self.__heartbeat.join()
+        if self.lock_owner is not None:
+            try:
+                # OBS: las reservas de cada instancia (varias instancias a la vez) no vuelven a utilizarse
+                self.pid_db.release(self.lock_name, self.lock_owner, remove=not self.single_instance)
+            except Exception as e:
+                logging.warning(f'The execution lock of script {self.script_name} could not be released ({e})')
         # Report execution end
         logging.info(f'Ending script {self.script_name} (w/PID: {self.pid})')
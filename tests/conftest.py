@@ -0,0 +1,14 @@
+import os
+import sys
+
+import pytest
+
+
+# Los módulos del proyecto están en la carpeta raíz, y leen config.yaml desde la carpeta de trabajo (como main.py)
+PROJECT_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_FOLDER)
+
+
+@pytest.fixture(autouse=True)
+def project_folder(monkeypatch):
+    monkeypatch.chdir(PROJECT_FOLDER)
@@ -0,0 +1,68 @@
+from build_manifest import BuildManifest
+from configuration import ConfigFile
+from file_reader import FileReader, ReadStrategyRegistry, READ_STRATEGIES_MODULE
+
+from pathlib import Path
+
+import pytest
+
+
+@pytest.fixture
+def config():
+    # Restaurar la configuración modificada por cada prueba
+    config = ConfigFile.Instance()
+    previous = {key: config.get(key) for key in ['encoding', 'adopt_outputs']}
+    yield config
+    for key, value in previous.items():
+        config.set(key, value)
+
+
+def unrecorded_output(tmp_path: Path) -> tuple[BuildManifest, FileReader, Path, dict]:
+    # Descriptor con una entrada cuyo archivo de salida existe, pero no está registrado en el manifiesto
+    (tmp_path / 'input.txt').write_text('input data')
+    (tmp_path / 'output.nc').write_bytes(b'output data')
+    desc_file = tmp_path / 'test_descriptors.yaml'
+    desc_file.write_text('files: []\n')
+    entry = {'name': 'input.txt', 'path': tmp_path.as_posix(), 'type': 'cpt_det_output',
+             'output_file': {'name': 'output.nc', 'path': tmp_path.as_posix()}}
+    manifest = BuildManifest._decorated(tmp_path / 'build_manifest.json')
+    reader = FileReader(ReadStrategyRegistry.Instance().strategy(entry['type']), desc_file, manifest)
+    return manifest, reader, desc_file, entry
+
+
+def converted_descriptor(tmp_path: Path) -> tuple[BuildManifest, FileReader, Path, dict]:
+    # Descriptor con una entrada cuyo archivo de salida ya fue generado y registrado en el manifiesto
+    manifest, reader, desc_file, entry = unrecorded_output(tmp_path)
+    record = reader.manifest_record(entry)
+    manifest.update_output(record)
+    manifest.update_descriptor(desc_file, [manifest.record_key(record)])
+    return manifest, reader, desc_file, entry
+
+
+def test_unchanged_descriptor_is_skipped(tmp_path, config):
+    manifest, reader, desc_file, entry = converted_descriptor(tmp_path)
+    assert manifest.descriptor_is_up_to_date(desc_file, READ_STRATEGIES_MODULE)
+    assert not reader.output_file_must_be_created(entry)
+
+
+def test_config_encoding_change_rebuilds_outputs(tmp_path, config):
+    manifest, reader, desc_file, entry = converted_descriptor(tmp_path)
+    config.set('encoding', {'zlib': True, 'complevel': 9, 'dtype': 'float32'})
+    assert not manifest.descriptor_is_up_to_date(desc_file, READ_STRATEGIES_MODULE)
+    assert reader.output_file_must_be_created(entry)
+
+
+def test_unrecorded_outputs_are_rebuilt(tmp_path, config):
+    _, reader, _, entry = unrecorded_output(tmp_path)
+    config.set('adopt_outputs', False)
+    assert reader.output_file_must_be_created(entry)
+
+
+def test_adopted_outputs_are_recorded_without_rebuilding(tmp_path, config):
+    manifest, reader, _, entry = unrecorded_output(tmp_path)
+    config.set('adopt_outputs', True)
+    assert not reader.output_file_must_be_created(entry)
+    # Una vez registrado, el archivo de salida se regenera cuando cambia su archivo de entrada
+    manifest.update_output(reader.manifest_record(entry))
+    (tmp_path / 'input.txt').write_text('new input data')
+    assert reader.output_file_must_be_created(entry)
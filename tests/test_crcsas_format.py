@@ -0,0 +1,46 @@
+from crcsas_format import CRCSASfile
+
+import numpy as np
+import pytest
+import xarray as xr
+
+
+CSV_CONTENT = '''time;latitude;longitude;prcp
+2001-02-01;-40.0;-66.5;9.5
+2001-01-01;-40.0;-66.5;1.25
+2001-01-01;-16.0;-70.0;45.0
+2002-01-01;-16.0;-66.5;
+;-16.0;-66.5;3.0
+2002-02-01;;-70.0;4.0
+2002-02-01;-40.0;;5.0
+2002-02-01;-40.0;-70.0;6.0
+'''
+
+
+@pytest.fixture
+def csv_file(tmp_path):
+    file_name = tmp_path / 'crcsas_prcp_monthly.csv'
+    file_name.write_text(CSV_CONTENT)
+    return file_name.as_posix()
+
+
+def read_dataset(file_name: str, monkeypatch, pyarrow: bool) -> xr.Dataset:
+    monkeypatch.setattr(CRCSASfile, 'pyarrow_available', staticmethod(lambda: pyarrow))
+    return CRCSASfile(file_name, 'prcp').read_grid().to_dataset()
+
+
+def test_pandas_reader_drops_rows_without_coordinates(csv_file, monkeypatch):
+    ds = read_dataset(csv_file, monkeypatch, pyarrow=False)
+    np.testing.assert_array_equal(
+        ds['init_time'].values, np.array(['2001-01-01', '2001-02-01', '2002-01-01', '2002-02-01'], 'datetime64[ns]'))
+    assert ds['latitude'].values.tolist() == [-40.0, -16.0]
+    assert ds['longitude'].values.tolist() == [-70.0, -66.5]
+    assert ds['prcp'].dtype == np.float32
+    assert int(ds['prcp'].notnull().sum()) == 4
+    assert float(ds['prcp'].sel(init_time='2002-02-01', latitude=-40.0, longitude=-70.0)) == 6.0
+
+
+def test_pyarrow_and_pandas_readers_build_the_same_grid(csv_file, monkeypatch):
+    pytest.importorskip('pyarrow')
+    xr.testing.assert_identical(
+        read_dataset(csv_file, monkeypatch, pyarrow=True), read_dataset(csv_file, monkeypatch, pyarrow=False))
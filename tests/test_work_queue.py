@@ -0,0 +1,99 @@
+from work_queue import RedisWorkQueue, lease_renewal
+
+import json
+import time
+
+import pytest
+
+fakeredis = pytest.importorskip('fakeredis')
+
+
+@pytest.fixture
+def work_queue() -> RedisWorkQueue:
+    # Cola en memoria (fakeredis), con un plazo de reserva corto para probar la expiración de las reservas
+    return RedisWorkQueue(connection=fakeredis.FakeRedis(decode_responses=True), name='test-queue',
+                          visibility_timeout=0.2, max_attempts=2)
+
+
+def test_push_skips_queued_jobs(work_queue):
+    assert work_queue.push([{'file': 'a'}, {'file': 'b'}]) == 2
+    assert work_queue.push([{'file': 'a'}, {'file': 'c'}]) == 1
+    work_queue.pull()
+    assert work_queue.push([{'file': 'a'}, {'file': 'b'}]) == 0
+    assert work_queue.stats() == {'pending': 2, 'processing': 1, 'failed': 0, 'results': 0}
+
+
+def test_pull_returns_oldest_job(work_queue):
+    assert work_queue.pull() is None
+    work_queue.push([{'file': 'a'}])
+    work_queue.push([{'file': 'b'}])
+    job = work_queue.pull()
+    assert job.payload == {'file': 'a'}
+    assert job.job_id == RedisWorkQueue.job_id({'file': 'a'})
+    assert work_queue.pull().payload == {'file': 'b'}
+    assert work_queue.pull() is None
+
+
+def test_ack_stores_result(work_queue):
+    work_queue.push([{'file': 'a'}])
+    job = work_queue.pull()
+    assert work_queue.ack(job, {'output': 'a.nc'}) is True
+    assert work_queue.stats() == {'pending': 0, 'processing': 0, 'failed': 0, 'results': 1}
+    assert work_queue.pop_results() == [{'output': 'a.nc'}]
+    assert work_queue.pop_results() == []
+
+
+def test_fail_registers_error(work_queue):
+    work_queue.push([{'file': 'a'}])
+    job = work_queue.pull()
+    assert work_queue.fail(job, 'missing input file') is True
+    assert work_queue.stats() == {'pending': 0, 'processing': 0, 'failed': 1, 'results': 0}
+    failed = json.loads(work_queue.connection.lindex(work_queue.key('failed'), 0))
+    assert failed['id'] == job.job_id
+    assert failed['error'] == 'missing input file'
+
+
+def test_requeue_expired(work_queue):
+    work_queue.push([{'file': 'a'}])
+    job = work_queue.pull()
+    assert work_queue.requeue_expired() == 0
+    time.sleep(0.3)
+    assert work_queue.requeue_expired() == 1
+    assert work_queue.stats() == {'pending': 1, 'processing': 0, 'failed': 0, 'results': 0}
+    # Otro worker obtuvo el trabajo, la reserva expirada ya no permite finalizarlo
+    retried = work_queue.pull()
+    assert retried.job_id == job.job_id
+    assert work_queue.ack(job) is False
+    assert work_queue.ack(retried) is True
+
+
+def test_max_attempts(work_queue):
+    work_queue.push([{'file': 'a'}])
+    for _ in range(work_queue.max_attempts):
+        assert work_queue.pull() is not None
+        time.sleep(0.3)
+    assert work_queue.requeue_expired() == 1
+    assert work_queue.pull() is None
+    assert work_queue.stats() == {'pending': 0, 'processing': 0, 'failed': 1, 'results': 0}
+
+
+def test_extend(work_queue):
+    work_queue.push([{'file': 'a'}])
+    job = work_queue.pull()
+    deadline = job.deadline
+    assert work_queue.extend(job) is True
+    assert job.deadline > deadline
+    # Una reserva expirada y tomada por otro worker no puede ser extendida
+    time.sleep(0.3)
+    retried = work_queue.pull()
+    assert work_queue.extend(job) is False
+    assert work_queue.ack(retried) is True
+
+
+def test_lease_renewal(work_queue):
+    work_queue.push([{'file': 'a'}])
+    job = work_queue.pull()
+    with lease_renewal(work_queue, job):
+        time.sleep(0.5)
+        assert work_queue.requeue_expired() == 0
+    assert work_queue.ack(job) is True
@@ -0,0 +1,64 @@
+from errors import ZarrStoreError
+from netcdf_encoding import NetCDFEncoding
+from zarr_output import write_zarr
+
+import numpy as np
+import pytest
+import xarray as xr
+
+
+pytest.importorskip('zarr')
+
+
+def forecast_dataset(init_times: list[str], first_value: float) -> xr.Dataset:
+    # Dataset con una variable (init_time x latitude x longitude) con valores consecutivos desde first_value
+    shape = (len(init_times), 2, 3)
+    values = (first_value + np.arange(np.prod(shape))).reshape(shape).astype(np.float32)
+    return xr.Dataset(
+        data_vars={'prcp': (['init_time', 'latitude', 'longitude'], values)},
+        coords={'init_time': np.array(init_times, dtype='datetime64[ns]'),
+                'latitude': [-40.0, -16.0], 'longitude': [-70.0, -66.5, -63.0]})
+
+
+def read_store(store: str) -> xr.Dataset:
+    with xr.open_dataset(store, engine='zarr', chunks=None) as ds:
+        return ds.load()
+
+
+def test_append_and_region_writes_round_trip(tmp_path):
+    store = (tmp_path / 'prcp.zarr').as_posix()
+    first = forecast_dataset(['2001-01-01', '2002-01-01'], 0)
+    second = forecast_dataset(['2002-01-01', '2003-01-01'], 100)
+    region = forecast_dataset(['2001-01-01'], 200)
+
+    # append crea el almacén, luego sobrescribe 2002 y agrega 2003 al final; region sobrescribe 2001
+    write_zarr(first, store, NetCDFEncoding(), 'append')
+    write_zarr(second, store, NetCDFEncoding(), 'append')
+    write_zarr(region, store, NetCDFEncoding(), 'region')
+
+    stored = read_store(store)
+    assert stored['prcp'].dtype == np.float32
+    xr.testing.assert_equal(stored, xr.concat([region, second], dim='init_time'))
+
+
+def test_write_replaces_the_store(tmp_path):
+    store = (tmp_path / 'prcp.zarr').as_posix()
+    write_zarr(forecast_dataset(['2001-01-01', '2002-01-01'], 0), store, NetCDFEncoding(), 'write')
+    expected = forecast_dataset(['2003-01-01'], 100)
+    write_zarr(expected, store, NetCDFEncoding(), 'write')
+    xr.testing.assert_equal(read_store(store), expected)
+
+
+def test_region_rejects_init_times_not_in_the_store(tmp_path):
+    store = (tmp_path / 'prcp.zarr').as_posix()
+    write_zarr(forecast_dataset(['2001-01-01'], 0), store, NetCDFEncoding(), 'append')
+    with pytest.raises(ZarrStoreError):
+        write_zarr(forecast_dataset(['2002-01-01'], 100), store, NetCDFEncoding(), 'region')
+
+
+def test_append_rejects_different_coordinates(tmp_path):
+    store = (tmp_path / 'prcp.zarr').as_posix()
+    write_zarr(forecast_dataset(['2001-01-01'], 0), store, NetCDFEncoding(), 'append')
+    other_grid = forecast_dataset(['2002-01-01'], 100).assign_coords(latitude=[-41.0, -16.0])
+    with pytest.raises(ZarrStoreError):
+        write_zarr(other_grid, store, NetCDFEncoding(), 'append')
@@ -0,0 +1,88 @@
+
+from instrumentation import staged
+
+from xarray import Dataset
+from typing import Union
+
+import numpy as np
+import xarray as xr
+
+
+def month_start_dates(years: np.ndarray, month: int) -> np.ndarray:
+    # Construir las fechas del primer día del mes indicado, para todos los años a la vez
+    years_dates = (np.asarray(years) - 1970).astype('datetime64[Y]')
+    return (years_dates.astype('datetime64[M]') + np.timedelta64(month - 1, 'M')).astype('datetime64[ns]')
+
+
+def replace_years(dates: np.ndarray, years: np.ndarray) -> np.ndarray:
+    # Reemplazar el año de cada fecha, manteniendo el mes, el día y la hora (equivale a date.replace(year=...))
+    dates = np.asarray(dates, dtype='datetime64[ns]')
+    months = dates.astype('datetime64[M]') - dates.astype('datetime64[Y]').astype('datetime64[M]')
+    remainder = dates - dates.astype('datetime64[M]').astype('datetime64[ns]')
+    years_dates = (np.asarray(years) - 1970).astype('datetime64[Y]')
+    return (years_dates.astype('datetime64[M]') + months).astype('datetime64[ns]') + remainder
+
+
+def swapped_years_order(init_times: np.ndarray, last_hindcast_year: int,
+                        first_forecast_year: int) -> Union[tuple[np.ndarray, np.ndarray, np.ndarray], None]:
+    # Solamente es necesario renombrar los años cuando el primer año de pronóstico (first_forecast_year)
+    # es al menos dos años posterior al último año de hindcast (last_hindcast_year).
+    if first_forecast_year - last_hindcast_year < 2:
+        return None
+
+    # Identificar los años posteriores al último año de hindcast, todos estos años deben ser renombrados
+    current_times = np.asarray(init_times, dtype='datetime64[ns]')
+    years_to_swap = np.flatnonzero(current_times.astype('datetime64[Y]').astype(int) + 1970 > last_hindcast_year)
+    if years_to_swap.size == 0:
+        return None
+
+    # El año en la posición "n" de years_to_swap (en orden cronológico) se renombra como first_forecast_year+n
+    years_to_swap = years_to_swap[np.argsort(current_times[years_to_swap], kind='stable')]
+    swapped_times = replace_years(current_times[years_to_swap], first_forecast_year + np.arange(years_to_swap.size))
+
+    # Los años renombrados se agregan al final del eje init_time y luego el eje se ordena
+    all_times = np.concatenate([current_times, swapped_times])
+    source_idx = np.concatenate([np.arange(current_times.size), years_to_swap])
+    times_order = np.argsort(all_times, kind='stable')
+
+    # Los años que ya fueron renombrados se mantienen en el eje (el año original), pero sin datos
+    already_swapped = np.isin(np.arange(all_times.size), years_to_swap)
+    already_swapped = np.flatnonzero(already_swapped[times_order])
+
+    # Retornar el nuevo eje init_time, la posición (en el eje original) de los datos de cada elemento del nuevo
+    # eje, y las posiciones (en el nuevo eje) que deben quedar sin datos
+    return all_times[times_order], source_idx[times_order], already_swapped
+
+
+@staged('transform')
+def swap_years(ds: Dataset, last_hindcast_year: int, first_forecast_year: int) -> Dataset:
+    # Calcular el nuevo eje init_time (ver swapped_years_order), si no hay años a renombrar no se modifica nada
+    swapped_order = swapped_years_order(ds['init_time'].values, last_hindcast_year, first_forecast_year)
+    if swapped_order is None:
+        return ds
+    new_times, source_idx, already_swapped = swapped_order
+
+    # Los años renombrados se agregan al eje init_time con una sola selección (isel), por lo que el dataset se
+    # copia una única vez.
+    ds = ds.isel(init_time=source_idx)
+    ds['init_time'] = new_times
+
+    # Se asigna NA a los años que ya fueron renombrados (el año original se mantiene, pero sin datos)
+    for var in ds.data_vars:
+        ds[var][{'init_time': already_swapped}] = np.nan
+
+    # Retornar el dataset con los años renombrados
+    return ds
+
+
+@staged('transform')
+def scale_by_n_days(ds: Dataset, n_days: Union[int, np.ndarray]) -> Dataset:
+    # Multiplicar todos los datos por la cantidad de días correspondiente a cada init_time (un valor por init_time,
+    # o un único valor para todos). La multiplicación se hace una sola vez, mediante broadcasting sobre init_time.
+    # OBS: se reemplaza cada variable (en lugar de usar ds * n_days) para no alterar el orden de las variables. La
+    # cantidad de días se convierte al tipo de cada variable, así el resultado conserva su tipo (ej: float32)
+    n_days = xr.DataArray(np.broadcast_to(n_days, ds.sizes['init_time']), dims=['init_time'])
+    ds = ds.copy(deep=False)
+    for var in ds.data_vars:
+        ds[var] = ds[var] * n_days.astype(ds[var].dtype)
+    return ds
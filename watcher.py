@@ -0,0 +1,346 @@
+
+from __future__ import annotations
+
+from configuration import ConfigFile, DescriptorFile, DescriptorsCache, DescFilesSelector
+from errors import DescriptorError
+from build_manifest import BuildManifest
+from file_reader import FileReader, READ_STRATEGIES_MODULE
+from file_conversion import define_read_strategy, convert_file, update_cubes
+from script import stop_on_sigterm
+
+from abc import ABC, abstractmethod
+from datetime import datetime
+from pathlib import Path
+from typing import Union
+
+import os
+import sys
+import yaml
+import signal
+import argparse
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import logging
+
+
+"""
+Eventos de inotify considerados (creación, escritura finalizada, movimiento, eliminación y cambio de atributos)
+"""
+IN_ATTRIB, IN_CLOSE_WRITE, IN_MOVED_FROM, IN_MOVED_TO = 0x00000004, 0x00000008, 0x00000040, 0x00000080
+IN_CREATE, IN_DELETE, IN_DELETE_SELF, IN_MOVE_SELF = 0x00000100, 0x00000200, 0x00000400, 0x00000800
+IN_NONBLOCK, IN_CLOEXEC = 0o4000, 0o2000000
+INOTIFY_MASK = IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | \
+    IN_DELETE_SELF | IN_MOVE_SELF
+
+"""
+Intervalo (en segundos) entre las revisiones de las carpetas, cuando no es posible usar inotify
+"""
+POLLING_STEP = 2.0
+
+"""
+Valores por defecto del modo watch (ver sección "watch" en config.yaml): segundos que un archivo debe permanecer sin
+cambios para ser procesado y segundos máximos entre revisiones de los descriptores (aunque no se detecten cambios)
+"""
+WATCH_DEBOUNCE_SECONDS = 30
+WATCH_POLL_INTERVAL_SECONDS = 300
+
+
+class FolderWatcher(ABC):
+    """
+    Observa un conjunto de carpetas (no recursivamente) y espera hasta que alguno de sus archivos cambie
+    """
+
+    @classmethod
+    @abstractmethod
+    def available(cls) -> bool:
+        pass
+
+    @abstractmethod
+    def watch(self, folders: set[Path]) -> None:
+        pass
+
+    @abstractmethod
+    def wait(self, timeout: float) -> set[Path]:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyWatcher(FolderWatcher):
+    """
+    Observa las carpetas mediante inotify (solo Linux): el proceso permanece bloqueado hasta que ocurre un evento
+    """
+    libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True) if sys.platform.startswith('linux') else None
+
+    def __init__(self):
+        self._fd: int = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+        self._watches: dict[Path, int] = {}  # clave: carpeta, valor: watch descriptor
+
+    @classmethod
+    def available(cls) -> bool:
+        if cls.libc is None or not hasattr(cls.libc, 'inotify_init1'):
+            return False
+        fd = cls.libc.inotify_init1(IN_CLOEXEC)
+        if fd < 0:
+            return False
+        os.close(fd)
+        return True
+
+    def watch(self, folders: set[Path]) -> None:
+        # Dejar de observar las carpetas que ya no son necesarias y observar las nuevas (si existen)
+        for folder in [f for f in self._watches if f not in folders]:
+            self.libc.inotify_rm_watch(self._fd, self._watches.pop(folder))
+        for folder in [f for f in folders if f not in self._watches and f.is_dir()]:
+            wd = self.libc.inotify_add_watch(self._fd, os.fsencode(folder), INOTIFY_MASK)
+            if wd >= 0:
+                self._watches[folder] = wd
+            else:
+                logging.warning(f'Folder {folder} could not be watched ({os.strerror(ctypes.get_errno())})')
+
+    def wait(self, timeout: float) -> set[Path]:
+        # Esperar el primer evento (o hasta que se cumpla el timeout) y leer todos los eventos disponibles
+        ready, _, _ = select.select([self._fd], [], [], max(timeout, 0))
+        if not ready:
+            return set()
+        folders = {wd: folder for folder, wd in self._watches.items()}
+        changed: set[Path] = set()
+        while True:
+            try:
+                buffer = os.read(self._fd, 64 * 1024)
+            except OSError as e:
+                if e.errno in [errno.EAGAIN, errno.EWOULDBLOCK]:
+                    break
+                raise
+            offset = 0
+            while offset < len(buffer):
+                wd, mask, _, name_length = struct.unpack_from('iIII', buffer, offset)
+                name = buffer[offset + 16: offset + 16 + name_length].rstrip(b'\0')
+                offset += 16 + name_length
+                if wd in folders:
+                    changed.add(Path(folders[wd], os.fsdecode(name)) if name else folders[wd])
+                # Las carpetas eliminadas o movidas dejan de ser observadas (se vuelven a agregar con watch)
+                if mask & (IN_DELETE_SELF | IN_MOVE_SELF) and wd in folders:
+                    self._watches.pop(folders[wd], None)
+        return changed
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class PollingWatcher(FolderWatcher):
+    """
+    Observa las carpetas revisando periódicamente su contenido (nombre, tamaño y fecha de modificación de cada
+    archivo). Se utiliza cuando inotify no está disponible (ej: otros sistemas operativos o algunos file systems)
+    """
+
+    def __init__(self, polling_step: float = POLLING_STEP):
+        self._polling_step: float = polling_step
+        self._snapshots: dict[Path, dict[str, tuple[int, int]]] = {}
+
+    @classmethod
+    def available(cls) -> bool:
+        return True
+
+    @staticmethod
+    def snapshot(folder: Path) -> dict[str, tuple[int, int]]:
+        try:
+            with os.scandir(folder) as entries:
+                return {e.name: (e.stat().st_size, e.stat().st_mtime_ns) for e in entries if e.is_file()}
+        except OSError:
+            return {}
+
+    def watch(self, folders: set[Path]) -> None:
+        self._snapshots = {f: self._snapshots.get(f) or self.snapshot(f) for f in folders}
+
+    def wait(self, timeout: float) -> set[Path]:
+        # Revisar las carpetas cada polling_step segundos, hasta detectar un cambio (o hasta que se cumpla el timeout)
+        deadline = time.monotonic() + max(timeout, 0)
+        while True:
+            changed: set[Path] = set()
+            for folder, previous in self._snapshots.items():
+                current = self.snapshot(folder)
+                changed.update(Path(folder, n) for n in set(current) | set(previous)
+                               if current.get(n) != previous.get(n))
+                self._snapshots[folder] = current
+            remaining = deadline - time.monotonic()
+            if changed or remaining <= 0:
+                return changed
+            time.sleep(min(self._polling_step, remaining))
+
+
+def create_folder_watcher() -> FolderWatcher:
+    # Usar inotify siempre que sea posible, de lo contrario, revisar periódicamente las carpetas
+    if InotifyWatcher.available():
+        return InotifyWatcher()
+    logging.info('inotify is not available, folders will be polled')
+    return PollingWatcher()
+
+
+class StabilityTracker(object):
+    """
+    Determina si un archivo está estable, es decir, si su tamaño y su fecha de modificación no cambiaron durante
+    el período de espera (debounce). De este modo se evita procesar archivos que aún están siendo escritos.
+    """
+
+    def __init__(self, debounce: float):
+        self.debounce: float = debounce
+        self._signatures: dict[str, tuple[tuple[int, int], float]] = {}  # clave: archivo, valor: (firma, desde)
+
+    def seconds_to_stable(self, file_name: Union[str, Path]) -> Union[float, None]:
+        # Retorna 0 si el archivo está estable, los segundos restantes si no lo está, o None si no existe
+        try:
+            file_stat = os.stat(file_name)
+        except OSError:
+            self._signatures.pop(str(file_name), None)
+            return None
+        signature, now = (file_stat.st_size, file_stat.st_mtime_ns), time.monotonic()
+        # OBS: un archivo que no fue modificado durante el período de espera se considera estable de inmediato
+        if time.time() - file_stat.st_mtime >= self.debounce:
+            self._signatures.pop(str(file_name), None)
+            return 0
+        previous = self._signatures.get(str(file_name))
+        if previous is None or previous[0] != signature:
+            self._signatures[str(file_name)] = (signature, now)
+            return self.debounce
+        return max(0.0, self.debounce - (now - previous[1]))
+
+    def is_stable(self, file_name: Union[str, Path]) -> bool:
+        return self.seconds_to_stable(file_name) == 0
+
+
+def convert_ready_files(parsed_args: argparse.Namespace, tracker: StabilityTracker,
+                        handled_inputs: dict[tuple[str, int], tuple]) -> tuple[float | None, set[Path], int]:
+    # Definir año y mes objetivos (sin --year y --month, se actualizan en cada revisión)
+    now = datetime.now()
+    year, month = (now.year, now.month) if parsed_args.follow_current_month else (parsed_args.year, parsed_args.month)
+
+    # Seleccionar descriptores (en cada revisión se vuelve a recorrer la carpeta con los descriptores)
+    selector = DescFilesSelector(
+        target_year=year, target_month=month, skip_ereg=parsed_args.skip_ereg, skip_pycpt=parsed_args.skip_pycpt)
+    manifest = BuildManifest.Instance()
+
+    # Carpetas a observar (la de los descriptores, sus subcarpetas y las carpetas de los archivos de entrada),
+    # segundos hasta que algún archivo esté estable (None: no hay archivos en espera) y archivos procesados
+    folders: set[Path] = {Path(root) for root, _, _ in os.walk(selector.target_folder)}
+    wait_time: float | None = None
+    processed_files_count = 0
+
+    for df in selector.target_descriptors:
+
+        # Observar las carpetas de los archivos de entrada ya convertidos (según el manifiesto), así los archivos
+        # nuevos se convierten en cuanto aparecen, aunque el descriptor no haya cambiado
+        folders.update(Path(input_file).parent for input_file in manifest.descriptor_inputs(df))
+
+        # Omitir los descriptores que no cambiaron y cuyos archivos de entrada y de salida tampoco cambiaron
+        if not parsed_args.overwrite_output and manifest.descriptor_is_up_to_date(df, READ_STRATEGIES_MODULE):
+            continue
+
+        # El descriptor solo se lee si está estable (si aún está siendo escrito, se espera)
+        df_wait = tracker.seconds_to_stable(df)
+        if df_wait is None or df_wait > 0:
+            wait_time = df_wait if df_wait and (wait_time is None or df_wait < wait_time) else wait_time
+            continue
+        try:
+            proc_files = DescriptorFile(df.absolute().as_posix()).get('files') or []
+        except (yaml.YAMLError, DescriptorError) as e:
+            logging.warning(f'Descriptor {df.absolute().as_posix()} could not be read ({e})')
+            continue
+
+        # Convertir los archivos del descriptor cuyo archivo de entrada existe y está estable
+        desc_complete, desc_outputs = True, []
+        for pn, pf in enumerate(proc_files):
+            # Una entrada inválida (ej: un tipo de archivo desconocido) se informa una sola vez (hasta que cambie)
+            input_key = (df.absolute().as_posix(), pn)
+            try:
+                reader = FileReader(define_read_strategy(pf.get('type'), df.absolute().as_posix()), df, manifest)
+                input_file = reader.define_input_filename(pf)
+            except DescriptorError as e:
+                if handled_inputs.get(input_key) != ('invalid', repr(pf)):
+                    logging.error(f'Entry {pn+1} of descriptor {df.absolute().as_posix()} is invalid ({e})')
+                    handled_inputs[input_key] = ('invalid', repr(pf))
+                desc_complete = False
+                continue
+            folders.add(Path(input_file).parent)
+            input_wait = tracker.seconds_to_stable(input_file)
+            if input_wait is None or input_wait > 0:
+                wait_time = input_wait if input_wait and (wait_time is None or input_wait < wait_time) else wait_time
+                desc_complete = False
+                continue
+            # Los archivos que fallaron, o que se regeneran siempre (--overwrite o update_output), solo se vuelven a
+            # convertir si el archivo de entrada o la entrada del descriptor cambiaron
+            input_stat = os.stat(input_file)
+            input_signature = (input_stat.st_size, input_stat.st_mtime_ns, repr(pf))
+            if handled_inputs.get(input_key) == input_signature:
+                desc_complete = False
+                continue
+            try:
+                status, record, _ = convert_file(df, pf)
+            except Exception as e:
+                logging.error(f'File {input_file} could not be converted ({e})')
+                handled_inputs[input_key] = input_signature
+                desc_complete = False
+                continue
+            if parsed_args.overwrite_output or pf.get('update_output', False) is True:
+                handled_inputs[input_key] = input_signature
+                desc_complete = False
+            else:
+                handled_inputs.pop(input_key, None)
+            if record is not None:
+                manifest.update_output(record)
+                desc_outputs.append(manifest.record_key(record))
+            if status == 'processed':
+                processed_files_count += 1
+                logging.info(f'Processed file: {pn+1}/{len(proc_files)} -- ({df.absolute().as_posix()})')
+
+        # Registrar el descriptor en el manifiesto (solo si se generaron todos sus archivos)
+        if desc_complete:
+            manifest.update_descriptor(df, desc_outputs)
+
+    # Retornar el tiempo de espera, las carpetas a observar y la cantidad de archivos procesados
+    return wait_time, folders, processed_files_count
+
+
+def watch_descriptors(parsed_args: argparse.Namespace) -> None:
+    # Leer la configuración del modo watch
+    watch_config = ConfigFile.Instance().get('watch') or {}
+    debounce = float(watch_config.get('debounce_seconds', WATCH_DEBOUNCE_SECONDS))
+    poll_interval = float(watch_config.get('poll_interval_seconds', WATCH_POLL_INTERVAL_SECONDS))
+
+    # Detener el modo watch al recibir SIGTERM (ej: docker stop) del mismo modo que con Ctrl+C
+    signal.signal(signal.SIGTERM, stop_on_sigterm)
+
+    # Crear los objetos que detectan cambios en las carpetas y determinan si los archivos están estables
+    tracker, watcher = StabilityTracker(debounce), create_folder_watcher()
+    handled_inputs: dict[tuple[str, int], tuple] = {}
+    logging.info(f'Watching descriptor files ({type(watcher).__name__}, debounce: {debounce:g} s)')
+
+    try:
+        while True:
+            # Convertir los archivos que estén listos (el descriptor y el archivo de entrada existen y están estables)
+            wait_time, folders, processed_files_count = convert_ready_files(parsed_args, tracker, handled_inputs)
+            if processed_files_count > 0:
+                logging.info(f'Processed files: {processed_files_count}')
+            # Actualizar los cubos que incluyen los archivos convertidos (el manifiesto se guarda antes, así las
+            # conversiones quedan registradas aunque falle la generación de un cubo)
+            if processed_files_count > 0:
+                BuildManifest.Instance().save()
+            if update_cubes() > 0:
+                BuildManifest.Instance().save()
+            DescriptorsCache.Instance().save()
+            # Esperar hasta que algo cambie, hasta que algún archivo esté estable o hasta la próxima revisión
+            watcher.watch(folders)
+            watcher.wait(poll_interval if wait_time is None else min(wait_time, poll_interval))
+    except KeyboardInterrupt:
+        logging.info('Watch mode stopped')
+    finally:
+        watcher.close()
+        BuildManifest.Instance().save()
@@ -0,0 +1,354 @@
+
+from __future__ import annotations
+
+from configuration import ConfigFile
+from build_manifest import BuildManifest
+from file_reader import FileReader
+from file_conversion import define_read_strategy, convert_file, update_cubes
+from script import RedisDB, stop_on_sigterm
+
+from redis import Redis
+from redis.exceptions import WatchError
+
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Iterator
+
+import os
+import json
+import time
+import signal
+import hashlib
+import logging
+import threading
+
+
+"""
+Valores por defecto de la cola de trabajos (ver sección "queue" en config.yaml)
+"""
+QUEUE_NAME = 'files-processor'
+VISIBILITY_TIMEOUT_SECONDS = 3600
+MAX_ATTEMPTS = 3
+
+"""
+Segundos que espera un worker antes de volver a consultar la cola, cuando no hay trabajos en espera
+"""
+QUEUE_POLL_INTERVAL_SECONDS = 5
+
+
+@dataclass
+class QueuedJob(object):
+    """
+    Trabajo obtenido de la cola: el descriptor, la entrada del descriptor y el plazo hasta el cual el trabajo está
+    reservado para el worker que lo obtuvo (si el plazo se cumple sin confirmación, el trabajo vuelve a la cola)
+    """
+    job_id: str
+    payload: dict
+    deadline: float
+
+
+class RedisWorkQueue(object):
+    """
+    Cola de trabajos compartida por varios procesos (o nodos) mediante Redis. Un productor agrega los trabajos a la
+    cola y cualquier cantidad de workers los obtienen, los ejecutan y confirman su finalización. Cada trabajo obtenido
+    queda reservado durante visibility_timeout segundos, si el worker no confirma su finalización en ese plazo (ej:
+    porque el worker se detuvo), el trabajo vuelve a la cola (hasta max_attempts veces). Todas las operaciones son
+    transacciones (WATCH/MULTI/EXEC), por lo que solo se requieren comandos básicos de Redis (sin scripts Lua) y la
+    conexión puede ser reemplazada por una implementación en memoria (ej: fakeredis) para realizar pruebas.
+
+    Claves utilizadas (todas con el prefijo name):
+      pending: trabajos en espera (sorted set, el score es el momento en que se agregó el trabajo)
+      processing: trabajos reservados (sorted set, el score es el plazo de la reserva)
+      jobs: contenido de los trabajos en espera o reservados (hash)
+      attempts: cantidad de veces que cada trabajo fue reservado (hash)
+      failed: trabajos fallidos (lista, con el error)
+      results: resultados de los trabajos finalizados (hash, para que el productor los procese)
+    """
+
+    def __init__(self, connection: Redis = None, name: str = QUEUE_NAME,
+                 visibility_timeout: float = VISIBILITY_TIMEOUT_SECONDS, max_attempts: int = MAX_ATTEMPTS):
+        self.connection: Redis = connection if connection is not None else Redis(
+            host=os.getenv('REDIS_HOST', 'localhost'), port=int(os.getenv('REDIS_PORT', 6379)), decode_responses=True)
+        self.name: str = name
+        self.visibility_timeout: float = visibility_timeout
+        self.max_attempts: int = max_attempts
+
+    def key(self, suffix: str) -> str:
+        return f'{self.name}:{suffix}'
+
+    def server_time(self) -> float:
+        # Se usa la hora del servidor Redis, así los plazos no dependen de la hora de cada nodo
+        seconds, microseconds = self.connection.time()
+        return seconds + microseconds / 1e6
+
+    @staticmethod
+    def job_id(payload: dict) -> str:
+        # El identificador depende solo del contenido, así un mismo trabajo no puede estar dos veces en la cola
+        return hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+    def push(self, payloads: list[dict]) -> int:
+        # Agregar los trabajos que no están en espera ni reservados, retorna la cantidad de trabajos agregados
+        jobs = {self.job_id(p): json.dumps(p, sort_keys=True, default=str) for p in payloads}
+        if not jobs:
+            return 0
+        with self.connection.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(self.key('pending'), self.key('processing'))
+                    ids = list(jobs)
+                    queued = [p is not None or r is not None for p, r in zip(
+                        pipe.zmscore(self.key('pending'), ids), pipe.zmscore(self.key('processing'), ids))]
+                    new_jobs = {i: jobs[i] for i, q in zip(ids, queued) if not q}
+                    now = self.server_time()
+                    pipe.multi()
+                    if new_jobs:
+                        pipe.hset(self.key('jobs'), mapping=new_jobs)
+                        pipe.zadd(self.key('pending'), {i: now + n * 1e-6 for n, i in enumerate(new_jobs)})
+                    pipe.execute()
+                    return len(new_jobs)
+                except WatchError:
+                    continue
+
+    def pull(self) -> QueuedJob | None:
+        # Reservar el trabajo más antiguo en espera (retorna None si no hay trabajos en espera)
+        self.requeue_expired()
+        with self.connection.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(self.key('pending'))
+                    first = pipe.zrange(self.key('pending'), 0, 0)
+                    if not first:
+                        pipe.unwatch()
+                        return None
+                    job_id, deadline = first[0], self.server_time() + self.visibility_timeout
+                    payload = pipe.hget(self.key('jobs'), job_id)
+                    pipe.multi()
+                    pipe.zrem(self.key('pending'), job_id)
+                    pipe.zadd(self.key('processing'), {job_id: deadline})
+                    pipe.hincrby(self.key('attempts'), job_id, 1)
+                    pipe.execute()
+                except WatchError:
+                    continue
+                # Un trabajo sin contenido no puede ser ejecutado (se descarta)
+                if payload is None:
+                    self.connection.zrem(self.key('processing'), job_id)
+                    continue
+                return QueuedJob(job_id, json.loads(payload), deadline)
+
+    def requeue_expired(self) -> int:
+        # Devolver a la cola los trabajos cuya reserva expiró (los que superan max_attempts se registran como fallidos)
+        with self.connection.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(self.key('processing'))
+                    now = self.server_time()
+                    expired = pipe.zrangebyscore(self.key('processing'), '-inf', now)
+                    if not expired:
+                        pipe.unwatch()
+                        return 0
+                    attempts = pipe.hmget(self.key('attempts'), expired)
+                    payloads = pipe.hmget(self.key('jobs'), expired)
+                    pipe.multi()
+                    pipe.zrem(self.key('processing'), *expired)
+                    for job_id, n_attempts, payload in zip(expired, attempts, payloads):
+                        if int(n_attempts or 0) < self.max_attempts:
+                            pipe.zadd(self.key('pending'), {job_id: now})
+                        else:
+                            self.__register_failure(pipe, job_id, payload, 'visibility timeout expired too many times')
+                    pipe.execute()
+                except WatchError:
+                    continue
+                logging.warning(f'Jobs requeued or discarded after their visibility timeout expired: {len(expired)}')
+                return len(expired)
+
+    def __register_failure(self, pipe: Any, job_id: str, payload: str | None, error: str) -> None:
+        pipe.rpush(self.key('failed'), json.dumps({'id': job_id, 'payload': payload, 'error': error}))
+        pipe.hdel(self.key('jobs'), job_id)
+        pipe.hdel(self.key('attempts'), job_id)
+
+    def __finish(self, job: QueuedJob, result: dict | None, error: str | None) -> bool:
+        # Finalizar un trabajo, solo si la reserva sigue vigente (si expiró, otro worker puede haber tomado el trabajo)
+        with self.connection.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(self.key('processing'))
+                    if pipe.zscore(self.key('processing'), job.job_id) != job.deadline:
+                        pipe.unwatch()
+                        logging.warning(f'The visibility timeout of job {job.job_id} expired before it was finished')
+                        return False
+                    pipe.multi()
+                    pipe.zrem(self.key('processing'), job.job_id)
+                    if error is not None:
+                        self.__register_failure(pipe, job.job_id, json.dumps(job.payload), error)
+                    else:
+                        pipe.hdel(self.key('jobs'), job.job_id)
+                        pipe.hdel(self.key('attempts'), job.job_id)
+                        if result is not None:
+                            pipe.hset(self.key('results'), job.job_id, json.dumps(result, default=str))
+                    pipe.execute()
+                    return True
+                except WatchError:
+                    continue
+
+    def ack(self, job: QueuedJob, result: dict = None) -> bool:
+        return self.__finish(job, result, None)
+
+    def fail(self, job: QueuedJob, error: str) -> bool:
+        return self.__finish(job, None, error)
+
+    def extend(self, job: QueuedJob) -> bool:
+        # Extender la reserva de un trabajo (ej: para trabajos que demoran más que visibility_timeout), solo si la
+        # reserva sigue vigente (si expiró, otro worker puede haber tomado el trabajo con una nueva reserva)
+        with self.connection.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(self.key('processing'))
+                    if pipe.zscore(self.key('processing'), job.job_id) != job.deadline:
+                        pipe.unwatch()
+                        return False
+                    deadline = self.server_time() + self.visibility_timeout
+                    pipe.multi()
+                    pipe.zadd(self.key('processing'), {job.job_id: deadline}, xx=True)
+                    pipe.execute()
+                    job.deadline = deadline
+                    return True
+                except WatchError:
+                    continue
+
+    def pop_results(self) -> list[dict]:
+        # Obtener (y eliminar) los resultados de los trabajos finalizados
+        with self.connection.pipeline() as pipe:
+            pipe.multi()
+            pipe.hgetall(self.key('results'))
+            pipe.delete(self.key('results'))
+            results, _ = pipe.execute()
+        return [json.loads(r) for r in results.values()]
+
+    def stats(self) -> dict[str, int]:
+        with self.connection.pipeline(transaction=False) as pipe:
+            pipe.zcard(self.key('pending'))
+            pipe.zcard(self.key('processing'))
+            pipe.llen(self.key('failed'))
+            pipe.hlen(self.key('results'))
+            return dict(zip(['pending', 'processing', 'failed', 'results'], pipe.execute()))
+
+
+def create_work_queue() -> RedisWorkQueue:
+    # Leer la configuración de la cola de trabajos (la cola usa el pool de conexiones de script.RedisDB)
+    queue_config = ConfigFile.Instance().get('queue') or {}
+    return RedisWorkQueue(
+        connection=RedisDB.connection(),
+        name=queue_config.get('name', QUEUE_NAME),
+        visibility_timeout=float(queue_config.get('visibility_timeout_seconds', VISIBILITY_TIMEOUT_SECONDS)),
+        max_attempts=int(queue_config.get('max_attempts', MAX_ATTEMPTS)))
+
+
+def register_queue_results(work_queue: RedisWorkQueue) -> None:
+    # Registrar en el manifiesto los archivos convertidos por los workers y actualizar los cubos que los incluyen
+    # (el manifiesto se guarda antes, los resultados ya fueron retirados de la cola)
+    manifest = BuildManifest.Instance()
+    for queue_result in work_queue.pop_results():
+        manifest.update_output(queue_result)
+    manifest.save()
+    update_cubes()
+
+
+def enqueue_conversion_jobs(work_queue: RedisWorkQueue, conversion_jobs: list[tuple[Path, int, int, dict]]) -> None:
+    manifest = BuildManifest.Instance()
+
+    # Solo se agregan a la cola los archivos cuyo archivo de salida debe ser creado, los demás se registran
+    # directamente en el manifiesto (un descriptor solo se registra si todos sus archivos están actualizados)
+    payloads: list[dict] = []
+    desc_outputs: dict[Path, list[str]] = {df: [] for df, _, _, _ in conversion_jobs}
+    desc_complete: dict[Path, bool] = {df: True for df, _, _, _ in conversion_jobs}
+    missing_files_count = 0
+    for df, _, _, pf in conversion_jobs:
+        reader = FileReader(define_read_strategy(pf.get('type'), df.absolute().as_posix()), df, manifest)
+        input_file = reader.define_input_filename(pf)
+        if not os.path.isfile(input_file):
+            logging.warning(f"Missing file: {input_file}")
+            missing_files_count += 1
+            desc_complete[df] = False
+        elif reader.output_file_must_be_created(pf):
+            payloads.append({'descriptor': df.absolute().as_posix(), 'entry': pf})
+            desc_complete[df] = False
+        else:
+            record = reader.manifest_record(pf)
+            manifest.update_output(record)
+            desc_outputs[df].append(manifest.record_key(record))
+            if pf.get('update_output', False) is True:
+                desc_complete[df] = False
+
+    # Registrar los descriptores completos en el manifiesto y agregar los trabajos a la cola
+    for df, complete in desc_complete.items():
+        if complete:
+            manifest.update_descriptor(df, desc_outputs[df])
+    queued_files_count = work_queue.push(payloads)
+
+    # Reportar los archivos agregados a la cola (los archivos que ya estaban en la cola no se agregan nuevamente)
+    logging.info('')
+    logging.info(f'Queued files: {queued_files_count}/{len(payloads)} -- (queue: {work_queue.stats()})')
+    if missing_files_count > 0:
+        logging.warning(f'Missing files: {missing_files_count}/{len(conversion_jobs)}')
+
+
+@contextmanager
+def lease_renewal(work_queue: RedisWorkQueue, job: QueuedJob) -> Iterator[None]:
+    # Renovar la reserva del trabajo periódicamente mientras se convierte el archivo, para que el trabajo no vuelva
+    # a la cola si la conversión demora más que visibility_timeout
+    # OBS: la renovación se detiene antes de confirmar el trabajo, ya que extend modifica job.deadline
+    stop = threading.Event()
+
+    def renew() -> None:
+        while not stop.wait(work_queue.visibility_timeout / 3):
+            try:
+                renewed = work_queue.extend(job)
+            except Exception as e:
+                logging.warning(f'The visibility timeout of job {job.job_id} could not be extended ({e})')
+                continue
+            if not renewed:
+                logging.error(f'Job {job.job_id} lost its reservation (another worker may process it)')
+                return
+
+    heartbeat = threading.Thread(target=renew, name='lease-heartbeat', daemon=True)
+    heartbeat.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        heartbeat.join()
+
+
+def run_queue_worker(work_queue: RedisWorkQueue) -> None:
+    # Leer la configuración de los workers
+    poll_interval = float((ConfigFile.Instance().get('queue') or {}).get(
+        'poll_interval_seconds', QUEUE_POLL_INTERVAL_SECONDS))
+
+    # Detener el worker al recibir SIGTERM (ej: docker stop) del mismo modo que con Ctrl+C
+    signal.signal(signal.SIGTERM, stop_on_sigterm)
+    logging.info(f'Waiting for jobs in queue {work_queue.name}')
+
+    try:
+        while True:
+            # Obtener un trabajo de la cola (si no hay trabajos en espera, se vuelve a consultar más tarde)
+            job = work_queue.pull()
+            if job is None:
+                time.sleep(poll_interval)
+                continue
+            desc_file, proc_file = Path(job.payload.get('descriptor')), job.payload.get('entry')
+            # Convertir el archivo e informar el resultado (el productor registra los resultados en el manifiesto)
+            try:
+                with lease_renewal(work_queue, job):
+                    status, record, _ = convert_file(desc_file, proc_file)
+            except Exception as e:
+                logging.error(f'Job {job.job_id} failed ({e}) -- ({desc_file.as_posix()})')
+                work_queue.fail(job, repr(e))
+                continue
+            if status == 'missing':
+                work_queue.fail(job, 'missing input file')
+                continue
+            work_queue.ack(job, record)
+            logging.info(f'Processed file: {proc_file.get("name")} -- ({desc_file.as_posix()})')
+    except KeyboardInterrupt:
+        logging.info('Worker stopped')
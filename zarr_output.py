@@ -0,0 +1,159 @@
+
+from __future__ import annotations
+
+from cube_builder import CUBE_DIM, CUBE_DIM_CHUNK
+from errors import ConfigError, DescriptorError, ZarrStoreError
+from netcdf_encoding import NetCDFEncoding
+
+from contextlib import contextmanager
+from dataclasses import replace
+from typing import Iterator
+
+import os
+import fcntl
+import importlib.util
+import numpy as np
+import xarray as xr
+
+
+"""
+Modos de escritura de los almacenes Zarr (entrada "zarr_mode" de output_file, ver template.yaml):
+ - write: el almacén se genera completo (si existe, se reemplaza)
+ - append: los init_time del archivo se agregan al almacén (los que ya están en el almacén se sobrescriben)
+ - region: los init_time del archivo se escriben en el almacén, que ya debe contenerlos (escrituras en paralelo)
+"""
+ZARR_MODES = ['write', 'append', 'region']
+
+"""
+Opciones de la codificación que solo existen en NetCDF (en Zarr, los datos siempre se comprimen con el compresor
+por defecto de zarr y los chunks se definen con la opción "chunks")
+"""
+NETCDF_ONLY_ENCODING_KEYS = ['zlib', 'complevel', 'shuffle', 'least_significant_digit']
+
+
+def zarr_variable_encoding(ds: xr.Dataset, encoding: NetCDFEncoding) -> dict[str, dict]:
+    # La codificación de NetCDF se traduce a la de Zarr (chunksizes -> chunks), siempre con chunks a lo largo de
+    # init_time, así cada pronóstico puede escribirse (y leerse) de manera independiente
+    zarr_encoding = replace(encoding, chunks=dict(encoding.chunks or {}, **{CUBE_DIM: CUBE_DIM_CHUNK}))
+    variable_encoding = {}
+    for var, var_encoding in zarr_encoding.variable_encoding(ds).items():
+        var_encoding = {k: v for k, v in var_encoding.items() if k not in NETCDF_ONLY_ENCODING_KEYS}
+        if 'chunksizes' in var_encoding:
+            var_encoding['chunks'] = var_encoding.pop('chunksizes')
+        variable_encoding[var] = var_encoding
+    return variable_encoding
+
+
+def round_data_variables(ds: xr.Dataset, decimals: int) -> xr.Dataset:
+    # OBS: Zarr no implementa la cuantización de netCDF4 (least_significant_digit), los datos se redondean a la
+    # misma cantidad de decimales (el resultado se comprime de igual manera)
+    for var in ds.data_vars:
+        if np.issubdtype(ds[var].dtype, np.floating):
+            ds[var] = ds[var].round(decimals)
+    return ds
+
+
+@contextmanager
+def store_lock(store: str) -> Iterator[None]:
+    # Los cambios en la estructura del almacén (crearlo o agregar init_time) se realizan con un archivo bloqueado
+    # (flock), así dos procesos no pueden modificarla a la vez. OBS: como en FileDB (ver script.py), el archivo no se
+    # elimina al liberar el bloqueo.
+    with open(f'{store}.lock', 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def contiguous_runs(positions: np.ndarray) -> list[np.ndarray]:
+    # Índices (de positions) de cada tramo de posiciones consecutivas en el almacén, en el orden del almacén
+    order = np.argsort(positions, kind='stable')
+    breaks = np.flatnonzero(np.diff(positions[order]) != 1) + 1
+    return np.split(order, breaks)
+
+
+def check_store_compatibility(ds: xr.Dataset, store_ds: xr.Dataset, store: str) -> None:
+    # Las variables y las demás coordenadas (ej: latitude, longitude) deben ser las mismas que en el almacén
+    different_vars = set(ds.data_vars) ^ set(store_ds.data_vars)
+    if different_vars:
+        raise ZarrStoreError(f'{store}: data variables differ from those in the store ({", ".join(different_vars)})')
+    for name, coord in ds.coords.items():
+        if CUBE_DIM in coord.dims:
+            continue
+        if name not in store_ds.coords or not np.array_equal(coord.values, store_ds[name].values):
+            raise ZarrStoreError(f'{store}: coordinate {name} differs from the one in the store')
+
+
+def write_regions(ds: xr.Dataset, store: str, positions: np.ndarray) -> None:
+    # Escribir cada tramo de init_time consecutivos en su región del almacén (solo se escriben sus chunks)
+    # OBS: en una escritura por regiones solo pueden incluirse las variables que dependen de init_time, y los
+    # metadatos del almacén no cambian (no se consolidan, otros procesos pueden estar escribiendo a la vez)
+    region_ds = ds.drop_vars([v for v in ds.variables if CUBE_DIM not in ds[v].dims])
+    for run in contiguous_runs(positions):
+        region = slice(int(positions[run[0]]), int(positions[run[-1]]) + 1)
+        region_ds.isel({CUBE_DIM: run}).to_zarr(store, mode='r+', region={CUBE_DIM: region}, consolidated=False)
+
+
+def write_zarr(ds: xr.Dataset, store: str, encoding: NetCDFEncoding, zarr_mode: str = 'write') -> None:
+    # Escribir el dataset en un almacén Zarr, según el modo indicado (ver ZARR_MODES)
+    if importlib.util.find_spec('zarr') is None:
+        raise ConfigError('The zarr package is required to write Zarr stores (see requirements.txt)')
+    if zarr_mode not in ZARR_MODES:
+        raise DescriptorError(f'Invalid zarr_mode: {zarr_mode} (valid: {", ".join(ZARR_MODES)})')
+    # OBS: el empaquetado (packing) se calcula con el rango de los datos del primer archivo escrito, los archivos
+    # agregados después podrían quedar fuera de ese rango
+    if zarr_mode != 'write' and encoding.packing is not None:
+        raise ConfigError(f'Packing cannot be used with zarr_mode {zarr_mode}')
+    if zarr_mode != 'write' and CUBE_DIM not in ds.dims:
+        raise ZarrStoreError(f'{store}: zarr_mode {zarr_mode} requires a {CUBE_DIM} dimension')
+
+    # Se descarta la codificación de las variables (ej: la que resulta de leer un NetCDF), el almacén se codifica
+    # según config.yaml y el descriptor
+    for variable in ds.variables.values():
+        variable.encoding = {}
+    if encoding.least_significant_digit is not None:
+        ds = round_data_variables(ds, encoding.least_significant_digit)
+
+    # Modo write: el almacén se genera completo
+    os.makedirs(os.path.dirname(store) or '.', exist_ok=True)
+    if zarr_mode == 'write':
+        ds.to_zarr(store, mode='w', encoding=zarr_variable_encoding(ds, encoding))
+        return
+
+    # Un mismo init_time no puede aparecer más de una vez en el archivo
+    values, counts = np.unique(ds[CUBE_DIM].values, return_counts=True)
+    if np.any(counts > 1):
+        raise ZarrStoreError(f'{store}: duplicated {CUBE_DIM} values ({", ".join(map(str, values[counts > 1]))})')
+
+    # Modo region: el almacén ya debe contener los init_time del archivo, y cada init_time debe estar en su propio
+    # chunk (así, varios procesos pueden escribir init_time distintos a la vez, sin bloquear el almacén)
+    if zarr_mode == 'region':
+        if not os.path.exists(store):
+            raise ZarrStoreError(f'{store}: zarr_mode region requires an existing store (see zarr_mode append)')
+        with xr.open_dataset(store, engine='zarr', chunks=None) as store_ds:
+            check_store_compatibility(ds, store_ds, store)
+            positions = store_ds.indexes[CUBE_DIM].get_indexer(ds[CUBE_DIM].values)
+            init_time_chunks = {store_ds[v].encoding.get('preferred_chunks', {}).get(CUBE_DIM)
+                                for v in store_ds.data_vars if CUBE_DIM in store_ds[v].dims}
+        if np.any(positions < 0):
+            raise ZarrStoreError(f'{store}: {np.sum(positions < 0)} {CUBE_DIM} values are not in the store '
+                                 f'(use zarr_mode append to add them)')
+        if init_time_chunks - {CUBE_DIM_CHUNK}:
+            raise ZarrStoreError(f'{store}: zarr_mode region requires {CUBE_DIM} chunks of size {CUBE_DIM_CHUNK}')
+        write_regions(ds, store, positions)
+        return
+
+    # Modo append: el almacén se crea si no existe, los init_time que ya están en el almacén se sobrescriben y los
+    # demás se agregan al final (en el orden del archivo, el almacén no se reordena)
+    with store_lock(store):
+        if not os.path.exists(store):
+            ds.to_zarr(store, mode='w-', encoding=zarr_variable_encoding(ds, encoding))
+            return
+        with xr.open_dataset(store, engine='zarr', chunks=None) as store_ds:
+            check_store_compatibility(ds, store_ds, store)
+            positions = store_ds.indexes[CUBE_DIM].get_indexer(ds[CUBE_DIM].values)
+        if np.any(positions >= 0):
+            write_regions(ds.isel({CUBE_DIM: positions >= 0}), store, positions[positions >= 0])
+        if np.any(positions < 0):
+            ds.isel({CUBE_DIM: positions < 0}).to_zarr(store, mode='a', append_dim=CUBE_DIM)